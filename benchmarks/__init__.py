@@ -0,0 +1 @@
+"""Synthetic data generation and reproducible performance benchmarks for budget_manager."""
@@ -0,0 +1,63 @@
+"""
+Measures the per-call cost of a single logic operation with and without connection reuse.
+
+"fresh" opens, initialises and closes a connection for every call, as the logic functions
+did before shared connections; "shared" lets them reuse get_shared_connection.
+
+Usage: python benchmarks/connection_overhead.py [--calls N] [--profile PROFILE]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from budget_manager.database import (
+    PROFILES,
+    close_shared_connections,
+    initialise_database,
+)
+from budget_manager.logic import add_single_transaction, create_budget_category
+
+
+def time_calls(calls: int, operation) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        operation(i)
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=1_000)
+    parser.add_argument("--profile", choices=PROFILES, default="safe")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "benchmark.db")
+        os.environ["BUDGET_MANAGER_DB"] = db_path
+        os.environ["BUDGET_MANAGER_PROFILE"] = args.profile
+        create_budget_category("Groceries", 1_000.0)
+
+        def fresh(i):
+            connection = initialise_database(args.profile, db_path)
+            add_single_transaction(
+                "Groceries", 1.0, "2025-01-01", f"Item {i}", connection=connection
+            )
+            connection.close()
+
+        def shared(i):
+            add_single_transaction("Groceries", 1.0, "2025-01-01", f"Item {i}")
+
+        fresh_seconds = time_calls(args.calls, fresh)
+        shared_seconds = time_calls(args.calls, shared)
+        close_shared_connections()
+
+    print(f"profile: {args.profile}, calls: {args.calls}")
+    print(f"fresh connection per call:  {fresh_seconds * 1e6:10.1f} us/call")
+    print(f"shared connection:          {shared_seconds * 1e6:10.1f} us/call")
+    print(f"speed-up:                   {fresh_seconds / shared_seconds:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Generates seeded synthetic budgets and transactions in the same schema as example/.
+
+Usage: python -m benchmarks.generate OUT_DIR [--rows 1m] [--budgets 10] [--seed 0]
+"""
+
+import argparse
+import os
+import random
+from datetime import date, timedelta
+
+import polars as pl
+
+from budget_manager.io import write_dataframe
+
+# The budget categories and descriptions used in example/
+EXAMPLE_BUDGETS = {
+    "Housing": 1500.0,
+    "Groceries": 450.0,
+    "Utilities": 200.0,
+    "Transportation": 300.0,
+    "Insurance": 150.0,
+    "Healthcare": 100.0,
+    "Dining Out": 150.0,
+    "Entertainment": 100.0,
+    "Savings": 500.0,
+    "Miscellaneous": 100.0,
+}
+DESCRIPTIONS = [
+    "Monthly Mortgage/Rent",
+    "Weekly shop - Whole Foods",
+    "Lunch with coworkers",
+    "Gas station fill-up",
+    "Netflix Subscription",
+    "Pharmacy - Vitamins",
+    "Electric Bill",
+    "Trader Joe's run",
+    "Dry cleaning",
+    "Auto Insurance Premium",
+    "Friday Night Dinner",
+    "Train pass refill",
+    "Weekly shop - Safeway",
+    "Water & Trash Bill",
+    "Transfer to Emergency Fund",
+    "Movie tickets and snacks",
+    "Dentist co-pay",
+    "Farmers Market",
+    "Morning Coffee & Pastry",
+    "Gift for birthday",
+]
+# Rows generated and written at a time, so memory use does not grow with the file size
+CHUNK_ROWS = 1_000_000
+
+
+def parse_size(size: str) -> int:
+    """Parses a row count such as 10000, 10k, 1m or 10M."""
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    size = size.strip().lower().replace("_", "")
+    if size and size[-1] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+
+def make_budgets(count: int = len(EXAMPLE_BUDGETS)) -> pl.DataFrame:
+    """
+    Returns count budgets, starting with the example categories.
+
+    Args:
+        count (int): The number of budgets.
+    Returns:
+        pl.DataFrame: Budgets with name and amount columns.
+    """
+    names = list(EXAMPLE_BUDGETS)[:count]
+    amounts = list(EXAMPLE_BUDGETS.values())[:count]
+    for i in range(len(names), count):
+        names.append(f"Budget {i + 1}")
+        amounts.append(100.0 * (i % 20 + 1))
+    return pl.DataFrame({"name": names, "amount": amounts})
+
+
+def make_transactions(
+    rng: random.Random,
+    rows: int,
+    budget_names: list[str],
+    start: date = date(2015, 1, 1),
+    days: int = 3_653,
+) -> pl.DataFrame:
+    """
+    Returns rows random transactions spread over days days from start.
+
+    Args:
+        rng (random.Random): The seeded random number generator.
+        rows (int): The number of transactions.
+        budget_names (list[str]): The budgets the transactions are spent against.
+        start (date): The earliest transaction date.
+        days (int): The number of days the transactions are spread over.
+    Returns:
+        pl.DataFrame: Transactions with budget_name, amount, date and description columns.
+    """
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    return pl.DataFrame(
+        {
+            "budget_name": rng.choices(budget_names, k=rows),
+            "amount": [rng.randrange(1, 50_000) / 100 for _ in range(rows)],
+            "date": rng.choices(dates, k=rows),
+            "description": rng.choices(DESCRIPTIONS, k=rows),
+        }
+    )
+
+
+def generate(
+    out_dir: str,
+    rows: int,
+    budgets: int = len(EXAMPLE_BUDGETS),
+    seed: int = 0,
+    file_format: str = "csv",
+) -> tuple[str, str]:
+    """
+    Writes a budgets file and a transactions file of the given size to out_dir.
+
+    The same seed, size and budget count always produce identical files.
+
+    Args:
+        out_dir (str): The directory to write to.
+        rows (int): The number of transactions.
+        budgets (int): The number of budgets.
+        seed (int): The random seed.
+        file_format (str): "csv" or "parquet".
+    Returns:
+        tuple[str, str]: The paths of the budgets and transactions files.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    extension = "csv" if file_format == "csv" else "parquet"
+    budgets_path = os.path.join(out_dir, f"budgets_{budgets}.{extension}")
+    transactions_path = os.path.join(
+        out_dir, f"transactions_{rows}_{budgets}_{seed}.{extension}"
+    )
+
+    budgets_df = make_budgets(budgets)
+    write_dataframe(budgets_df, budgets_path, file_format)
+
+    rng = random.Random(seed)
+    names = budgets_df["name"].to_list()
+    if file_format == "csv":
+        with open(transactions_path, "wb") as f:
+            for offset in range(0, max(rows, 1), CHUNK_ROWS):
+                chunk = make_transactions(rng, min(CHUNK_ROWS, rows - offset), names)
+                chunk.write_csv(f, include_header=offset == 0)
+    else:
+        chunks = [
+            make_transactions(rng, min(CHUNK_ROWS, rows - offset), names)
+            for offset in range(0, max(rows, 1), CHUNK_ROWS)
+        ]
+        write_dataframe(pl.concat(chunks), transactions_path, file_format)
+    return budgets_path, transactions_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--rows", default="10k", help="e.g. 10k, 1m, 10m")
+    parser.add_argument("--budgets", type=int, default=len(EXAMPLE_BUDGETS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    args = parser.parse_args()
+
+    budgets_path, transactions_path = generate(
+        args.out_dir, parse_size(args.rows), args.budgets, args.seed, args.format
+    )
+    print(f"Wrote {budgets_path} and {transactions_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Measures single-transaction insert throughput with and without group commit.
+
+"each" commits every add_single_transaction call; "grouped" queues them on a
+TransactionWriter, which commits every --max-rows rows or --max-delay-ms milliseconds.
+
+Usage: python -m benchmarks.group_commit [--rows N] [--profile PROFILE]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from budget_manager.database import (
+    DEFAULT_GROUP_DELAY_MS,
+    DEFAULT_GROUP_ROWS,
+    PROFILES,
+    TransactionWriter,
+    initialise_database,
+)
+from budget_manager.logic import add_single_transaction, create_budget_category
+
+
+def rows_per_second(rows: int, add) -> float:
+    start = time.perf_counter()
+    for i in range(rows):
+        add(i)
+    return rows / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000)
+    parser.add_argument("--profile", choices=PROFILES, default="safe")
+    parser.add_argument("--max-rows", type=int, default=DEFAULT_GROUP_ROWS)
+    parser.add_argument("--max-delay-ms", type=float, default=DEFAULT_GROUP_DELAY_MS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        connection = initialise_database(
+            args.profile, os.path.join(tmp_dir, "benchmark.db")
+        )
+        create_budget_category("Groceries", 1_000.0, connection=connection)
+
+        def each(i):
+            add_single_transaction(
+                "Groceries", 1.0, "2025-01-01", f"Each {i}", connection=connection
+            )
+
+        with TransactionWriter(connection, args.max_rows, args.max_delay_ms) as writer:
+
+            def grouped(i):
+                add_single_transaction(
+                    "Groceries", 1.0, "2025-01-01", f"Grouped {i}", writer=writer
+                )
+
+            each_rate = rows_per_second(args.rows, each)
+            grouped_rate = rows_per_second(args.rows, grouped)
+        connection.close()
+
+    print(f"profile: {args.profile}, rows: {args.rows}")
+    print(f"commit per row:  {each_rate:12,.0f} rows/s")
+    print(f"group commit:    {grouped_rate:12,.0f} rows/s")
+    print(f"speed-up:        {grouped_rate / each_rate:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
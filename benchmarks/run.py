@@ -0,0 +1,207 @@
+"""
+Runs the import and report benchmarks and records the results to a JSON file.
+
+Each benchmark runs in a fresh process against a fresh database, so wall time and peak
+memory (maximum resident set size) are measured for that operation alone.
+
+Usage: python -m benchmarks.run [--sizes 10k 1m 10m] [--output results.json]
+                                [--compare baseline.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.generate import EXAMPLE_BUDGETS, generate, parse_size
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _run_budgets(db_path: str, budgets_path: str, transactions_path: str):
+    from budget_manager.database import initialise_database
+    from budget_manager.logic import create_budget_categories_from_file
+
+    connection = initialise_database(db_path=db_path)
+    start = time.perf_counter()
+    result = create_budget_categories_from_file(budgets_path, connection=connection)
+    return result, time.perf_counter() - start
+
+
+def _run_transactions(db_path: str, budgets_path: str, transactions_path: str):
+    from budget_manager.database import initialise_database
+    from budget_manager.logic import (
+        add_transactions_from_file,
+        create_budget_categories_from_file,
+    )
+
+    connection = initialise_database(db_path=db_path)
+    create_budget_categories_from_file(budgets_path, connection=connection)
+    start = time.perf_counter()
+    result = add_transactions_from_file(transactions_path, connection=connection)
+    return result, time.perf_counter() - start
+
+
+def _run_report(db_path: str, budgets_path: str, transactions_path: str):
+    from budget_manager.database import initialise_database
+    from budget_manager.logic import generate_report
+
+    connection = initialise_database(db_path=db_path)
+    report_path = os.path.join(os.path.dirname(db_path), "report.csv")
+    start = time.perf_counter()
+    result = generate_report(report_path, connection=connection)
+    return result, time.perf_counter() - start
+
+
+BENCHMARKS = {
+    "create_budget_categories_from_file": _run_budgets,
+    "add_transactions_from_file": _run_transactions,
+    "generate_report": _run_report,
+}
+
+
+def _worker(name: str, args: tuple, queue):
+    result, seconds = BENCHMARKS[name](*args)
+    queue.put((result, seconds, _peak_rss_mb()))
+
+
+def run_benchmark(name: str, *args) -> tuple[str, float, float]:
+    """
+    Runs one benchmark in a fresh process.
+
+    Returns:
+        tuple[str, float, float]: The operation's result message, wall time in seconds
+            and the process's peak resident memory in MiB.
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_worker, args=(name, args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(sizes: list[int], data_dir: str, seed: int, budgets: int) -> list[dict]:
+    results = []
+    for rows in sizes:
+        budgets_path, transactions_path = generate(data_dir, rows, budgets, seed)
+        with tempfile.TemporaryDirectory() as work_dir:
+            db_path = os.path.join(work_dir, "benchmark.db")
+            for name in BENCHMARKS:
+                # The report runs against the database filled by the import benchmark
+                if name != "generate_report" and os.path.exists(db_path):
+                    os.remove(db_path)
+                message, seconds, peak_mb = run_benchmark(
+                    name, db_path, budgets_path, transactions_path
+                )
+                if message.startswith("Error"):
+                    raise RuntimeError(f"{name} failed: {message}")
+                processed = budgets if name.startswith("create_budget") else rows
+                results.append(
+                    {
+                        "benchmark": name,
+                        "transactions": rows,
+                        "rows": processed,
+                        "wall_seconds": round(seconds, 6),
+                        "rows_per_second": round(processed / seconds)
+                        if seconds
+                        else None,
+                        "peak_rss_mb": round(peak_mb, 1),
+                    }
+                )
+                print(
+                    f"{name:<36} {rows:>10,} tx  {seconds:10.3f} s  "
+                    f"{processed / seconds if seconds else 0:>12,.0f} rows/s  {peak_mb:8.1f} MiB"
+                )
+    return results
+
+
+def compare(baseline_path: str, results: list[dict]):
+    """Prints each benchmark's wall time relative to a previous results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {
+        (entry["benchmark"], entry["transactions"]): entry
+        for entry in baseline["results"]
+    }
+    print(f"\nCompared with {baseline.get('commit') or baseline_path}:")
+    for entry in results:
+        old = previous.get((entry["benchmark"], entry["transactions"]))
+        if old:
+            ratio = entry["wall_seconds"] / old["wall_seconds"]
+            print(
+                f"{entry['benchmark']:<36} {entry['transactions']:>10,} tx  "
+                f"{ratio:6.2f}x time  ({old['wall_seconds']:.3f} s -> {entry['wall_seconds']:.3f} s)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["10k", "1m"])
+    parser.add_argument("--budgets", type=int, default=len(EXAMPLE_BUDGETS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--data-dir",
+        default=os.path.join("benchmarks", "data"),
+        help="Where generated input files are cached between runs.",
+    )
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="BASELINE_JSON")
+    parser.add_argument(
+        "--clean",
+        action="store_true",
+        help="Delete the generated input files afterwards.",
+    )
+    args = parser.parse_args()
+
+    import polars
+
+    sizes = [parse_size(size) for size in args.sizes]
+    results = run_all(sizes, args.data_dir, args.seed, args.budgets)
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "polars": polars.__version__,
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "budgets": args.budgets,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(args.compare, results)
+    if args.clean:
+        shutil.rmtree(args.data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Measures CLI start-up: the import time of budget_manager.main and the latency of one command.
+
+Import times come from `python -X importtime`, so the slowest modules are listed by name.
+Pass --max-import-ms or --max-command-ms to fail (exit status 1) when the median exceeds
+a budget, e.g. to catch a heavy module that is imported eagerly again. Pass --rows to run
+the command against a database that already holds that many transactions, so start-up
+work that grows with the database is measured too.
+
+Usage: python -m benchmarks.startup [--runs N] [--rows N] [--max-import-ms MS]
+    [--max-command-ms MS]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Modules that single-row commands should not load
+HEAVY_MODULES = ("polars", "pyarrow", "multiprocessing.connection")
+
+
+def import_times(module: str = "budget_manager.main") -> dict[str, int]:
+    """
+    Imports a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        dict[str, int]: The cumulative import time in microseconds of every module loaded.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def fill_database(db_path: str, rows: int):
+    """Creates a database holding a budget and the given number of transactions."""
+    from budget_manager.database import initialise_database, insert_budget
+
+    connection = initialise_database(db_path=db_path, profile="bulk-import")
+    insert_budget(connection, "Groceries", 300.0)
+    connection.execute(
+        """
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        INSERT INTO transactions
+            (budget_id, amount, date, description, day, hash, occurrence)
+        SELECT 1, i, '2024-01-01', 'Item ' || i, 19723,
+            content_hash(1, i, '2024-01-01', 'Item ' || i, NULL), 0
+        FROM n
+        """,
+        (rows,),
+    )
+    connection.commit()
+    connection.close()
+
+
+def time_command(args: list[str], env: dict[str, str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "budget_manager.main", *args],
+        env=env,
+        capture_output=True,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--rows", type=int, default=0, help="Transactions in the database (default: 0)."
+    )
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list.")
+    parser.add_argument("--max-import-ms", type=float)
+    parser.add_argument("--max-command-ms", type=float)
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    import_ms = statistics.median(times["budget_manager.main"] for times in runs) / 1e3
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)
+    heavy = [name for name in HEAVY_MODULES if name in runs[-1]]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "startup.db")
+        if args.rows:
+            fill_database(db_path, args.rows)
+        env = dict(os.environ, BUDGET_MANAGER_DB=db_path)
+        command_ms = (
+            statistics.median(
+                time_command(["--add-budget", f"Budget {i}", "100"], env)
+                for i in range(args.runs)
+            )
+            * 1e3
+        )
+
+    print(f"import budget_manager.main:  {import_ms:8.1f} ms (median of {args.runs})")
+    print(
+        f"--add-budget NAME AMOUNT:    {command_ms:8.1f} ms (median of {args.runs}, "
+        f"{args.rows} transactions)"
+    )
+    print("\nSlowest imports (cumulative, last run):")
+    for name, microseconds in slowest[: args.top]:
+        print(f"  {name:<40} {microseconds / 1e3:8.1f} ms")
+
+    failures = []
+    if heavy:
+        failures.append(f"heavy modules imported at start-up: {', '.join(heavy)}")
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failures.append(f"import took {import_ms:.1f} ms > {args.max_import_ms} ms")
+    if args.max_command_ms is not None and command_ms > args.max_command_ms:
+        failures.append(f"command took {command_ms:.1f} ms > {args.max_command_ms} ms")
+    if failures:
+        print(f"\nFAILED: {'; '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
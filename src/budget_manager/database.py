@@ -1,43 +1,1060 @@
+import glob
 import sqlite3
 import os
+import threading
+import time
+from contextlib import suppress
+from datetime import datetime
+from hashlib import blake2b
+from itertools import batched
+from math import copysign, floor
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DB_PATH = os.path.join(BASE_DIR, "budget_manager.db")
+from budget_manager.metrics import count, phase
 
+# The database file, relative to the working directory unless BUDGET_MANAGER_DB is set
+DB_PATH = "budget_manager.db"
+DB_PATH_ENV_VAR = "BUDGET_MANAGER_DB"
+DEFAULT_CHUNK_SIZE = 50_000
+# When TransactionWriter commits by default: every 1,000 rows or 50 ms
+DEFAULT_GROUP_ROWS = 1_000
+DEFAULT_GROUP_DELAY_MS = 50
 
-def get_connection():
-    connection = sqlite3.connect(DB_PATH)
+# Converts an ISO date (YYYY-MM-DD) expression to days since 1970-01-01
+EPOCH_DAY_SQL = "CAST(julianday({}) - 2440587.5 AS INTEGER)"
+# Converts an ISO date (YYYY-MM-DD) expression to a month key such as 202501
+MONTH_SQL = "CAST(strftime('%Y%m', {}) AS INTEGER)"
+# Date formats accepted before dates were validated, converted to YYYY-MM-DD on upgrade.
+# Dates with slashes are read as month/day/year unless the first number is over 12.
+LEGACY_DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+    "%d.%m.%Y",
+    "%Y%m%d",
+)
+# Legacy transactions whose dates cannot be converted are moved to this table
+QUARANTINE_TABLE = "quarantined_transactions"
+# Report periods, as SQL expressions for a transaction's period key and the
+# period's first day (YYYY-MM-DD) given that key. Weeks start on Monday;
+# day 0 (1970-01-01) was a Thursday.
+PERIODS = {
+    "month": ("substr(t.date, 1, 7)", "{} || '-01'"),
+    "week": ("t.day - ((t.day + 3) % 7 + 7) % 7", "date(({}) * 86400, 'unixepoch')"),
+}
+
+# Amounts are stored as integer minor units (cents), so sums are exact
+MINOR_UNITS = 100
+# The largest amount SQLite can store, as a 64-bit integer number of minor units
+MAX_MINOR_UNITS = 2**63 - 1
+# Converts a major-unit REAL expression to minor units, rounding like to_minor_units
+MINOR_UNITS_SQL = f"CAST(ROUND(ROUND({{}} * {MINOR_UNITS}, 6)) AS INTEGER)"
+
+BUDGETS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {} (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        amount INTEGER NOT NULL
+    )
+"""
+TRANSACTIONS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {} (
+        id INTEGER PRIMARY KEY,
+        budget_id INTEGER,
+        amount INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        description TEXT,
+        day INTEGER,
+        source_id TEXT,
+        hash INTEGER,
+        occurrence INTEGER,
+        FOREIGN KEY(budget_id) REFERENCES budgets(id)
+    )
+"""
+TRANSACTION_COLUMNS = (
+    "id, budget_id, amount, date, description, day, source_id, hash, occurrence"
+)
+
+# Transactions from closed years can be moved to an archive database next to the main
+# one, with a table per year, e.g. budget_manager.archive.db holding transactions_2019
+ARCHIVE_SCHEMA = "archive"
+ARCHIVE_TABLE = "transactions_{}"
+
+
+# Named connection settings. Every profile uses write-ahead logging so that reports can
+# read while an import is writing; they differ in durability and memory use.
+#   safe:        every commit is flushed to disk before it returns.
+#   bulk-import: commits are not flushed until a checkpoint, so a power loss can drop the
+#                most recent commits (the database itself stays intact); large page cache.
+#   read-heavy:  memory-maps the database file and keeps a large page cache for reports.
+PROFILES = {
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -2_000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5_000,
+    },
+    "bulk-import": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -262_144,
+        "mmap_size": 0,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30_000,
+    },
+    "read-heavy": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65_536,
+        "mmap_size": 1_073_741_824,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5_000,
+    },
+}
+DEFAULT_PROFILE = "safe"
+PROFILE_ENV_VAR = "BUDGET_MANAGER_PROFILE"
+
+
+def apply_profile(connection, profile: str | None = None):
+    """
+    Applies a named performance profile's PRAGMA settings to a connection.
+
+    Args:
+        connection: An open SQLite connection.
+        profile (str | None): One of PROFILES. Defaults to the BUDGET_MANAGER_PROFILE
+            environment variable, or "safe" if that is not set.
+    """
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV_VAR, DEFAULT_PROFILE)
+    if profile not in PROFILES:
+        raise ValueError(
+            f"Unknown connection profile '{profile}', expected one of: {', '.join(PROFILES)}."
+        )
+    cursor = connection.cursor()
+    for pragma, value in PROFILES[profile].items():
+        cursor.execute(f"PRAGMA {pragma} = {value}")
+
+
+def get_db_path() -> str:
+    return os.environ.get(DB_PATH_ENV_VAR, DB_PATH)
+
+
+def get_connection(profile: str | None = None, db_path: str | None = None):
+    connection = sqlite3.connect(db_path or get_db_path())
+    apply_profile(connection, profile)
     return connection
 
 
-def initialise_database():
-    connection = sqlite3.connect("budget_manager.db")
+def initialise_database(profile: str | None = None, db_path: str | None = None):
+    connection = get_connection(profile, db_path)
     create_tables(connection)
     return connection
 
 
+_shared = threading.local()
+
+
+def get_shared_connection(profile: str | None = None, db_path: str | None = None):
+    """
+    Returns an initialised connection that is opened once and reused by later calls.
+
+    Connections are cached per thread (SQLite connections cannot be shared between
+    threads) and per database file and profile, so repeated library calls pay for
+    opening the file and checking the schema only the first time.
+
+    Args:
+        profile (str | None): The connection profile, as for apply_profile.
+        db_path (str | None): The database file. Defaults to get_db_path().
+    Returns:
+        sqlite3.Connection: The cached connection. Close it with close_shared_connections.
+    """
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV_VAR, DEFAULT_PROFILE)
+    db_path = db_path or get_db_path()
+    key = (os.path.abspath(db_path), profile)
+
+    connections = _shared.__dict__.setdefault("connections", {})
+    if key not in connections:
+        connections[key] = initialise_database(profile, db_path)
+    return connections[key]
+
+
+def close_shared_connections():
+    """Closes every connection cached for the current thread by get_shared_connection."""
+    connections = _shared.__dict__.pop("connections", {})
+    for connection in connections.values():
+        connection.close()
+
+
+def to_minor_units(amount: float) -> int:
+    """
+    Converts an amount in major units (e.g. 12.34) to integer minor units (1234).
+
+    The amount is first rounded to six decimal places of a cent, so binary
+    representation error such as 1.005 * 100 == 100.49999999999999 is ignored,
+    and then rounded half away from zero to a whole cent.
+
+    Args:
+        amount (float): The amount in major units.
+    Returns:
+        int: The amount in minor units.
+    Raises:
+        ValueError: If the amount is not finite, or too large to store.
+    """
+    cents = round(float(amount) * MINOR_UNITS, 6)
+    try:
+        minor_units = int(copysign(floor(abs(cents) + 0.5), cents))
+    except OverflowError:
+        raise ValueError("Amount must be finite.") from None
+    if abs(minor_units) > MAX_MINOR_UNITS:
+        raise ValueError("Amount is too large to store.")
+    return minor_units
+
+
+def from_minor_units(amount: int) -> float:
+    """Converts an amount in integer minor units (1234) to major units (12.34)."""
+    return amount / MINOR_UNITS
+
+
+def transaction_hash(
+    budget_id: int | None,
+    amount: int,
+    date: str,
+    description: str | None,
+    source_id: str | None = None,
+) -> int:
+    """
+    Returns a 64-bit content hash identifying a transaction.
+
+    Registered as the SQL function content_hash. Transactions with the same hash and
+    occurrence number are duplicates, so re-importing rows that are already stored
+    has no effect. File imports compute the same hash in Polars (logic._content_hash),
+    so the two must be changed together.
+
+    Args:
+        budget_id (int | None): The transaction's budget.
+        amount (int): The amount in minor units.
+        date (str): The YYYY-MM-DD date.
+        description (str | None): The description.
+        source_id (str | None): An identifier from the source of the data, such as a
+            bank's transaction reference, which tells apart otherwise identical rows.
+    Returns:
+        int: The hash, as a signed 64-bit integer.
+    """
+    key = "\x1f".join(
+        (
+            "" if budget_id is None else str(budget_id),
+            str(amount),
+            str(date),
+            "" if description is None else description,
+            "" if source_id is None else source_id,
+        )
+    )
+    digest = blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def register_functions(connection):
+    """
+    Registers the SQL functions used by the schema and queries on a connection.
+
+    Called once per connection by create_tables: registering a function expires the
+    connection's cached prepared statements, so it must not be repeated per query.
+    """
+    connection.create_function("content_hash", 5, transaction_hash, deterministic=True)
+
+
 def create_tables(connection):
+    register_functions(connection)
+    cursor = connection.cursor()
+    cursor.execute(BUDGETS_TABLE_SQL.format("budgets"))
+    cursor.execute(TRANSACTIONS_TABLE_SQL.format("transactions"))
+    connection.commit()
+    create_database_version(connection)
+    add_day_column(connection)
+    migrate_amounts_to_minor_units(connection)
+    add_hash_columns(connection)
+    create_indexes(connection)
+    attach_archive(connection)
+    create_budget_totals(connection)
+    create_search_index(connection)
+
+
+def add_day_column(connection):
+    """
+    Adds the transactions.day column to databases created before it existed.
+
+    The day column holds each transaction's date as days since 1970-01-01, so date
+    ranges can be filtered with an index instead of parsing the date text.
+
+    Args:
+        connection: An open SQLite connection.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT name FROM pragma_table_info('transactions')")
+    if "day" in {row[0] for row in cursor.fetchall()}:
+        return
+    cursor.execute("ALTER TABLE transactions ADD COLUMN day INTEGER")
+    normalise_dates(connection)
+    cursor.execute(f"UPDATE transactions SET day = {EPOCH_DAY_SQL.format('date')}")
+    connection.commit()
+
+
+def _parse_legacy_date(text: str) -> str | None:
+    text = text.strip()
+    with suppress(ValueError):
+        # Also accepts dates with a time, such as 2025-01-15 10:30:00
+        return datetime.fromisoformat(text).date().isoformat()
+    for date_format in LEGACY_DATE_FORMATS:
+        with suppress(ValueError):
+            return datetime.strptime(text, date_format).date().isoformat()
+    return None
+
+
+def normalise_dates(connection):
+    """
+    Converts transaction dates stored in other formats to YYYY-MM-DD.
+
+    Databases created before dates were validated can hold dates such as 01/15/2025,
+    which date filters, periods and monthly totals cannot read. Those in one of
+    LEGACY_DATE_FORMATS are converted. Transactions whose dates cannot be read are
+    moved to the QUARANTINE_TABLE table, and listed, so they can be corrected and
+    added again rather than silently missing from reports.
+
+    Args:
+        connection: An open SQLite connection, not inside a transaction.
+    """
+    # date() accepts days past the end of a month such as 2025-02-30 unless a
+    # modifier makes it normalise them
     cursor = connection.cursor()
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS budgets (
-            id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            amount REAL NOT NULL
+        SELECT id, date FROM transactions
+        WHERE NOT (
+            date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+            AND date(date, '+0 days') IS date
         )
     """)
+    legacy = cursor.fetchall()
+    if not legacy:
+        return
+    converted = [(_parse_legacy_date(str(date)), row_id) for row_id, date in legacy]
+    unreadable = [(row_id,) for date, row_id in converted if date is None]
+
+    try:
+        cursor.execute("BEGIN")
+        cursor.executemany(
+            "UPDATE transactions SET date = ? WHERE id = ?",
+            [row for row in converted if row[0] is not None],
+        )
+        if unreadable:
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {QUARANTINE_TABLE} (
+                    id INTEGER PRIMARY KEY,
+                    budget_id INTEGER,
+                    amount,
+                    date TEXT,
+                    description TEXT
+                )
+            """)
+            cursor.executemany(
+                f"""
+                INSERT INTO {QUARANTINE_TABLE} (id, budget_id, amount, date, description)
+                SELECT id, budget_id, amount, date, description FROM transactions
+                WHERE id = ?
+                """,
+                unreadable,
+            )
+            cursor.executemany("DELETE FROM transactions WHERE id = ?", unreadable)
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    if unreadable:
+        ids = ", ".join(str(row[0]) for row in unreadable[:10])
+        if len(unreadable) > 10:
+            ids += f" and {len(unreadable) - 10} more"
+        print(
+            f"Database error: moved {len(unreadable)} transactions with unreadable "
+            f"dates to the {QUARANTINE_TABLE} table (ids {ids})."
+        )
+
+
+def migrate_amounts_to_minor_units(connection):
+    """
+    Converts budget and transaction amounts stored as REAL to integer minor units.
+
+    Databases created before amounts were stored in cents have REAL amount columns.
+    Such tables are rebuilt with INTEGER columns in a single transaction, and the
+    budget_totals table and its triggers are dropped so that create_budget_totals
+    recreates them from the converted amounts.
+
+    Args:
+        connection: An open SQLite connection.
+    """
+    tables = {
+        "budgets": ("id, name, {}", BUDGETS_TABLE_SQL),
+        "transactions": (
+            "id, budget_id, {}, date, description, day",
+            TRANSACTIONS_TABLE_SQL,
+        ),
+    }
+    cursor = connection.cursor()
+    legacy = []
+    for table in tables:
+        cursor.execute(
+            f"SELECT type FROM pragma_table_info('{table}') WHERE name = 'amount'"
+        )
+        if cursor.fetchone()[0].upper() == "REAL":
+            legacy.append(table)
+    if not legacy:
+        return
+
+    try:
+        cursor.execute("BEGIN")
+        for trigger in ("insert", "delete", "update"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS budget_totals_{trigger}")
+        cursor.execute("DROP TABLE IF EXISTS budget_totals")
+        for table in legacy:
+            columns, create_sql = tables[table]
+            cursor.execute(create_sql.format(f"{table}_new"))
+            cursor.execute(f"""
+                INSERT INTO {table}_new ({columns.format("amount")})
+                SELECT {columns.format(MINOR_UNITS_SQL.format("amount"))} FROM {table}
+            """)
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+
+
+def add_hash_columns(connection):
+    """
+    Adds and fills in the columns used to detect duplicate transactions.
+
+    Each transaction stores its content hash and an occurrence number, which counts
+    the earlier transactions with the same hash, so genuinely repeated rows (two
+    identical coffees on one day) remain distinct. Rows stored before the columns
+    existed, or written without them, are numbered in id order.
+
+    Args:
+        connection: An open SQLite connection.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT name FROM pragma_table_info('transactions')")
+    columns = {row[0] for row in cursor.fetchall()}
+    added = False
+    for column, column_type in (
+        ("source_id", "TEXT"),
+        ("hash", "INTEGER"),
+        ("occurrence", "INTEGER"),
+    ):
+        if column not in columns:
+            cursor.execute(
+                f"ALTER TABLE transactions ADD COLUMN {column} {column_type}"
+            )
+            added = True
+    # Runs on every start-up, so rows without a hash are found through the
+    # (hash, occurrence) index, and only those rows are numbered
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY,
-            budget_id INTEGER,
-            amount REAL NOT NULL,
-            date TEXT NOT NULL,
-            description TEXT,
-            FOREIGN KEY(budget_id) REFERENCES budgets(id)
+        UPDATE transactions
+        SET hash = content_hash(budget_id, amount, date, description, source_id)
+        WHERE hash IS NULL
+    """)
+    if not added and cursor.rowcount == 0:
+        connection.commit()
+        return
+    cursor.execute("""
+        UPDATE transactions SET occurrence = numbered.occurrence
+        FROM (
+            SELECT t.id,
+                ROW_NUMBER() OVER (PARTITION BY t.hash ORDER BY t.id) - 1 + COALESCE(
+                    (SELECT MAX(o.occurrence) + 1 FROM transactions o WHERE o.hash = t.hash),
+                    0
+                ) AS occurrence
+            FROM transactions t
+            WHERE t.occurrence IS NULL
+        ) AS numbered
+        WHERE transactions.id = numbered.id
+    """)
+    connection.commit()
+
+
+def create_indexes(connection):
+    """
+    Adds the indexes used by budget lookups and reports.
+
+    Safe to run on every start-up: existing indexes are left as they are, so older
+    databases are upgraded the first time they are opened.
+
+    Args:
+        connection: An open SQLite connection.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_budgets_name ON budgets (name)"
+        )
+    except sqlite3.IntegrityError:
+        cursor.execute(
+            "SELECT name FROM budgets GROUP BY name HAVING COUNT(*) > 1 ORDER BY name"
+        )
+        duplicates = ", ".join(f"'{row[0]}'" for row in cursor.fetchall())
+        print(
+            f"Database error: budget names must be unique, found duplicates {duplicates}."
+        )
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_hash
+        ON transactions (hash, occurrence)
+    """)
+    # Superseded by the index on the numeric day column
+    cursor.execute("DROP INDEX IF EXISTS idx_transactions_budget_date")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_transactions_budget_day
+        ON transactions (budget_id, day, amount)
+    """)
+    connection.commit()
+
+
+def _budget_totals_upsert(row: str, sign: str) -> str:
+    # Adds (or with sign "-" removes) one transaction row to its budget's monthly total
+    return f"""
+        INSERT INTO budget_totals (budget_id, month, total, count)
+        SELECT {row}.budget_id, {MONTH_SQL.format(row + ".date")}, {sign}{row}.amount, {sign}1
+        WHERE {row}.budget_id IS NOT NULL
+        ON CONFLICT (budget_id, month) DO UPDATE SET
+            total = total + excluded.total,
+            count = count + excluded.count;
+    """
+
+
+def create_budget_totals(connection):
+    """
+    Creates the budget_totals summary table and the triggers that keep it up to date.
+
+    budget_totals holds the amount spent and number of transactions per budget per month.
+    Triggers on the transactions table update it on every insert, update and delete, so
+    reports read one row per budget and month instead of every transaction. Databases
+    created before the table existed are filled from their transactions when upgraded.
+
+    Raises:
+        sqlite3.DatabaseError: If the table could not be filled, for example because a
+            transaction's date is not YYYY-MM-DD. The table is not left behind empty.
+
+    Args:
+        connection: An open SQLite connection.
+    """
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='budget_totals'"
+    )
+    exists = cursor.fetchone() is not None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS budget_totals (
+            budget_id INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (budget_id, month)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS budget_totals_insert
+        AFTER INSERT ON transactions
+        BEGIN {_budget_totals_upsert("NEW", "")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS budget_totals_delete
+        AFTER DELETE ON transactions
+        BEGIN {_budget_totals_upsert("OLD", "-")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS budget_totals_update
+        AFTER UPDATE OF budget_id, amount, date ON transactions
+        BEGIN
+            {_budget_totals_upsert("OLD", "-")}
+            {_budget_totals_upsert("NEW", "")}
+        END
+    """)
+    connection.commit()
+    if not exists and not rebuild_budget_totals(connection):
+        # An empty table would never be filled, as it is only built when it is created,
+        # so it is removed for the next start-up to build again once the cause is fixed
+        for trigger in ("insert", "delete", "update"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS budget_totals_{trigger}")
+        cursor.execute("DROP TABLE budget_totals")
+        connection.commit()
+        raise sqlite3.DatabaseError(
+            "Failed to build the budget_totals table from the transactions."
+        )
+
+
+def rebuild_budget_totals(connection) -> bool:
+    """
+    Recomputes the budget_totals summary table from the transactions, including archived ones.
+
+    Args:
+        connection: An open SQLite connection.
+    Returns:
+        bool: True if the totals were rebuilt, False if the rebuild was rolled back.
+    """
+    attach_archive(connection)
+    try:
+        with connection:
+            cursor = connection.cursor()
+            cursor.execute("DELETE FROM budget_totals")
+            cursor.execute(f"""
+                INSERT INTO budget_totals (budget_id, month, total, count)
+                SELECT budget_id, {MONTH_SQL.format("date")}, SUM(amount), COUNT(*)
+                FROM all_transactions
+                WHERE budget_id IS NOT NULL
+                GROUP BY 1, 2
+            """)
+            cursor.execute(BUMP_VERSION_SQL)
+        return True
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return False
+
+
+def check_budget_totals(connection) -> list[tuple[int, int, int, int]]:
+    """
+    Compares the budget_totals summary table with a full aggregation of the transactions.
+
+    Args:
+        connection: An open SQLite connection.
+    Returns:
+        list[tuple[int, int, int, int]]: (budget_id, month, stored_total, actual_total)
+            in minor units for every budget and month whose stored total or count is wrong.
+    """
+    attach_archive(connection)
+    cursor = connection.cursor()
+    cursor.execute(f"""
+        WITH actual AS (
+            SELECT budget_id, {MONTH_SQL.format("date")} AS month,
+                SUM(amount) AS total, COUNT(*) AS count
+            FROM all_transactions
+            WHERE budget_id IS NOT NULL
+            GROUP BY 1, 2
+        ),
+        stored AS (
+            SELECT budget_id, month, total, count
+            FROM budget_totals
+            WHERE count != 0 OR total != 0
+        )
+        SELECT s.budget_id, s.month, s.total, COALESCE(a.total, 0), s.count, COALESCE(a.count, 0)
+        FROM stored s LEFT JOIN actual a USING (budget_id, month)
+        UNION ALL
+        SELECT a.budget_id, a.month, 0, a.total, 0, a.count
+        FROM actual a LEFT JOIN stored s USING (budget_id, month)
+        WHERE s.budget_id IS NULL
+        ORDER BY 1, 2
+    """)
+    return [
+        (budget_id, month, stored, actual)
+        for budget_id, month, stored, actual, stored_count, actual_count in cursor
+        if stored_count != actual_count or stored != actual
+    ]
+
+
+# Descriptions are split into words ignoring case and accents, and words of up to three
+# characters are also indexed by prefix, so short prefix queries such as "wh*" are fast
+SEARCH_INDEX_OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+
+def _create_search_index(cursor, schema: str, table: str) -> bool:
+    # An external-content FTS5 table indexes the descriptions of a transactions table
+    # without storing a second copy of them, kept in sync by triggers
+    index = f"{table}_fts"
+    cursor.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?",
+        (index,),
+    )
+    if cursor.fetchone() is not None:
+        return False
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE {schema}.{index} USING fts5(
+            description, content = '{table}', content_rowid = 'id', {SEARCH_INDEX_OPTIONS}
+        )
+    """)
+    insert = (
+        f"INSERT INTO {index} (rowid, description) VALUES (NEW.id, NEW.description);"
+    )
+    delete = f"""
+        INSERT INTO {index} ({index}, rowid, description)
+        VALUES ('delete', OLD.id, OLD.description);
+    """
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {schema}.{index}_insert AFTER INSERT ON {table}
+        BEGIN {insert} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {schema}.{index}_delete AFTER DELETE ON {table}
+        BEGIN {delete} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {schema}.{index}_update AFTER UPDATE OF description ON {table}
+        BEGIN {delete} {insert} END
+    """)
+    return True
+
+
+def create_search_index(connection):
+    """
+    Creates the full-text indexes of transaction descriptions used by search.
+
+    The main transactions table and each archived year have an FTS5 index, which
+    triggers update on every insert, update and delete, including bulk imports and
+    archiving. Tables created before their index are indexed when upgraded.
+
+    Args:
+        connection: An open SQLite connection, with the archive attached if there is one.
+    """
+    cursor = connection.cursor()
+    tables = [("main", "transactions")] + [
+        (ARCHIVE_SCHEMA, ARCHIVE_TABLE.format(year))
+        for year in get_archived_years(connection)
+    ]
+    for schema, table in tables:
+        if _create_search_index(cursor, schema, table):
+            cursor.execute(
+                f"INSERT INTO {schema}.{table}_fts ({table}_fts) VALUES ('rebuild')"
+            )
+    connection.commit()
+
+
+def get_archive_path(connection) -> str | None:
+    """
+    Returns the archive database file that belongs with a connection's main database.
+
+    Args:
+        connection: An open SQLite connection.
+    Returns:
+        str | None: The path, such as budget_manager.archive.db for budget_manager.db,
+            or None if the main database is in memory.
+    """
+    db_file = get_database_file(connection)
+    if db_file is None:
+        return None
+    root, extension = os.path.splitext(db_file)
+    return f"{root}.{ARCHIVE_SCHEMA}{extension or '.db'}"
+
+
+def get_report_cache_dir(connection) -> str | None:
+    """
+    Returns the directory for reports cached on disk, next to the main database file.
+
+    Args:
+        connection: An open SQLite connection.
+    Returns:
+        str | None: The path, such as budget_manager.report-cache for budget_manager.db,
+            or None if the main database is in memory.
+    """
+    db_file = get_database_file(connection)
+    if db_file is None:
+        return None
+    return f"{os.path.splitext(db_file)[0]}.report-cache"
+
+
+def get_database_file(connection) -> str | None:
+    """
+    Returns the path of the main database file of a connection.
+
+    Args:
+        connection: An open SQLite connection.
+    Returns:
+        str | None: The absolute path, or None if the main database is in memory.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT file FROM pragma_database_list WHERE name = 'main'")
+    return cursor.fetchone()[0] or None
+
+
+def find_ledgers(paths: list[str]) -> list[str]:
+    """
+    Lists the ledger database files given as files or as directories of *.db files.
+
+    Archive databases found in directories are skipped, as they belong with their main
+    database. Paths that are not directories are kept as they are, so missing files
+    are still reported.
+
+    Args:
+        paths (list[str]): Database files or directories holding them.
+    Returns:
+        list[str]: The database files, without duplicates, in the order given.
+    """
+    ledgers = []
+    for path in paths:
+        if os.path.isdir(path):
+            ledgers.extend(
+                db_file
+                for db_file in sorted(glob.glob(os.path.join(path, "*.db")))
+                if not db_file.endswith(f".{ARCHIVE_SCHEMA}.db")
+            )
+        else:
+            ledgers.append(path)
+    return list(dict.fromkeys(ledgers))
+
+
+def get_archived_years(connection) -> list[int]:
+    """Returns the years whose transactions have been moved to the attached archive."""
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT 1 FROM pragma_database_list WHERE name = ?", (ARCHIVE_SCHEMA,)
+    )
+    if cursor.fetchone() is None:
+        return []
+    cursor.execute(f"""
+        SELECT substr(name, 14) FROM {ARCHIVE_SCHEMA}.sqlite_master
+        WHERE type = 'table' AND name GLOB 'transactions_[0-9][0-9][0-9][0-9]'
+        ORDER BY name
+    """)
+    return [int(row[0]) for row in cursor.fetchall()]
+
+
+def attach_archive(connection, create: bool = False) -> bool:
+    """
+    Attaches the archive database, if there is one, and creates the transaction views.
+
+    The temporary view all_transactions combines the transactions table with every
+    archived year, and archived_transactions holds the archived years alone. Views are
+    per connection, and another connection may archive transactions at any time, so
+    every operation that reads archived transactions calls this first. The views are
+    only recreated when the archived years have changed.
+
+    Args:
+        connection: An open SQLite connection. Inside a transaction, an archive that is
+            not attached yet is left for the next call, as SQLite cannot attach one.
+        create (bool): Create the archive database file if it does not exist.
+    Returns:
+        bool: True if the archive is attached.
+    """
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT 1 FROM pragma_database_list WHERE name = ?", (ARCHIVE_SCHEMA,)
+    )
+    attached = cursor.fetchone() is not None
+    if not attached and not connection.in_transaction:
+        archive_path = get_archive_path(connection)
+        if archive_path is not None and (create or os.path.exists(archive_path)):
+            cursor.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path,))
+            attached = True
+
+    archived = [
+        f"SELECT {TRANSACTION_COLUMNS} FROM {ARCHIVE_SCHEMA}.{ARCHIVE_TABLE.format(year)}"
+        for year in get_archived_years(connection)
+    ]
+    views = {
+        "all_transactions": " UNION ALL ".join(
+            [f"SELECT {TRANSACTION_COLUMNS} FROM main.transactions", *archived]
+        ),
+        "archived_transactions": " UNION ALL ".join(archived),
+    }
+    # SQLite stores temporary views as CREATE VIEW statements
+    cursor.execute("SELECT name, sql FROM sqlite_temp_master WHERE type = 'view'")
+    existing = dict(cursor.fetchall())
+    for name, query in views.items():
+        if existing.get(name) == (f"CREATE VIEW {name} AS {query}" if query else None):
+            continue
+        cursor.execute(f"DROP VIEW IF EXISTS temp.{name}")
+        if query:
+            cursor.execute(f"CREATE TEMP VIEW {name} AS {query}")
+    return attached
+
+
+def _has_archived_transactions(connection) -> bool:
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT 1 FROM sqlite_temp_master WHERE type = 'view' AND name = 'archived_transactions'"
+    )
+    return cursor.fetchone() is not None
+
+
+def _transactions_tables(
+    connection, start_date: str | None = None, end_date: str | None = None
+) -> list[str]:
+    # Archived years outside the date range are left out of the query entirely, so
+    # reports on recent periods only read the main database
+    attach_archive(connection)
+    years = [
+        year
+        for year in get_archived_years(connection)
+        if (start_date is None or year >= int(start_date[:4]))
+        and (end_date is None or year <= int(end_date[:4]))
+    ]
+    return ["main.transactions"] + [
+        f"{ARCHIVE_SCHEMA}.{ARCHIVE_TABLE.format(year)}" for year in years
+    ]
+
+
+def _day_conditions(start_date: str | None, end_date: str | None) -> list[str]:
+    # Compares t.day with the :start_date and :end_date parameters
+    conditions = []
+    if start_date is not None:
+        conditions.append(f"t.day >= {EPOCH_DAY_SQL.format(':start_date')}")
+    if end_date is not None:
+        conditions.append(f"t.day <= {EPOCH_DAY_SQL.format(':end_date')}")
+    return conditions
+
+
+def archive_transactions(connection, before_year: int) -> int | None:
+    """
+    Moves the transactions dated before a year to the archive database, a table per year.
+
+    The main database then holds only recent transactions, so it stays small for inserts
+    and reports on recent periods, and it is vacuumed to release the freed space. Budget
+    totals are unchanged, reports whose date range includes archived years read them
+    too, and re-imported rows that are already archived are skipped as duplicates.
+    Transactions added later for an archived year are stored in the main database until
+    the next time that year is archived.
+
+    The rows are copied and deleted in one transaction. In WAL mode that transaction is
+    atomic for each database file but not across both, so a crash while committing can
+    leave rows in both files, which check_budget_totals then reports.
+
+    Args:
+        connection: An open SQLite connection to a database file.
+        before_year (int): Archive transactions dated before 1 January of this year.
+    Returns:
+        int | None: The number of transactions archived, or None if the move was rolled back.
+    """
+    cutoff = EPOCH_DAY_SQL.format("?")
+    cutoff_date = f"{before_year:04d}-01-01"
+    try:
+        attach_archive(connection, create=True)
+        cursor = connection.cursor()
+        cursor.execute(
+            f"""
+            SELECT DISTINCT CAST(substr(date, 1, 4) AS INTEGER)
+            FROM main.transactions WHERE day < {cutoff} ORDER BY 1
+            """,
+            (cutoff_date,),
+        )
+        years = [row[0] for row in cursor.fetchall()]
+        if not years:
+            return 0
+
+        moved = 0
+        cursor.execute("BEGIN")
+        for year in years:
+            table = f"{ARCHIVE_SCHEMA}.{ARCHIVE_TABLE.format(year)}"
+            cursor.execute(TRANSACTIONS_TABLE_SQL.format(table))
+            index = f"{ARCHIVE_SCHEMA}.idx_{ARCHIVE_TABLE.format(year)}"
+            cursor.execute(f"""
+                CREATE UNIQUE INDEX IF NOT EXISTS {index}_hash
+                ON {ARCHIVE_TABLE.format(year)} (hash, occurrence)
+            """)
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS {index}_budget_day
+                ON {ARCHIVE_TABLE.format(year)} (budget_id, day, amount)
+            """)
+            _create_search_index(cursor, ARCHIVE_SCHEMA, ARCHIVE_TABLE.format(year))
+            # Rows repeating a transaction that is already archived, such as one added
+            # again after its year was archived, are numbered after the archived ones
+            with phase("insert"):
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table}
+                        (budget_id, amount, date, description, day, source_id, hash, occurrence)
+                    SELECT t.budget_id, t.amount, t.date, t.description, t.day, t.source_id,
+                        t.hash, COALESCE(
+                            (SELECT MAX(a.occurrence) FROM {table} a WHERE a.hash = t.hash)
+                                + ROW_NUMBER() OVER (PARTITION BY t.hash ORDER BY t.occurrence, t.id),
+                            t.occurrence
+                        )
+                    FROM main.transactions t
+                    WHERE t.day >= {cutoff} AND t.day < {cutoff}
+                    ORDER BY t.id
+                    """,
+                    (f"{year:04d}-01-01", f"{year + 1:04d}-01-01"),
+                )
+            moved += cursor.rowcount
+
+        # The delete triggers subtract the archived rows from budget_totals, so they are
+        # added first to leave the totals unchanged
+        cursor.execute(
+            f"""
+            INSERT INTO budget_totals (budget_id, month, total, count)
+            SELECT budget_id, {MONTH_SQL.format("date")}, SUM(amount), COUNT(*)
+            FROM main.transactions
+            WHERE day < {cutoff} AND budget_id IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (budget_id, month) DO UPDATE SET
+                total = total + excluded.total,
+                count = count + excluded.count
+            """,
+            (cutoff_date,),
+        )
+        with phase("insert"):
+            cursor.execute(
+                f"DELETE FROM main.transactions WHERE day < {cutoff}", (cutoff_date,)
+            )
+        count("rows_archived", moved)
+        cursor.execute(BUMP_VERSION_SQL)
+        with phase("commit"):
+            connection.commit()
+    except sqlite3.Error as e:
+        if connection.in_transaction:
+            connection.rollback()
+        print(f"Database error: {e}")
+        return None
+
+    attach_archive(connection)
+    connection.execute("VACUUM main")
+    return moved
+
+
+# Bumps the write counter, in the same database transaction as the write it records
+BUMP_VERSION_SQL = "UPDATE database_version SET version = version + 1"
+
+
+def create_database_version(connection):
+    """
+    Creates the database_version table, which identifies the database and counts writes.
+
+    Its single row holds a random database_id, set when the table is created, and a
+    version that every write function in this module increments before committing, so
+    results computed from the data, such as reports, can be cached until it changes.
+    Unlike PRAGMA data_version, the version also counts this connection's own writes and
+    is the same for every process reading the database.
+
+    Args:
+        connection: An open SQLite connection.
+    """
+    cursor = connection.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS database_version (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            database_id TEXT NOT NULL,
+            version INTEGER NOT NULL
         )
     """)
+    cursor.execute("""
+        INSERT INTO database_version (id, database_id, version)
+        SELECT 0, lower(hex(randomblob(16))), 0
+        WHERE NOT EXISTS (SELECT 1 FROM database_version)
+    """)
     connection.commit()
 
 
+def get_database_version(connection) -> tuple[str, int]:
+    """
+    Returns the database's id and write counter.
+
+    Args:
+        connection: An open SQLite connection.
+    Returns:
+        tuple[str, int]: (database_id, version). The version changes whenever budgets,
+            transactions or budget totals are written through this module.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT database_id, version FROM database_version")
+    return cursor.fetchone()
+
+
 def get_budget_id_by_name(connection, name: str) -> int | None:
     cursor = connection.cursor()
     query = "SELECT id FROM budgets WHERE name=?"
@@ -54,7 +1071,7 @@ def get_budget_amount_by_name(connection, name: str) -> float | None:
     cursor.execute(query, (name,))
     row = cursor.fetchone()
     if row:
-        return row[0]
+        return from_minor_units(row[0])
     return None
 
 
@@ -62,28 +1079,243 @@ def insert_budget(connection, name: str, amount: float) -> bool:
     try:
         cursor = connection.cursor()
         query = "INSERT INTO budgets (name, amount) VALUES (?, ?)"
-        cursor.execute(query, (name, amount))
-        connection.commit()
+        with phase("insert"):
+            cursor.execute(query, (name, to_minor_units(amount)))
+            cursor.execute(BUMP_VERSION_SQL)
+        count("budgets_inserted")
+        with phase("commit"):
+            connection.commit()
         return True
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError) as e:
         print(f"Database error: {e}")
         return False
 
 
+# Inserts one transaction. Repeating a transaction that is already stored adds another
+# occurrence of it.
+INSERT_TRANSACTION_SQL = f"""
+    INSERT INTO transactions (budget_id, amount, date, description, day, hash, occurrence)
+    SELECT ?1, ?2, ?3, ?4, {EPOCH_DAY_SQL.format("?3")}, h.hash, (
+        SELECT COALESCE(MAX(occurrence) + 1, 0) FROM transactions WHERE hash = h.hash
+    )
+    FROM (SELECT content_hash(?1, ?2, ?3, ?4, NULL) AS hash) AS h
+"""
+
+
 def insert_transaction(
     connection, budget_id: int, amount: float, date: str, description: str
 ) -> bool:
     try:
         cursor = connection.cursor()
-        query = "INSERT INTO transactions (budget_id, amount, date, description) VALUES (?, ?, ?, ?)"
-        cursor.execute(query, (budget_id, amount, date, description))
-        connection.commit()
+        with phase("insert"):
+            cursor.execute(
+                INSERT_TRANSACTION_SQL,
+                (budget_id, to_minor_units(amount), date, description),
+            )
+            cursor.execute(BUMP_VERSION_SQL)
+        count("rows_inserted")
+        with phase("commit"):
+            connection.commit()
         return True
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError) as e:
         print(f"Database error: {e}")
         return False
 
 
+class TransactionWriter:
+    """
+    Inserts single transactions and commits them in groups rather than one by one.
+
+    Each commit waits for the database file to be synced (under the "safe" profile), which
+    limits one-commit-per-row writers to a few hundred rows per second. The writer instead
+    commits once max_rows rows are pending, or on the first add at least max_delay_ms after
+    the oldest pending row, and whenever flush is called or its context manager exits.
+
+    Durability: a row is durable only once the commit that includes it has returned.
+    Until then it is visible to this connection but not to others, and a crash, power
+    loss or failed commit discards every pending row. The delay is only checked when a
+    row is added, so callers with pauses in their input should call flush when idle.
+    A row that fails to insert is reported and does not affect the other pending rows.
+
+    Args:
+        connection: An open SQLite connection, not used for other writes meanwhile.
+        max_rows (int): The number of pending rows that triggers a commit.
+        max_delay_ms (float): The age of the oldest pending row that triggers a commit.
+    """
+
+    def __init__(
+        self,
+        connection,
+        max_rows: int = DEFAULT_GROUP_ROWS,
+        max_delay_ms: float = DEFAULT_GROUP_DELAY_MS,
+    ):
+        if max_rows < 1:
+            raise ValueError("max_rows must be a positive integer.")
+        if max_delay_ms < 0:
+            raise ValueError("max_delay_ms must not be negative.")
+        self.connection = connection
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self.pending = 0
+        self._cursor = connection.cursor()
+        self._oldest = 0.0
+
+    def add(self, budget_id: int, amount: float, date: str, description: str) -> bool:
+        """
+        Inserts a transaction, committing the pending rows if a limit has been reached.
+
+        Returns:
+            bool: False if the row could not be inserted or the commit failed.
+        """
+        try:
+            with phase("insert"):
+                self._cursor.execute(
+                    INSERT_TRANSACTION_SQL,
+                    (budget_id, to_minor_units(amount), date, description),
+                )
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Database error: {e}")
+            return False
+        count("rows_inserted")
+
+        self.pending += 1
+        if self.pending == 1:
+            self._oldest = time.monotonic()
+        if (
+            self.pending >= self.max_rows
+            or time.monotonic() - self._oldest >= self.max_delay
+        ):
+            return self.flush()
+        return True
+
+    def flush(self) -> bool:
+        """
+        Commits every pending row.
+
+        Returns:
+            bool: True if the rows were committed, False if they were rolled back.
+        """
+        if not self.pending:
+            return True
+        try:
+            self._cursor.execute(BUMP_VERSION_SQL)
+            with phase("commit"):
+                self.connection.commit()
+            return True
+        except sqlite3.Error as e:
+            self.connection.rollback()
+            print(f"Database error: {e}")
+            return False
+        finally:
+            self.pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+
+def insert_transactions(
+    connection, transactions, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int | None:
+    """
+    Inserts many transactions inside a single database transaction, skipping duplicates.
+
+    Each chunk of rows is written with executemany to a temporary staging table, then
+    moved to the transactions table with a set-based INSERT, and the staging table is
+    emptied again, so memory use depends on chunk_size and not on the size of the
+    import. Everything is committed once at the end, so either every new row is stored
+    or, on any error, none of them are.
+
+    A row is a duplicate if a transaction with the same content hash and occurrence
+    number is already stored, so importing a file again, or a file that overlaps an
+    earlier one, only adds the new rows. Moving rows through the staging table rather
+    than inserting them one by one lets the search index take each chunk at once.
+
+    Args:
+        connection: An open SQLite connection, not inside a transaction.
+        transactions: An iterable of (budget_id, amount, date, description, source_id,
+            hash, occurrence) tuples, with amounts in integer minor units. source_id may
+            be None. hash is the row's transaction_hash, and occurrence the number of
+            identical rows before it in the same file.
+        chunk_size (int): The number of rows staged and inserted at a time.
+    Returns:
+        int | None: The number of duplicate rows skipped, or None if the import was
+            rolled back.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer.")
+    attach_archive(connection)
+    cursor = connection.cursor()
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS transaction_staging (
+            seq INTEGER PRIMARY KEY,
+            budget_id INTEGER,
+            amount INTEGER,
+            date TEXT,
+            description TEXT,
+            source_id TEXT,
+            hash INTEGER,
+            occurrence INTEGER
+        )
+    """)
+    stage_query = """
+        INSERT INTO transaction_staging
+            (budget_id, amount, date, description, source_id, hash, occurrence)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+    # Rows that are already archived are duplicates too
+    archived = "true"
+    if _has_archived_transactions(connection):
+        archived = """NOT EXISTS (
+            SELECT 1 FROM archived_transactions a
+            WHERE a.hash = s.hash AND a.occurrence = s.occurrence
+        )"""
+    # Only duplicate rows are skipped; any other constraint violation aborts the import
+    insert_query = f"""
+        INSERT INTO transactions
+            (budget_id, amount, date, description, day, source_id, hash, occurrence)
+        SELECT budget_id, amount, date, description, {EPOCH_DAY_SQL.format("date")},
+            source_id, hash, occurrence
+        FROM transaction_staging AS s
+        WHERE {archived}
+        ORDER BY seq
+        ON CONFLICT (hash, occurrence) DO NOTHING
+    """
+    try:
+        cursor.execute("DELETE FROM transaction_staging")
+        staged = inserted = 0
+        for chunk in batched(transactions, chunk_size, strict=False):
+            with phase("insert"):
+                cursor.executemany(stage_query, chunk)
+                cursor.execute(insert_query)
+                inserted += cursor.rowcount
+                cursor.execute("DELETE FROM transaction_staging")
+            staged += len(chunk)
+        if inserted:
+            cursor.execute(BUMP_VERSION_SQL)
+        count("rows_inserted", inserted)
+        count("rows_skipped", staged - inserted)
+        with phase("commit"):
+            connection.commit()
+        return staged - inserted
+    except sqlite3.Error as e:
+        connection.rollback()
+        print(f"Database error: {e}")
+        return None
+    except BaseException:
+        connection.rollback()
+        raise
+
+
+def get_budget_ids(connection) -> dict[str, int]:
+    cursor = connection.cursor()
+    query = "SELECT name, id FROM budgets"
+    cursor.execute(query)
+    return dict(cursor.fetchall())
+
+
 def get_all_budget_names(connection):
     cursor = connection.cursor()
     query = "SELECT name FROM budgets"
@@ -92,9 +1324,301 @@ def get_all_budget_names(connection):
     return [row[0] for row in rows]
 
 
+def select_budgets(connection) -> list[tuple[int, str, int]]:
+    """Returns (id, name, amount) for every budget, with amounts in minor units."""
+    cursor = connection.cursor()
+    cursor.execute("SELECT id, name, amount FROM budgets ORDER BY id")
+    return cursor.fetchall()
+
+
+def get_transaction_counts(connection, last_id: int) -> tuple[int, int, int]:
+    """
+    Counts transactions to tell whether a copy of them made earlier is still complete.
+
+    Args:
+        connection: An open SQLite connection.
+        last_id (int): The highest transaction id when the copy was made.
+    Returns:
+        tuple[int, int, int]: The highest transaction id in the main database now, the
+            number of transactions there with ids up to last_id, and the number of
+            archived transactions.
+    """
+    attach_archive(connection)
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT COALESCE(MAX(id), 0), COALESCE(SUM(id <= ?1), 0) FROM main.transactions",
+        (last_id,),
+    )
+    max_id, copied = cursor.fetchone()
+    archived = 0
+    if _has_archived_transactions(connection):
+        cursor.execute("SELECT COUNT(*) FROM archived_transactions")
+        archived = cursor.fetchone()[0]
+    return max_id, copied, archived
+
+
+def iter_transaction_chunks(
+    connection,
+    after_id: int,
+    up_to_id: int,
+    include_archived: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    """
+    Reads the transactions in a range of ids in chunks, rather than with one fetchall.
+
+    Args:
+        connection: An open SQLite connection.
+        after_id (int): Only read transactions with a greater id.
+        up_to_id (int): Only read transactions with this id or lower.
+        include_archived (bool): Also read every archived transaction, first.
+        chunk_size (int): The number of rows in each chunk.
+    Returns:
+        Iterator[list[tuple]]: Lists of (budget_id, amount, date, description, source_id)
+            rows, with amounts in minor units.
+    """
+    columns = "budget_id, amount, date, description, source_id"
+    queries = [
+        (
+            f"SELECT {columns} FROM main.transactions WHERE id > ? AND id <= ? ORDER BY id",
+            (after_id, up_to_id),
+        )
+    ]
+    if include_archived:
+        attach_archive(connection)
+    if include_archived and _has_archived_transactions(connection):
+        queries.insert(0, (f"SELECT {columns} FROM archived_transactions", ()))
+    cursor = connection.cursor()
+    for query, params in queries:
+        cursor.execute(query, params)
+        while chunk := cursor.fetchmany(chunk_size):
+            yield chunk
+
+
 def select_transactions_by_budget_id(connection, budget_id: int):
+    attach_archive(connection)
     cursor = connection.cursor()
-    query = "SELECT amount, date, description FROM transactions WHERE budget_id=?"
+    query = "SELECT amount, date, description FROM all_transactions WHERE budget_id=?"
     cursor.execute(query, (budget_id,))
-    rows = cursor.fetchall()
-    return rows
+    return [
+        (from_minor_units(amount), date, description)
+        for amount, date, description in cursor.fetchall()
+    ]
+
+
+def select_budget_totals(
+    connection,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    budget_name: str | None = None,
+) -> list[tuple[str, int, int]]:
+    """
+    Aggregates the total spent against every budget in a single query.
+
+    Budgets without any transactions are included with a total of zero.
+
+    Args:
+        connection: An open SQLite connection.
+        start_date (str | None): Only count transactions on or after this YYYY-MM-DD date.
+        end_date (str | None): Only count transactions on or before this YYYY-MM-DD date.
+        budget_name (str | None): Only report on the budget with this name.
+    Returns:
+        list[tuple[str, int, int]]: (name, amount, total_spent) in minor units for each
+            budget, in the order the budgets were created.
+    """
+    cursor = connection.cursor()
+
+    # Without a date range the monthly summary table has everything the report needs
+    if start_date is None and end_date is None:
+        query = """
+            SELECT b.name, b.amount, COALESCE(SUM(bt.total), 0)
+            FROM budgets b
+            LEFT JOIN budget_totals bt ON bt.budget_id = b.id
+            WHERE ?1 IS NULL OR b.name = ?1
+            GROUP BY b.id
+            ORDER BY b.id
+        """
+        cursor.execute(query, (budget_name,))
+        return cursor.fetchall()
+
+    # Each table, main or archived, is summed by its own correlated subquery, so every
+    # lookup uses the table's (budget_id, day) index instead of scanning a union
+    conditions = " AND ".join(
+        ["t.budget_id = b.id", *_day_conditions(start_date, end_date)]
+    )
+    spent = " + ".join(
+        f"(SELECT COALESCE(SUM(t.amount), 0) FROM {table} t WHERE {conditions})"
+        for table in _transactions_tables(connection, start_date, end_date)
+    )
+    query = f"""
+        SELECT b.name, b.amount, {spent}
+        FROM budgets b
+        WHERE :budget_name IS NULL OR b.name = :budget_name
+        ORDER BY b.id
+    """
+    params = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "budget_name": budget_name,
+    }
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+def select_period_totals(
+    connection,
+    period: str = "month",
+    start_date: str | None = None,
+    end_date: str | None = None,
+    budget_name: str | None = None,
+) -> list[tuple[str, int, str, int, int]]:
+    """
+    Aggregates the amount spent against every budget per month or week in a single query.
+
+    Only periods with transactions are included. Monthly totals without a date range
+    are read from the budget_totals summary table.
+
+    Args:
+        connection: An open SQLite connection.
+        period (str): One of PERIODS, "month" or "week".
+        start_date (str | None): Only count transactions on or after this YYYY-MM-DD date.
+        end_date (str | None): Only count transactions on or before this YYYY-MM-DD date.
+        budget_name (str | None): Only report on the budget with this name.
+    Returns:
+        list[tuple[str, int, str, int, int]]: (name, amount, period_start, total_spent,
+            cumulative_spent) in minor units, ordered by budget creation and then period.
+    """
+    if period not in PERIODS:
+        raise ValueError(
+            f"Unknown report period '{period}', expected one of: {', '.join(PERIODS)}."
+        )
+    cursor = connection.cursor()
+
+    if period == "month" and start_date is None and end_date is None:
+        query = """
+            SELECT b.name, b.amount, printf('%04d-%02d-01', bt.month / 100, bt.month % 100),
+                bt.total, SUM(bt.total) OVER (PARTITION BY b.id ORDER BY bt.month)
+            FROM budgets b
+            JOIN budget_totals bt ON bt.budget_id = b.id
+            WHERE (?1 IS NULL OR b.name = ?1) AND bt.count != 0
+            ORDER BY b.id, bt.month
+        """
+        cursor.execute(query, (budget_name,))
+        return cursor.fetchall()
+
+    key_sql, start_sql = PERIODS[period]
+    # The filters are repeated in each table's SELECT, so that every archived year is
+    # read through its (budget_id, day) index rather than from a materialised union.
+    # CROSS JOIN keeps budgets as the outer loop, which SQLite would otherwise reorder.
+    conditions = _day_conditions(start_date, end_date)
+    if budget_name is not None:
+        conditions.append("b.name = :budget_name")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    source = " UNION ALL ".join(
+        f"""
+        SELECT b.id AS budget_id, b.name, b.amount AS budget_amount, t.amount, t.date, t.day
+        FROM budgets b
+        CROSS JOIN {table} t ON t.budget_id = b.id
+        {where}
+        """
+        for table in _transactions_tables(connection, start_date, end_date)
+    )
+
+    # The period's first day is computed once per group rather than once per row
+    query = f"""
+        SELECT t.name, t.budget_amount, {start_sql.format(key_sql)}, SUM(t.amount),
+            SUM(SUM(t.amount)) OVER (PARTITION BY t.budget_id ORDER BY {key_sql})
+        FROM ({source}) t
+        GROUP BY t.budget_id, {key_sql}
+        ORDER BY t.budget_id, {key_sql}
+    """
+    params = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "budget_name": budget_name,
+    }
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+def select_matching_transactions(
+    connection,
+    query: str,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    budget_name: str | None = None,
+    limit: int | None = None,
+) -> tuple[list[tuple[str, str, int, str]], int, int]:
+    """
+    Finds the transactions whose descriptions match a full-text query.
+
+    The query uses the FTS5 syntax: words must all appear, in any order and case,
+    "quoted words" must appear together as a phrase, and word* matches any word starting
+    with word. Archived years are searched too, unless outside the date range.
+
+    Args:
+        connection: An open SQLite connection.
+        query (str): The full-text query, e.g. '"whole foods" OR wholefds*'.
+        start_date (str | None): Only match transactions on or after this YYYY-MM-DD date.
+        end_date (str | None): Only match transactions on or before this YYYY-MM-DD date.
+        budget_name (str | None): Only match transactions of the budget with this name.
+        limit (int | None): The maximum number of transactions returned. The totals
+            always cover every match.
+    Returns:
+        tuple[list[tuple[str, str, int, str]], int, int]: (budget_name, date, amount,
+            description) for the matching transactions, most recent first, then the
+            number of matches and their total amount, in minor units.
+    Raises:
+        sqlite3.OperationalError: If the query is not valid FTS5 syntax.
+    """
+    attach_archive(connection)
+    tables = [("main", "transactions")] + [
+        (ARCHIVE_SCHEMA, ARCHIVE_TABLE.format(year))
+        for year in get_archived_years(connection)
+        if (start_date is None or year >= int(start_date[:4]))
+        and (end_date is None or year <= int(end_date[:4]))
+    ]
+    # Each index finds its matching rows, which are then looked up by id and filtered.
+    # CROSS JOIN keeps that order: probing the index once per row of a budget or date
+    # range is far slower on large tables.
+    conditions = ["{index} MATCH :query"]
+    if start_date is not None:
+        conditions.append(f"t.day >= {EPOCH_DAY_SQL.format(':start_date')}")
+    if end_date is not None:
+        conditions.append(f"t.day <= {EPOCH_DAY_SQL.format(':end_date')}")
+    if budget_name is not None:
+        conditions.append("b.name = :budget_name")
+    matches = " UNION ALL ".join(
+        f"""
+        SELECT b.name, t.date, t.amount, t.description, t.day, t.id
+        FROM {schema}.{table}_fts
+        CROSS JOIN {schema}.{table} t ON t.id = {table}_fts.rowid
+        CROSS JOIN budgets b ON b.id = t.budget_id
+        WHERE {" AND ".join(conditions).format(index=f"{table}_fts")}
+        """
+        for schema, table in tables
+    )
+    params = {
+        "query": query,
+        "start_date": start_date,
+        "end_date": end_date,
+        "budget_name": budget_name,
+        "limit": -1 if limit is None else limit,
+    }
+
+    cursor = connection.cursor()
+    with phase("search"):
+        cursor.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM ({matches})", params
+        )
+        matched, total = cursor.fetchone()
+        cursor.execute(
+            f"""
+            SELECT name, date, amount, description FROM ({matches})
+            ORDER BY day DESC, id DESC
+            LIMIT :limit
+            """,
+            params,
+        )
+        rows = cursor.fetchall()
+    return rows, matched, total
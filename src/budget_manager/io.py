@@ -1,5 +1,29 @@
-import polars
+from __future__ import annotations
+
 import os
+import glob
+from collections.abc import Iterator
+
+from budget_manager.lazy import lazy_import
+from budget_manager.metrics import count, phase
+
+# Loaded on first use, see budget_manager.lazy
+polars = lazy_import("polars")
+
+DEFAULT_BATCH_SIZE = 100_000
+
+# File formats recognised by their extension
+FILE_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "ipc",
+    ".ipc": "ipc",
+    ".feather": "ipc",
+}
+# The extension of files written in each format
+FORMAT_EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "ipc": ".arrow"}
+_FORMAT_NAMES = {"csv": "CSV", "parquet": "Parquet", "ipc": "Arrow IPC"}
 
 
 def read_csv_to_dataframe(file_path: str) -> polars.DataFrame:
@@ -15,7 +39,179 @@ def read_csv_to_dataframe(file_path: str) -> polars.DataFrame:
         raise FileNotFoundError(f"The file {file_path} does not exist.")
     else:
         try:
-            return polars.read_csv(file_path)
+            with phase("read"):
+                df = polars.read_csv(file_path)
+            count("rows_parsed", df.height)
+            return df
         except Exception as e:
             raise RuntimeError(f"Failed to read CSV file {file_path}: {e}") from e
             return None
+
+
+def detect_file_format(file_path: str, file_format: str | None = None) -> str:
+    """
+    Works out whether a file is CSV, Parquet or Arrow IPC.
+
+    Args:
+        file_path (str): The path to the file.
+        file_format (str | None): "csv", "parquet" or "ipc" to override the file extension.
+    Returns:
+        str: The file format.
+    """
+    if file_format is None:
+        extension = os.path.splitext(file_path)[1].lower()
+        file_format = FILE_FORMATS.get(extension, "csv")
+    if file_format not in set(FILE_FORMATS.values()):
+        raise ValueError(
+            f"Unsupported file format '{file_format}', expected csv, parquet or ipc."
+        )
+    return file_format
+
+
+def read_file_to_dataframe(
+    file_path: str, file_format: str | None = None
+) -> polars.DataFrame:
+    """
+    Reads a CSV, Parquet or Arrow IPC file and returns its contents as a Polars DataFrame.
+
+    Args:
+        file_path (str): The path to the file.
+        file_format (str | None): "csv", "parquet" or "ipc". Detected from the extension
+            if not given.
+    Returns:
+        polars.DataFrame: The contents of the file as a Polars DataFrame.
+    """
+    file_format = detect_file_format(file_path, file_format)
+    if file_format == "csv":
+        return read_csv_to_dataframe(file_path)
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"The file {file_path} does not exist.")
+    try:
+        with phase("read"):
+            if file_format == "parquet":
+                df = polars.read_parquet(file_path)
+            else:
+                df = polars.read_ipc(file_path)
+        count("rows_parsed", df.height)
+        return df
+    except Exception as e:
+        raise RuntimeError(
+            f"Failed to read {_FORMAT_NAMES[file_format]} file {file_path}: {e}"
+        ) from e
+
+
+def read_csv_in_batches(
+    file_path: str, batch_size: int = DEFAULT_BATCH_SIZE, infer_schema: bool = True
+) -> Iterator[polars.DataFrame]:
+    """
+    Streams a CSV file as a sequence of Polars DataFrames of at most batch_size rows.
+
+    Only one batch is held in memory at a time, so files larger than RAM can be processed.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        batch_size (int): The maximum number of rows in each batch.
+        infer_schema (bool): Infer column types from the start of the file. If False,
+            every column is read as text, so that a malformed value in a later batch
+            is left to the caller to validate instead of failing the read.
+    Returns:
+        Iterator[polars.DataFrame]: The contents of the CSV file, one batch at a time.
+    """
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"The file {file_path} does not exist.")
+    if batch_size < 1:
+        raise ValueError("batch_size must be a positive integer.")
+    scan = polars.scan_csv(file_path, infer_schema=infer_schema)
+    return _iter_batches(scan, file_path, "csv", batch_size)
+
+
+def read_file_in_batches(
+    file_path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    file_format: str | None = None,
+    infer_schema: bool = True,
+) -> Iterator[polars.DataFrame]:
+    """
+    Streams a CSV, Parquet or Arrow IPC file as Polars DataFrames of at most batch_size rows.
+
+    Args:
+        file_path (str): The path to the file.
+        batch_size (int): The maximum number of rows in each batch.
+        file_format (str | None): "csv", "parquet" or "ipc". Detected from the extension
+            if not given.
+        infer_schema (bool): If False, read every CSV column as text. Parquet and
+            Arrow IPC files keep their stored types.
+    Returns:
+        Iterator[polars.DataFrame]: The contents of the file, one batch at a time.
+    """
+    file_format = detect_file_format(file_path, file_format)
+    if file_format == "csv":
+        return read_csv_in_batches(file_path, batch_size, infer_schema)
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"The file {file_path} does not exist.")
+    if batch_size < 1:
+        raise ValueError("batch_size must be a positive integer.")
+    if file_format == "parquet":
+        scan = polars.scan_parquet(file_path)
+    else:
+        scan = polars.scan_ipc(file_path)
+    return _iter_batches(scan, file_path, file_format, batch_size)
+
+
+def _iter_batches(
+    scan: polars.LazyFrame, file_path: str, file_format: str, batch_size: int
+) -> Iterator[polars.DataFrame]:
+    try:
+        batches = iter(scan.collect_batches(chunk_size=batch_size))
+        while True:
+            with phase("read"):
+                batch = next(batches, None)
+            if batch is None:
+                break
+            count("rows_parsed", batch.height)
+            # The streaming engine may return larger chunks than requested
+            for offset in range(0, batch.height, batch_size):
+                yield batch.slice(offset, batch_size)
+    except polars.exceptions.PolarsError as e:
+        raise RuntimeError(
+            f"Failed to read {_FORMAT_NAMES[file_format]} file {file_path}: {e}"
+        ) from e
+
+
+def write_dataframe(
+    df: polars.DataFrame, file_path: str, file_format: str | None = None
+):
+    """
+    Writes a Polars DataFrame to a CSV, Parquet or Arrow IPC file.
+
+    Args:
+        df (polars.DataFrame): The data to write.
+        file_path (str): The path to the output file.
+        file_format (str | None): "csv", "parquet" or "ipc". Detected from the extension
+            if not given.
+    """
+    file_format = detect_file_format(file_path, file_format)
+    if file_format == "parquet":
+        df.write_parquet(file_path)
+    elif file_format == "ipc":
+        df.write_ipc(file_path)
+    else:
+        df.write_csv(file_path)
+
+
+def expand_file_patterns(patterns: list[str]) -> list[str]:
+    """
+    Expands glob patterns such as "exports/*.csv" into a sorted list of file paths.
+
+    Patterns that match nothing are kept as they are, so missing files are still reported.
+
+    Args:
+        patterns (list[str]): File paths or glob patterns.
+    Returns:
+        list[str]: The matching file paths, without duplicates, in the order given.
+    """
+    file_paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if any(c in pattern for c in "*?[") else []
+        file_paths.extend(matches or [pattern])
+    return list(dict.fromkeys(file_paths))
@@ -0,0 +1,40 @@
+"""
+Deferred imports for modules that are slow to load.
+
+Importing polars takes longer than most single CLI operations, such as adding one budget,
+take in total. Modules imported with lazy_import are loaded the first time one of their
+attributes is used, so commands that never touch a DataFrame do not pay for them.
+"""
+
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Returns a module that is only executed when one of its attributes is first accessed.
+
+    Modules that use this should start with `from __future__ import annotations`, so that
+    type annotations naming the module's classes do not load it when functions are defined.
+
+    Args:
+        name (str): The absolute name of the module, such as "polars".
+    Returns:
+        ModuleType: The module, which is also registered in sys.modules.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    # A normal import also binds a submodule to its package, e.g. concurrent.futures
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
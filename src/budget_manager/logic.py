@@ -1,16 +1,56 @@
-from math import fsum
-import polars as pl
-from budget_manager.io import read_csv_to_dataframe
+from __future__ import annotations
+
+import glob
+import os
+import sqlite3
+from contextlib import suppress
+from datetime import date as Date
+from functools import partial
+from hashlib import blake2b, sha256
+from itertools import repeat
+
+from budget_manager.lazy import lazy_import
+from budget_manager.metrics import count, phase
+from budget_manager.snapshot import SNAPSHOT_FORMATS, Snapshot, update_snapshot
+from budget_manager.io import (
+    DEFAULT_BATCH_SIZE,
+    FORMAT_EXTENSIONS,
+    read_file_in_batches,
+    read_file_to_dataframe,
+    write_dataframe,
+)
 from budget_manager.database import (
-    get_budget_amount_by_name,
-    get_connection,
+    DEFAULT_CHUNK_SIZE,
+    MAX_MINOR_UNITS,
+    MINOR_UNITS,
+    PERIODS,
+    TransactionWriter,
+    archive_transactions,
+    check_budget_totals,
+    from_minor_units,
+    to_minor_units,
+    get_archive_path,
+    get_database_file,
+    get_database_version,
+    rebuild_budget_totals,
+    get_shared_connection,
+    initialise_database,
     insert_budget,
     get_budget_id_by_name,
     insert_transaction,
-    get_all_budget_names,
-    select_transactions_by_budget_id,
+    insert_transactions,
+    get_budget_ids,
+    select_budget_totals,
+    select_matching_transactions,
+    select_period_totals,
 )
 
+# Loaded on first use, see budget_manager.lazy
+pl = lazy_import("polars")
+futures = lazy_import("concurrent.futures")
+multiprocessing = lazy_import("multiprocessing")
+tempfile = lazy_import("tempfile")
+
 
 def create_budget_category(name: str, amount: float, connection=None) -> str:
     # Validate the name and amount
@@ -18,32 +58,30 @@ def create_budget_category(name: str, amount: float, connection=None) -> str:
         return "Error: Budget name cannot be empty."
     try:
         amount = float(amount)
-    except ValueError:
+        minor_units = to_minor_units(amount)
+    except (TypeError, ValueError):
         return "Error: Amount must be a valid number."
-    if amount <= 0:
+    # Checked after rounding, as an amount under half a cent is stored as zero
+    if minor_units <= 0:
         return "Error: Budget amount must be greater than zero."
 
-    # Get a connection if not provided
+    # Reuse this thread's shared connection if none is provided
     if connection is None:
-        connection = get_connection()
-        need_to_close = True
-    else:
-        need_to_close = False
+        connection = get_shared_connection()
 
     # Add the budget to the database
     result = insert_budget(connection, name, amount)
 
-    if need_to_close:
-        connection.close()
-
     if result:
         return f"Budget '{name}' with amount {amount} added successfully."
     else:
         return "Error: Failed to add budget."
 
 
-def create_budget_categories_from_file(file_path: str, connection=None) -> str:
-    df = read_csv_to_dataframe(file_path)
+def create_budget_categories_from_file(
+    file_path: str, connection=None, file_format: str | None = None
+) -> str:
+    df = read_file_to_dataframe(file_path, file_format)
     if df is None:
         return "Error: Failed to read budget categories from the file."
 
@@ -53,12 +91,9 @@ def create_budget_categories_from_file(file_path: str, connection=None) -> str:
     if not required_columns.issubset(set(df.columns)):
         return f"Error: CSV file must contain the following columns: {', '.join(required_columns)}."
 
-    # Get a connection if not provided
+    # Reuse this thread's shared connection if none is provided
     if connection is None:
-        connection = get_connection()
-        need_to_close = True
-    else:
-        need_to_close = False
+        connection = get_shared_connection()
 
     # add each budget category separately
     for row in df.iter_rows(named=True):
@@ -69,38 +104,81 @@ def create_budget_categories_from_file(file_path: str, connection=None) -> str:
         if result.startswith("Error"):
             return f"Error adding budget category from file: {result}"
 
-    if need_to_close:
-        connection.close()
-
     return "All budget categories from the file added successfully."
 
 
-def add_single_transaction(
-    budget_name: str, amount: float, date: str, description: str, connection=None
-) -> str:
-    # Validate the inputs
+def _is_storable_amount(amount: float) -> bool:
+    # Amounts are stored as 64-bit integer minor units
+    try:
+        to_minor_units(amount)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_iso_date(date: str) -> bool:
+    # fromisoformat alone also accepts forms such as 20250101 and 2025-W01-1
+    if len(date) != 10 or date[4] != "-" or date[7] != "-":
+        return False
+    try:
+        Date.fromisoformat(date)
+        return True
+    except ValueError:
+        return False
+
+
+def _validate_transaction(
+    budget_name: str, amount: float, date: str, description: str
+) -> str | None:
     if budget_name.strip() == "":
         return "Error: Budget name cannot be empty."
     try:
-        float(amount)
+        if not _is_storable_amount(float(amount)):
+            return "Error: Amount must be a valid number."
     except ValueError:
         return "Error: Amount must be a valid number."
     if date.strip() == "":
         return "Error: Date cannot be empty."
+    if not _is_iso_date(date):
+        return "Error: Date must be in YYYY-MM-DD format."
     if description.strip() == "":
         return "Error: Description cannot be empty."
+    return None
+
 
-    # Get a connection if not provided
+def add_single_transaction(
+    budget_name: str,
+    amount: float,
+    date: str,
+    description: str,
+    connection=None,
+    budget_ids: dict[str, int] | None = None,
+    writer: TransactionWriter | None = None,
+) -> str:
+    # Validate the inputs
+    error = _validate_transaction(budget_name, amount, date, description)
+    if error:
+        return error
+
+    # Use the writer's connection, or reuse this thread's shared connection, if none
+    # is provided
     if connection is None:
-        connection = get_connection()
-        need_to_close = True
-    else:
-        need_to_close = False
+        connection = (
+            writer.connection if writer is not None else get_shared_connection()
+        )
 
-    # Check if the budget name exists in the database
-    budget_id = get_budget_id_by_name(connection, budget_name)
+    # Check if the budget name exists, in the caller's cache of budget ids if one
+    # is provided, and otherwise in the database
+    budget_id = budget_ids.get(budget_name) if budget_ids is not None else None
+    if budget_id is None:
+        budget_id = get_budget_id_by_name(connection, budget_name)
+        if budget_id is not None and budget_ids is not None:
+            budget_ids[budget_name] = budget_id
     if budget_id is None:
         return f"Error: Budget category '{budget_name}' does not exist."
+    elif writer is not None:
+        # Queue the transaction to be committed with others
+        result = writer.add(budget_id, amount, date, description)
     else:
         # Insert the transaction
         result = insert_transaction(
@@ -111,93 +189,1014 @@ def add_single_transaction(
             description,
         )
 
-    if need_to_close:
-        connection.close()
-
     if result:
         return f"Transaction for budget '{budget_name}' on date {date} with amount {amount} added successfully."
     else:
         return "Error: Failed to add transaction."
 
 
-def add_transactions_from_file(file_path: str, connection=None) -> str:
-    df = read_csv_to_dataframe(file_path)
-    if df is None:
-        return "Error: Failed to read transactions from the file."
+class _ImportAborted(Exception):
+    """Raised while streaming a file import so that every row written so far is rolled back."""
+
+
+def _load_budgets(connection) -> pl.DataFrame:
+    return pl.DataFrame(
+        list(get_budget_ids(connection).items()),
+        schema={"budget_name": pl.Utf8, "budget_id": pl.Int64},
+        orient="row",
+    )
+
+
+def _resolve_budget_ids(
+    df: pl.DataFrame, budgets: pl.DataFrame, first_row: int = 1
+) -> pl.DataFrame:
+    """
+    Adds a budget_id column to a transactions DataFrame by joining it with the budgets table.
+
+    Args:
+        df (pl.DataFrame): Transactions with a budget_name column.
+        budgets (pl.DataFrame): The budgets table, with budget_name and budget_id columns.
+        first_row (int): The row number of the first row of df within its file.
+    Returns:
+        pl.DataFrame: The joined DataFrame, with the 1-based row_number of each row within
+            its file. budget_id is null for unknown budget names.
+    """
+    with phase("resolve_budgets"):
+        return (
+            df.with_columns(pl.col("budget_name").cast(pl.Utf8))
+            .with_row_index("row_number", offset=first_row)
+            .join(budgets, on="budget_name", how="left", maintain_order="left")
+        )
+
+
+# The reason given for rows whose budget does not exist, which are reported by name
+_UNKNOWN_BUDGET = "Budget category does not exist."
+
+# Error messages list at most this many row numbers for each problem
+MAX_REPORTED_ROWS = 10
+
+
+def _parse_amount(dtype) -> pl.Expr:
+    # Text amounts, as read from CSV files, are null if they are not numbers
+    amount = pl.col("amount")
+    if dtype == pl.Utf8:
+        amount = amount.str.strip_chars()
+    return amount.cast(pl.Float64, strict=False)
+
+
+def _rejection_reason(amount: pl.Expr) -> pl.Expr:
+    """
+    Builds an expression giving the first problem found in each transaction row.
+
+    The checks match _validate_transaction, applied to every row at once.
+
+    Args:
+        amount (pl.Expr): The amount parsed as a float, null if it is not a number.
+    Returns:
+        pl.Expr: The reason the row is rejected, or null if the row is valid.
+    """
+    name = pl.col("budget_name").str.strip_chars().fill_null("")
+    date = pl.col("date").fill_null("")
+    is_iso_date = date.str.contains(r"^[0-9]{4}-[0-9]{2}-[0-9]{2}$") & (
+        date.str.to_date("%Y-%m-%d", strict=False).is_not_null()
+    )
+    description = pl.col("description").cast(pl.Utf8).str.strip_chars().fill_null("")
+    return (
+        pl.when(name == "")
+        .then(pl.lit("Budget name cannot be empty."))
+        .when(pl.col("budget_id").is_null())
+        .then(pl.lit(_UNKNOWN_BUDGET))
+        # Like _is_storable_amount, amounts must fit in 64-bit integer minor units.
+        # The bound is 2**63 as a float, and infinities and NaN fail the comparison
+        .when(
+            ~((amount * MINOR_UNITS).round(6).abs() < MAX_MINOR_UNITS).fill_null(False)
+        )
+        .then(pl.lit("Amount must be a valid number."))
+        .when(date.str.strip_chars() == "")
+        .then(pl.lit("Date cannot be empty."))
+        .when(~is_iso_date.fill_null(False))
+        .then(pl.lit("Date must be in YYYY-MM-DD format."))
+        .when(description == "")
+        .then(pl.lit("Description cannot be empty."))
+        .otherwise(None)
+        .alias("reason")
+    )
+
+
+def _hash_keys(keys: pl.Series) -> pl.Series:
+    digests = [blake2b(key, digest_size=8).digest() for key in keys.to_list()]
+    return pl.Series(digests, dtype=pl.Binary).bin.reinterpret(
+        dtype=pl.Int64, endianness="big"
+    )
+
 
-    # Validate the transactions data
+def _content_hash() -> pl.Expr:
+    # The same value as database.transaction_hash, which hashes rows added one at a
+    # time, computed for a whole batch of prepared rows
+    key = pl.concat_str(
+        [
+            pl.col("budget_id").cast(pl.Utf8).fill_null(""),
+            pl.col("amount").cast(pl.Utf8),
+            pl.col("date"),
+            pl.col("description").fill_null(""),
+            pl.col("source_id").fill_null(""),
+        ],
+        separator="\x1f",
+    )
+    return (
+        key.cast(pl.Binary).map_batches(_hash_keys, return_dtype=pl.Int64).alias("hash")
+    )
+
+
+class _SeenHashes:
+    """
+    The content hashes of the rows prepared so far from one file.
+
+    Used to number identical rows across batches. The hashes are kept in sorted runs,
+    8 bytes per row, and a run is merged into the one before it once it is as long, so
+    a batch is looked up in at most log2(rows / batch size) runs and the hashes are not
+    re-sorted as a whole for every batch.
+    """
+
+    def __init__(self):
+        self.runs: list[pl.Series] = []
+
+    def count(self, hashes: pl.Series) -> pl.Series:
+        """Returns how many times each of hashes has been added before."""
+        counts = pl.zeros(hashes.len(), dtype=pl.Int64, eager=True)
+        for run in self.runs:
+            counts += run.search_sorted(hashes, "right").cast(pl.Int64)
+            counts -= run.search_sorted(hashes, "left").cast(pl.Int64)
+        return counts
+
+    def add(self, hashes: pl.Series):
+        self.runs.append(hashes.sort())
+        while len(self.runs) > 1 and self.runs[-2].len() <= self.runs[-1].len():
+            run = self.runs.pop()
+            self.runs[-1] = pl.concat([self.runs[-1], run]).sort()
+
+
+def _number_occurrences(hashes: pl.Series, seen: _SeenHashes) -> pl.Series:
+    # The number of identical rows before each row: those in earlier batches, plus
+    # those earlier in this batch, which the ordinal rank puts after the smaller hashes
+    earlier = hashes.rank("ordinal").cast(pl.Int64) - 1
+    earlier -= hashes.sort().search_sorted(hashes, "left").cast(pl.Int64)
+    return (earlier + seen.count(hashes)).alias("occurrence")
+
+
+def _prepare_batch(
+    df: pl.DataFrame,
+    budgets: pl.DataFrame,
+    first_row: int = 1,
+    seen: _SeenHashes | None = None,
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Validates a batch of transactions read from a file and resolves their budget ids.
+
+    Every row is checked with the same Polars expressions, so the whole batch is
+    validated in one pass rather than row by row. The content hash and occurrence
+    number used to skip duplicates are computed for the whole batch in the same way.
+
+    Args:
+        df (pl.DataFrame): Transactions as read from the file.
+        budgets (pl.DataFrame): The budgets table, with budget_name and budget_id columns.
+        first_row (int): The row number of the first row of df within its file.
+        seen (_SeenHashes | None): The hashes of the valid rows in earlier batches of
+            the file, to which this batch's are added.
+    Returns:
+        tuple[pl.DataFrame, pl.DataFrame]: The valid rows' budget_id, amount, date,
+            description, source_id, hash and occurrence columns, ready to insert, and
+            the rejected rows' row_number and reason, followed by the file's columns as
+            text. source_id is an optional column of the file.
+    Raises:
+        _ImportAborted: If the batch is missing columns.
+    """
     # Each transaction must have the following fields: budget category name, amount, date
     required_columns = {"budget_name", "amount", "date", "description"}
     if not required_columns.issubset(set(df.columns)):
-        return f"Error: CSV file must contain the following columns: {', '.join(required_columns)}."
+        raise _ImportAborted(
+            f"Error: CSV file must contain the following columns: {', '.join(required_columns)}."
+        )
+    columns = df.columns
 
-    # add each transaction separately
-    for row in df.iter_rows(named=True):
-        budget_name = row["budget_name"]
-        amount = row["amount"]
-        date = row["date"]
-        description = row["description"]
+    # Typed inputs such as Parquet may store dates as dates rather than text
+    if df.schema["date"] != pl.Utf8:
+        df = df.with_columns(pl.col("date").cast(pl.Utf8))
+    amount = _parse_amount(df.schema["amount"])
+
+    # Resolve all budget names in the batch with a single join
+    df = _resolve_budget_ids(df, budgets, first_row)
 
-        result = add_single_transaction(
-            budget_name, amount, date, description, connection=connection
+    with phase("validate"):
+        df = df.with_columns(_rejection_reason(amount))
+        rejected = df.filter(pl.col("reason").is_not_null()).select(
+            "row_number",
+            "reason",
+            *(pl.col(column).cast(pl.Utf8) for column in columns),
         )
-        if result.startswith("Error"):
-            return f"Error adding transaction from file: {result}"
+        df = df.filter(pl.col("reason").is_null())
+    if rejected.height:
+        count("rows_rejected", rejected.height)
+
+    # Convert amounts to integer minor units, rounding like database.to_minor_units
+    amount = (
+        (amount * MINOR_UNITS)
+        .round(6)
+        .round(0, mode="half_away_from_zero")
+        .cast(pl.Int64)
+    )
+    # An optional source_id column, such as a bank's reference, tells apart otherwise
+    # identical rows when checking for duplicates
+    if "source_id" in df.columns:
+        source_id = pl.col("source_id").cast(pl.Utf8)
+    else:
+        source_id = pl.lit(None, dtype=pl.Utf8).alias("source_id")
+    description = pl.col("description").cast(pl.Utf8)
+    prepared = df.select("budget_id", amount, "date", description, source_id)
+
+    # Identical rows in a file are numbered in order, so that they are all kept while
+    # the same file imported again is skipped
+    if seen is None:
+        seen = _SeenHashes()
+    with phase("hash"):
+        prepared = prepared.with_columns(_content_hash())
+        prepared = prepared.with_columns(_number_occurrences(prepared["hash"], seen))
+        seen.add(prepared["hash"])
+    return prepared, rejected
+
+
+def _format_row_numbers(row_numbers: list[int]) -> str:
+    shown = ", ".join(str(n) for n in row_numbers[:MAX_REPORTED_ROWS])
+    if len(row_numbers) > MAX_REPORTED_ROWS:
+        shown += f" and {len(row_numbers) - MAX_REPORTED_ROWS} more"
+    return f"rows {shown}"
+
+
+def _rejection_message(rejected: pl.DataFrame) -> str:
+    """
+    Summarises the rejected rows of a file.
+
+    Args:
+        rejected (pl.DataFrame): The rejected rows, as returned by _prepare_batch.
+    Returns:
+        str: An error message listing every unknown budget name and every other problem,
+            each with the row numbers where it occurs.
+    """
+    is_unknown = pl.col("reason") == _UNKNOWN_BUDGET
+    unknown = (
+        rejected.filter(is_unknown)
+        .group_by("budget_name", maintain_order=True)
+        .agg(pl.col("row_number"))
+    )
+    invalid = (
+        rejected.filter(~is_unknown)
+        .group_by("reason", maintain_order=True)
+        .agg(pl.col("row_number"))
+    )
+
+    messages = []
+    if unknown.height:
+        details = "; ".join(
+            f"'{name}' ({_format_row_numbers(row_numbers)})"
+            for name, row_numbers in unknown.iter_rows()
+        )
+        messages.append(f"Error: Budget categories do not exist: {details}.")
+    if invalid.height:
+        details = "; ".join(
+            f"{reason.rstrip('.')} ({_format_row_numbers(row_numbers)})"
+            for reason, row_numbers in invalid.iter_rows()
+        )
+        messages.append(f"Error: Invalid transactions: {details}.")
+    return " ".join(messages)
+
 
-    return "All transactions from the file added successfully."
+def _iter_valid_batches(
+    batches, budgets: pl.DataFrame, rejected: list, skip_invalid: bool = False
+):
+    """
+    Validates each batch of a file, yielding the valid rows and collecting the rejected ones.
+
+    Args:
+        batches: The file's DataFrames, as returned by read_file_in_batches.
+        budgets (pl.DataFrame): The budgets table, with budget_name and budget_id columns.
+        rejected (list): Rejected rows are appended to this list, one DataFrame per batch.
+        skip_invalid (bool): Keep yielding valid rows after a row has been rejected.
+    Returns:
+        Iterator[pl.DataFrame]: The valid rows of each batch, ready to insert.
+    Raises:
+        _ImportAborted: If a row was rejected and skip_invalid is False, once the whole
+            file has been validated.
+    """
+    first_row = 1
+    seen = _SeenHashes()
+    for df in batches:
+        prepared, rejects = _prepare_batch(df, budgets, first_row, seen)
+        if rejects.height:
+            rejected.append(rejects)
+        # Nothing more is inserted once a row is rejected, unless invalid rows are
+        # skipped, but the rest of the file is still checked so that every rejected
+        # row is reported
+        if skip_invalid or not rejected:
+            yield prepared
+        first_row += df.height
+    if rejected and not skip_invalid:
+        raise _ImportAborted(
+            f"Error adding transactions from file: {_rejection_message(pl.concat(rejected))}"
+        )
 
 
-def generate_report(output_file: str, connection=None) -> str:
-    summary = {
-        "budget_name": [],
-        "budget_amount": [],
-        "total_spent": [],
-        "percent_spent": [],
-    }
+def _iter_transaction_rows(
+    batches, budgets: pl.DataFrame, rejected: list, skip_invalid: bool = False
+):
+    for prepared in _iter_valid_batches(batches, budgets, rejected, skip_invalid):
+        yield from prepared.iter_rows()
+
+
+def _prepare_transaction_file(
+    file: int,
+    file_path: str,
+    budgets: pl.DataFrame,
+    batch_size: int,
+    file_format: str | None,
+    skip_invalid: bool,
+    spool_dir: str,
+) -> tuple[list[str], pl.DataFrame | None, str | None]:
+    # Runs in a worker process, so errors are returned rather than raised. Each valid
+    # batch is written to an Arrow IPC file in spool_dir as soon as it is validated, so
+    # neither the worker nor the parent holds more than a batch of the file in memory,
+    # besides the worker's 8-byte hash of each row for numbering repeated rows.
+    rejected = []
+    parts = []
+    try:
+        batches = read_file_in_batches(
+            file_path, batch_size, file_format, infer_schema=False
+        )
+        for prepared in _iter_valid_batches(batches, budgets, rejected, skip_invalid):
+            part = os.path.join(spool_dir, f"{file:06d}-{len(parts):06d}.arrow")
+            prepared.write_ipc(part)
+            parts.append(part)
+        error = None
+    except (_ImportAborted, FileNotFoundError, RuntimeError, ValueError) as e:
+        error = str(e)
+    rejects = pl.concat(rejected) if rejected else None
+    return parts, rejects, error
+
+
+def _iter_prepared_file_rows(file_paths: list[str], results, rejected: list):
+    errors = []
+    for file_path, (parts, rejects, error) in zip(file_paths, results, strict=True):
+        if rejects is not None:
+            rejected.append(rejects.select(pl.lit(file_path).alias("file"), pl.all()))
+        if error:
+            errors.append(f"{file_path}: {error}")
+        elif not errors:
+            # One spooled batch is read at a time, and removed once it is inserted
+            for part in parts:
+                yield from pl.read_ipc(part).iter_rows()
+                os.remove(part)
+    if errors:
+        raise _ImportAborted(
+            f"Error adding transactions from files: {'; '.join(errors)}"
+        )
 
-    # Get a connection if not provided
+
+def _write_rejected_rows(rejected: list, rejects_file: str | None) -> str:
+    # Files may have different optional columns, which are left empty where missing
+    if not rejected or rejects_file is None:
+        return ""
+    write_dataframe(pl.concat(rejected, how="diagonal"), rejects_file)
+    return f" Rejected rows written to {rejects_file}."
+
+
+def _import_result(source: str, skipped: int, rejected: list) -> str:
+    invalid = sum(rejects.height for rejects in rejected)
+    if not invalid and not skipped:
+        return f"All transactions from {source} added successfully."
+    counts = []
+    if invalid:
+        counts.append(f"{invalid} invalid rows")
+    if skipped:
+        counts.append(f"{skipped} duplicates")
+    kind = "valid" if invalid else "new"
+    return f"All {kind} transactions from {source} added successfully, {' and '.join(counts)} skipped."
+
+
+def add_transactions_from_file(
+    file_path: str,
+    connection=None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    file_format: str | None = None,
+    skip_invalid: bool = False,
+    rejects_file: str | None = None,
+) -> str:
+    # Stream the file so that memory use does not grow with its size. CSV columns are
+    # read as text, so that malformed values are reported as rejected rows.
+    batches = read_file_in_batches(
+        file_path, batch_size, file_format, infer_schema=False
+    )
+
+    # Reuse this thread's shared connection if none is provided
     if connection is None:
-        connection = get_connection()
-        need_to_close = True
-    else:
-        need_to_close = False
+        connection = get_shared_connection()
 
-    # Get all budget categories in the database
-    budgets = get_all_budget_names(connection)
+    # Insert all rows in a single database transaction, which is rolled back if any
+    # row is rejected, unless invalid rows are skipped
+    rejected = []
+    rows = _iter_transaction_rows(
+        batches, _load_budgets(connection), rejected, skip_invalid
+    )
+    try:
+        skipped = insert_transactions(connection, rows, chunk_size=chunk_size)
+    except _ImportAborted as e:
+        return str(e) + _write_rejected_rows(rejected, rejects_file)
 
-    # Collect each budget category's transactions
-    for budget_name in budgets:
-        budget_id = get_budget_id_by_name(connection, budget_name)
-        budget_amount = get_budget_amount_by_name(connection, budget_name)
-        if budget_id is None:
-            return f"Error: Budget category '{budget_name}' does not exist."
-        if budget_amount is None:
-            return (
-                f"Error: Could not retrieve amount for budget category '{budget_name}'."
+    if skipped is None:
+        return "Error: Failed to add transactions from the file."
+    return _import_result("the file", skipped, rejected) + _write_rejected_rows(
+        rejected, rejects_file
+    )
+
+
+def add_transactions_from_files(
+    file_paths: list[str],
+    connection=None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int | None = None,
+    file_format: str | None = None,
+    skip_invalid: bool = False,
+    rejects_file: str | None = None,
+) -> str:
+    # Reuse this thread's shared connection if none is provided
+    if connection is None:
+        connection = get_shared_connection()
+
+    # Parse and validate the files in parallel worker processes, while this process
+    # remains the only writer. Polars is multi-threaded, so workers are spawned, not forked.
+    # Workers pass the valid rows back through batch files in a temporary directory.
+    budgets = _load_budgets(connection)
+    context = multiprocessing.get_context("spawn")
+    rejected = []
+    try:
+        with (
+            tempfile.TemporaryDirectory(prefix="budget-manager-import-") as spool_dir,
+            futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=context
+            ) as executor,
+        ):
+            results = executor.map(
+                _prepare_transaction_file,
+                range(len(file_paths)),
+                file_paths,
+                repeat(budgets),
+                repeat(batch_size),
+                repeat(file_format),
+                repeat(skip_invalid),
+                repeat(spool_dir),
             )
 
-        # Calculate total transaction amount
-        transactions = select_transactions_by_budget_id(connection, budget_id)
-        total = fsum([row[0] for row in transactions])
-        summary["budget_name"].append(budget_name)
-        summary["budget_amount"].append(budget_amount)
-        summary["total_spent"].append(total)
-        summary["percent_spent"].append((total / budget_amount * 100))
+            # Insert every file in a single database transaction, which is rolled back
+            # if any file fails validation
+            rows = _iter_prepared_file_rows(file_paths, results, rejected)
+            skipped = insert_transactions(connection, rows, chunk_size=chunk_size)
+    except _ImportAborted as e:
+        return str(e) + _write_rejected_rows(rejected, rejects_file)
 
-    if need_to_close:
-        connection.close()
+    if skipped is None:
+        return "Error: Failed to add transactions from the files."
+    return _import_result(
+        f"{len(file_paths)} files", skipped, rejected
+    ) + _write_rejected_rows(rejected, rejects_file)
+
+
+def _major_units(column: str) -> pl.Expr:
+    # Dividing in Polars can leave float noise such as 1776779.1600000001 for
+    # 177677916 cents, so the result is rounded back to whole cents
+    return (pl.col(column) / MINOR_UNITS).round(2)
+
+
+def _percent_spent(spent: pl.Expr, amount: pl.Expr) -> pl.Expr:
+    # Both columns are integer minor units. The percentage is computed in Float64, as
+    # scaling the totals in Int64 would overflow for very large amounts, and is left
+    # empty for a budget of zero.
+    percent = spent.cast(pl.Float64) * 100 / amount
+    return (
+        pl.when(amount != 0)
+        .then(percent.round(2, mode="half_away_from_zero"))
+        .otherwise(None)
+    )
+
+
+def generate_report(
+    output_file: str,
+    connection=None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    budget_name: str | None = None,
+    file_format: str | None = None,
+    period: str | None = None,
+    cache_dir: str | None = None,
+    snapshot_dir: str | None = None,
+) -> str:
+    # Validate the filters
+    for date in (start_date, end_date):
+        if date is not None and not _is_iso_date(date):
+            return "Error: Date must be in YYYY-MM-DD format."
+    if period is not None and period not in PERIODS:
+        return f"Error: Period must be one of: {', '.join(PERIODS)}."
+
+    # Reports on a snapshot read its files instead of the database
+    if snapshot_dir is not None:
+        try:
+            snapshot = Snapshot(snapshot_dir)
+        except FileNotFoundError as e:
+            return f"Error: {e}"
+        if budget_name is not None and budget_name not in snapshot.get_budget_names():
+            return f"Error: Budget category '{budget_name}' does not exist."
+        df = _compute_report(
+            snapshot.select_budget_totals,
+            snapshot.select_period_totals,
+            start_date,
+            end_date,
+            budget_name,
+            period,
+        )
+        with phase("report_write"):
+            write_dataframe(df, output_file, file_format)
+        return f"Report written to {output_file}."
+
+    # Reuse this thread's shared connection if none is provided
+    if connection is None:
+        connection = get_shared_connection()
+
+    if (
+        budget_name is not None
+        and get_budget_id_by_name(connection, budget_name) is None
+    ):
+        return f"Error: Budget category '{budget_name}' does not exist."
+
+    # Reports are cached until the next write to the database. A copied database file
+    # keeps the id and version of the original, so the key also holds its path.
+    database_id, version = get_database_version(connection)
+    key = (
+        database_id,
+        get_database_file(connection),
+        start_date,
+        end_date,
+        budget_name,
+        period,
+    )
+    df = _cached_report(key, version, cache_dir)
+    if df is None:
+        df = _compute_report(
+            partial(select_budget_totals, connection),
+            partial(select_period_totals, connection),
+            start_date,
+            end_date,
+            budget_name,
+            period,
+        )
+        _cache_report(key, version, df, cache_dir)
+
+    with phase("report_write"):
+        write_dataframe(df, output_file, file_format)
+
+    return f"Report written to {output_file}."
+
+
+# Reports computed by this process, by database and report parameters, with the
+# database version they were computed at. The oldest entry is dropped when full.
+_report_cache: dict[tuple, tuple[int, pl.DataFrame]] = {}
+REPORT_CACHE_SIZE = 64
+
+
+def _report_cache_file(key: tuple, version: int, cache_dir: str) -> str:
+    digest = sha256(repr(key).encode()).hexdigest()[:32]
+    return os.path.join(cache_dir, f"{digest}.{version}.arrow")
+
+
+def _cached_report(key: tuple, version: int, cache_dir: str | None):
+    """
+    Looks up a report computed at the current database version.
+
+    Args:
+        key (tuple): The database id and file and the report parameters.
+        version (int): The current database version.
+        cache_dir (str | None): A directory of reports cached on disk, shared by every
+            process reading the database, checked after this process's own cache.
+    Returns:
+        pl.DataFrame | None: The cached report, or None if it must be computed.
+    """
+    cached_version, df = _report_cache.get(key, (None, None))
+    if cached_version != version and cache_dir is not None:
+        cache_file = _report_cache_file(key, version, cache_dir)
+        if os.path.exists(cache_file):
+            df = pl.read_ipc(cache_file)
+            _report_cache[key] = (version, df)
+            cached_version = version
+    if cached_version != version:
+        return None
+    count("report_cache_hits")
+    return df
+
+
+def _cache_report(key: tuple, version: int, df: pl.DataFrame, cache_dir: str | None):
+    _report_cache.pop(key, None)
+    if len(_report_cache) >= REPORT_CACHE_SIZE:
+        del _report_cache[next(iter(_report_cache))]
+    _report_cache[key] = (version, df)
+    if cache_dir is None:
+        return
+
+    # Written to a temporary file first, so other processes never read a partial
+    # report, and reports from earlier versions are removed
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_file = _report_cache_file(key, version, cache_dir)
+    df.write_ipc(f"{cache_file}.{os.getpid()}.tmp")
+    os.replace(f"{cache_file}.{os.getpid()}.tmp", cache_file)
+    prefix = os.path.basename(cache_file).split(".")[0]
+    for stale in glob.glob(os.path.join(cache_dir, f"{prefix}.*.arrow")):
+        if stale != cache_file:
+            with suppress(FileNotFoundError):
+                os.remove(stale)
+
+
+def _compute_report(
+    select_totals,
+    select_periods,
+    start_date: str | None,
+    end_date: str | None,
+    budget_name: str | None,
+    period: str | None,
+) -> pl.DataFrame:
+    # The totals come from the database or a snapshot, with the arguments of
+    # select_budget_totals and select_period_totals after the connection
+    if period is not None:
+        return _period_report(select_periods, period, start_date, end_date, budget_name)
+
+    # Aggregate every budget category's spending in a single query
+    with phase("report_query"):
+        totals = select_totals(start_date, end_date, budget_name)
 
     # Generate report for each budget category showing amount and % spent
-    df = pl.DataFrame(
-        summary,
+    return pl.DataFrame(
+        totals,
         schema={
             "budget_name": pl.Utf8,
-            "budget_amount": pl.Float64,
-            "total_spent": pl.Float64,
-            "percent_spent": pl.Float64,
+            "budget_amount": pl.Int64,
+            "total_spent": pl.Int64,
         },
+        orient="row",
+    ).select(
+        "budget_name",
+        _major_units("budget_amount"),
+        _major_units("total_spent"),
+        percent_spent=_percent_spent(pl.col("total_spent"), pl.col("budget_amount")),
     )
 
-    df.write_csv(output_file)
 
-    return f"Report written to {output_file}."
+def _period_report(
+    select_periods,
+    period: str,
+    start_date: str | None,
+    end_date: str | None,
+    budget_name: str | None,
+) -> pl.DataFrame:
+    """
+    Builds a time-series report with one row per budget per month or week.
+
+    Args:
+        select_periods: select_period_totals for a connection, or a snapshot's
+            select_period_totals.
+        period (str): One of PERIODS.
+        start_date (str | None): Only count transactions on or after this date.
+        end_date (str | None): Only count transactions on or before this date.
+        budget_name (str | None): Only report on the budget with this name.
+    Returns:
+        pl.DataFrame: The amount spent in each period with transactions, the running
+            total since the start of the report, and that total as a percentage of
+            the budget.
+    """
+    # Totals and running totals for every budget and period come from a single query
+    with phase("report_query"):
+        totals = select_periods(period, start_date, end_date, budget_name)
+
+    return pl.DataFrame(
+        totals,
+        schema={
+            "budget_name": pl.Utf8,
+            "budget_amount": pl.Int64,
+            "period": pl.Utf8,
+            "total_spent": pl.Int64,
+            "cumulative_spent": pl.Int64,
+        },
+        orient="row",
+    ).select(
+        "budget_name",
+        pl.col("period").str.to_date("%Y-%m-%d"),
+        _major_units("budget_amount"),
+        _major_units("total_spent"),
+        _major_units("cumulative_spent"),
+        percent_spent=_percent_spent(
+            pl.col("cumulative_spent"), pl.col("budget_amount")
+        ),
+    )
+
+
+def _ledger_name(db_path: str) -> str:
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+
+def _ledger_report(
+    db_path: str,
+    output_file: str | None,
+    file_format: str | None,
+    start_date: str | None,
+    end_date: str | None,
+    budget_name: str | None,
+    period: str | None,
+) -> tuple[pl.DataFrame | None, str | None]:
+    # Runs in a worker process, so errors are returned rather than raised. Opening a
+    # missing file would create an empty ledger, so it is checked first.
+    if not os.path.isfile(db_path):
+        return None, "Database file not found."
+    try:
+        connection = initialise_database(db_path=db_path)
+    except sqlite3.Error as e:
+        return None, str(e)
+    try:
+        if (
+            budget_name is not None
+            and get_budget_id_by_name(connection, budget_name) is None
+        ):
+            return None, f"Budget category '{budget_name}' does not exist."
+        df = _compute_report(
+            partial(select_budget_totals, connection),
+            partial(select_period_totals, connection),
+            start_date,
+            end_date,
+            budget_name,
+            period,
+        )
+    except sqlite3.Error as e:
+        return None, str(e)
+    finally:
+        connection.close()
+
+    # Reports per ledger are written by the worker, rather than sent back
+    if output_file is None:
+        return df, None
+    write_dataframe(df, output_file, file_format)
+    return None, None
+
+
+def generate_ledger_reports(
+    db_paths: list[str],
+    output: str,
+    per_ledger: bool = False,
+    workers: int | None = None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    budget_name: str | None = None,
+    file_format: str | None = None,
+    period: str | None = None,
+    progress=None,
+) -> str:
+    """
+    Generates the same report for many ledger databases in parallel worker processes.
+
+    Each ledger is reported on independently: a ledger that is missing, corrupt or
+    lacks the budget category is listed in the result and the others are still reported.
+
+    Args:
+        db_paths (list[str]): The ledger database files, see database.find_ledgers.
+        output (str): The combined report file, or with per_ledger the directory for
+            one report per ledger, named after the ledger's database file.
+        per_ledger (bool): Write one report per ledger instead of a combined report with
+            a ledger column.
+        workers (int | None): The number of worker processes. Defaults to one per CPU.
+        start_date, end_date, budget_name, period: The filters, as for generate_report.
+        file_format (str | None): "csv", "parquet" or "ipc". Defaults to detection from
+            the combined report's extension, or CSV for per-ledger reports.
+        progress: Called as progress(done, total, db_path, error) as each ledger
+            finishes, with error None on success.
+    Returns:
+        str: A message with the number of ledgers reported and any that failed.
+    """
+    # Validate the filters once, rather than in every worker
+    for date in (start_date, end_date):
+        if date is not None and not _is_iso_date(date):
+            return "Error: Date must be in YYYY-MM-DD format."
+    if period is not None and period not in PERIODS:
+        return f"Error: Period must be one of: {', '.join(PERIODS)}."
+    if not db_paths:
+        return "Error: No ledger databases found."
+
+    names = [_ledger_name(db_path) for db_path in db_paths]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        return f"Error: Ledger names must be unique: {', '.join(duplicates)}."
+
+    if per_ledger:
+        file_format = file_format or "csv"
+        os.makedirs(output, exist_ok=True)
+        output_files = [
+            os.path.join(output, f"{name}{FORMAT_EXTENSIONS[file_format]}")
+            for name in names
+        ]
+    else:
+        output_files = [None] * len(db_paths)
+
+    # Workers are spawned, not forked, as Polars is multi-threaded. Each one imports
+    # Polars once and then reports on many ledgers.
+    context = multiprocessing.get_context("spawn")
+    reports = [None] * len(db_paths)
+    errors = {}
+    with futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=context
+    ) as executor:
+        pending = {
+            executor.submit(
+                _ledger_report,
+                db_path,
+                output_file,
+                file_format,
+                start_date,
+                end_date,
+                budget_name,
+                period,
+            ): index
+            for index, (db_path, output_file) in enumerate(
+                zip(db_paths, output_files, strict=True)
+            )
+        }
+        for done, future in enumerate(futures.as_completed(pending), start=1):
+            index = pending[future]
+            try:
+                reports[index], error = future.result()
+            except (sqlite3.Error, OSError, ValueError) as e:
+                # A ledger that cannot be read or written only loses its own report;
+                # any other error is a bug and stops the run
+                error = f"{type(e).__name__}: {e}"
+            if error:
+                errors[index] = error
+            if progress is not None:
+                progress(done, len(db_paths), db_paths[index], error)
+
+    reported = len(db_paths) - len(errors)
+    if not per_ledger and reported:
+        with phase("report_write"):
+            combined = pl.concat(
+                df.select(pl.lit(name).alias("ledger"), pl.all())
+                for name, df in zip(names, reports, strict=True)
+                if df is not None
+            )
+            write_dataframe(combined, output, file_format)
+
+    failures = [f"{db_paths[index]}: {errors[index]}" for index in sorted(errors)]
+    shown = "; ".join(failures[:MAX_REPORTED_ROWS])
+    if len(failures) > MAX_REPORTED_ROWS:
+        shown += f"; and {len(failures) - MAX_REPORTED_ROWS} more"
+    if not reported:
+        return f"Error: No ledgers could be reported on: {shown}"
+    result = f"Reports for {reported} of {len(db_paths)} ledgers written to {output}."
+    if failures:
+        result += f" Failed ledgers: {shown}"
+    return result
+
+
+def archive_old_transactions(before_year: int | None = None, connection=None) -> str:
+    # Only closed years can be archived, by default every year before this one
+    current_year = Date.today().year
+    if before_year is None:
+        before_year = current_year
+    if before_year > current_year:
+        return "Error: Only years before the current year can be archived."
+
+    # Reuse this thread's shared connection if none is provided
+    if connection is None:
+        connection = get_shared_connection()
+
+    archive_path = get_archive_path(connection)
+    if archive_path is None:
+        return "Error: Archiving requires a database file."
+
+    moved = archive_transactions(connection, before_year)
+
+    if moved is None:
+        return "Error: Failed to archive transactions."
+    elif moved == 0:
+        return f"No transactions from before {before_year} to archive."
+    else:
+        return f"Archived {moved} transactions from before {before_year} to {archive_path}."
+
+
+def create_snapshot(
+    snapshot_dir: str,
+    connection=None,
+    file_format: str | None = None,
+    full: bool = False,
+) -> str:
+    # Arrow IPC files can be memory-mapped, so they are the default
+    file_format = file_format or "ipc"
+    if file_format not in SNAPSHOT_FORMATS:
+        return f"Error: Snapshot format must be one of: {', '.join(SNAPSHOT_FORMATS)}."
+
+    # Reuse this thread's shared connection if none is provided
+    if connection is None:
+        connection = get_shared_connection()
+
+    try:
+        written, rewritten = update_snapshot(
+            connection, snapshot_dir, file_format, full
+        )
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return "Error: Failed to update the snapshot."
+
+    if rewritten:
+        return f"Snapshot written to {snapshot_dir} with {written} transactions."
+    else:
+        return f"Snapshot in {snapshot_dir} updated with {written} new transactions."
+
+
+# Search results list at most this many transactions by default
+DEFAULT_SEARCH_LIMIT = 20
+
+
+def search_transactions(
+    query: str,
+    connection=None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    budget_name: str | None = None,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+) -> str:
+    # Validate the query and filters
+    if not query.strip():
+        return "Error: Search query cannot be empty."
+    for date in (start_date, end_date):
+        if date is not None and not _is_iso_date(date):
+            return "Error: Date must be in YYYY-MM-DD format."
+    if limit < 0:
+        return "Error: Search limit cannot be negative."
+
+    # Reuse this thread's shared connection if none is provided
+    if connection is None:
+        connection = get_shared_connection()
+
+    if (
+        budget_name is not None
+        and get_budget_id_by_name(connection, budget_name) is None
+    ):
+        return f"Error: Budget category '{budget_name}' does not exist."
+
+    try:
+        rows, matched, total = select_matching_transactions(
+            connection, query, start_date, end_date, budget_name, limit
+        )
+    except sqlite3.OperationalError as e:
+        return f"Error: Invalid search query: {e}."
+
+    if not matched:
+        return f"No transactions match '{query}'."
+    lines = [f"Found {matched} transactions totalling {from_minor_units(total):.2f}"]
+    if len(rows) < matched:
+        lines[0] += f", the {len(rows)} most recent are"
+    lines[0] += ":"
+    lines.extend(
+        f"{date}  {name}  {from_minor_units(amount):.2f}  {description}"
+        for name, date, amount, description in rows
+    )
+    return "\n".join(lines)
+
+
+def rebuild_totals(connection=None) -> str:
+    # Reuse this thread's shared connection if none is provided
+    if connection is None:
+        connection = get_shared_connection()
+
+    result = rebuild_budget_totals(connection)
+
+    if result:
+        return "Budget totals rebuilt successfully."
+    else:
+        return "Error: Failed to rebuild budget totals."
+
+
+def check_totals(connection=None) -> str:
+    # Reuse this thread's shared connection if none is provided
+    if connection is None:
+        connection = get_shared_connection()
+
+    mismatches = check_budget_totals(connection)
+
+    if not mismatches:
+        return "Budget totals are consistent with the transactions."
+    details = "; ".join(
+        f"budget {budget_id} month {month}: "
+        f"stored {from_minor_units(stored)}, actual {from_minor_units(actual)}"
+        for budget_id, month, stored, actual in mismatches
+    )
+    return f"Error: Budget totals are inconsistent ({details}). Run --rebuild-totals to fix them."
@@ -1,10 +1,30 @@
 import argparse
-from budget_manager.database import initialise_database
+import cProfile
+from contextlib import ExitStack
+from datetime import date
+from budget_manager.database import (
+    PERIODS,
+    PROFILES,
+    apply_profile,
+    find_ledgers,
+    get_report_cache_dir,
+    initialise_database,
+)
+from budget_manager.io import DEFAULT_BATCH_SIZE, expand_file_patterns
+from budget_manager.metrics import collect_metrics
 from budget_manager.logic import (
+    DEFAULT_SEARCH_LIMIT,
     create_budget_category,
     add_transactions_from_file,
+    add_transactions_from_files,
     generate_report,
+    generate_ledger_reports,
     create_budget_categories_from_file,
+    archive_old_transactions,
+    create_snapshot,
+    rebuild_totals,
+    check_totals,
+    search_transactions,
 )
 
 
@@ -18,27 +38,251 @@ def run(args=None, connection=None) -> None:
     parser.add_argument(
         "--add-budget-file",
         metavar="FILE",
-        help="Add budget categories from a CSV file.",
+        help="Add budget categories from a CSV, Parquet or Arrow IPC file.",
     )
     parser.add_argument(
         "--add-transactions",
+        nargs="+",
         metavar="FILE",
-        help="Import transactions from a CSV file.",
+        help="Import transactions from one or more CSV, Parquet or Arrow IPC files or glob patterns.",
+    )
+    parser.add_argument(
+        "--input-format",
+        choices=["csv", "parquet", "ipc"],
+        help="Format of imported files (default: detected from the file extension).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        metavar="ROWS",
+        help="Number of rows read from the file at a time when importing transactions.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="Number of processes used to parse files when importing several at once, "
+        "or to report on several ledgers (default: one per CPU).",
+    )
+    parser.add_argument(
+        "--skip-invalid",
+        action="store_true",
+        help="Import the valid transactions of a file and skip invalid rows, instead of "
+        "importing nothing if any row is invalid.",
+    )
+    parser.add_argument(
+        "--rejects",
+        metavar="OUT_FILE",
+        help="Write the rejected transaction rows, with the reason for each, to a CSV, "
+        "Parquet or Arrow IPC file.",
+    )
+    parser.add_argument(
+        "--report",
+        metavar="OUT_FILE",
+        help="Generate a report to a CSV, Parquet or Arrow IPC file.",
+    )
+    parser.add_argument(
+        "--ledgers",
+        nargs="+",
+        metavar="PATH",
+        help="Generate the report for each of these ledger databases, or for every *.db "
+        "file in these directories, in parallel processes (see --workers), instead of "
+        "for --db.",
+    )
+    parser.add_argument(
+        "--per-ledger",
+        action="store_true",
+        help="With --ledgers, write one report per ledger into the --report directory "
+        "instead of one combined report with a ledger column.",
+    )
+    parser.add_argument(
+        "--report-format",
+        choices=["csv", "parquet", "ipc"],
+        help="Format of the report file (default: detected from the file extension).",
+    )
+    parser.add_argument(
+        "--from",
+        dest="start_date",
+        metavar="DATE",
+        help="Only include transactions on or after this date (YYYY-MM-DD) in the report "
+        "or search.",
+    )
+    parser.add_argument(
+        "--to",
+        dest="end_date",
+        metavar="DATE",
+        help="Only include transactions on or before this date (YYYY-MM-DD) in the report "
+        "or search.",
+    )
+    parser.add_argument(
+        "--budget",
+        metavar="NAME",
+        help="Only include this budget category in the report or search.",
+    )
+    parser.add_argument(
+        "--period",
+        choices=PERIODS,
+        help="Report spending per budget per month or week, with running totals.",
+    )
+    parser.add_argument(
+        "--report-cache",
+        action="store_true",
+        help="Also cache reports on disk next to the database, so that repeated reports "
+        "from any process are not recomputed until the data changes.",
+    )
+    parser.add_argument(
+        "--from-snapshot",
+        metavar="DIR",
+        help="Generate the report from a columnar snapshot instead of the database.",
+    )
+    parser.add_argument(
+        "--search",
+        metavar="QUERY",
+        help='Search transaction descriptions: all words must match, "quoted words" '
+        "match a phrase and word* matches a prefix. Prints the matches and their total.",
+    )
+    parser.add_argument(
+        "--search-limit",
+        type=int,
+        default=DEFAULT_SEARCH_LIMIT,
+        metavar="N",
+        help="Number of matching transactions to list, most recent first (default: "
+        f"{DEFAULT_SEARCH_LIMIT}). The total includes every match.",
+    )
+    parser.add_argument(
+        "--archive",
+        nargs="?",
+        type=int,
+        const=date.today().year,
+        metavar="YEAR",
+        help="Move transactions dated before YEAR (default: the current year) to the "
+        "archive database next to the main one. Reports still include them.",
+    )
+    parser.add_argument(
+        "--rebuild-totals",
+        action="store_true",
+        help="Recompute the stored budget totals from all transactions.",
+    )
+    parser.add_argument(
+        "--check-totals",
+        action="store_true",
+        help="Check that the stored budget totals match the transactions.",
+    )
+    parser.add_argument(
+        "--snapshot",
+        metavar="DIR",
+        help="Write a columnar snapshot of the budgets and transactions to DIR, or "
+        "append the transactions added since the last snapshot.",
+    )
+    parser.add_argument(
+        "--snapshot-format",
+        choices=["ipc", "parquet"],
+        help="Format of the snapshot files (default: ipc, which is memory-mapped when read).",
     )
     parser.add_argument(
-        "--report", metavar="OUT_FILE", help="Generate a report to a CSV file."
+        "--snapshot-full",
+        action="store_true",
+        help="Rewrite the whole snapshot instead of appending to it.",
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="SOCKET",
+        help="Run other commands, then serve requests on this Unix socket until shut down.",
+    )
+    parser.add_argument(
+        "--group-commit-ms",
+        type=float,
+        metavar="MS",
+        help="With --serve, commit added transactions in groups at most MS milliseconds "
+        "after they are added, instead of one by one.",
+    )
+    parser.add_argument(
+        "--db",
+        metavar="PATH",
+        help="Database file to use (default: $BUDGET_MANAGER_DB or ./budget_manager.db).",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILES,
+        help="Database performance profile (default: $BUDGET_MANAGER_PROFILE or 'safe').",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print the time spent in each phase and counts of rows.",
+    )
+    parser.add_argument(
+        "--count-statements",
+        action="store_true",
+        help="With --timings, also count SQL statement executions and commits. Tracing "
+        "every statement slows down imports, so the timings are then less accurate.",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="OUT_FILE",
+        help="Write cProfile statistics for the whole run to a file (read with pstats).",
     )
     if args is None:
         args = parser.parse_args()
     else:
         args = parser.parse_args(args)
 
-    if connection is None:
-        connection = initialise_database()
+    if connection is None and not _uses_database(args):
+        need_to_close = False
+    elif connection is None:
+        connection = initialise_database(profile=args.profile, db_path=args.db)
         need_to_close = True
     else:
+        if args.profile:
+            apply_profile(connection, args.profile)
         need_to_close = False
 
+    with ExitStack() as stack:
+        if args.timings:
+            metrics = stack.enter_context(
+                collect_metrics(connection if args.count_statements else None)
+            )
+        if args.cprofile:
+            profiler = cProfile.Profile()
+            stack.callback(profiler.dump_stats, args.cprofile)
+            stack.enter_context(profiler)
+
+        _run_commands(args, connection)
+
+        if args.serve:
+            from budget_manager.server import serve
+
+            print(f"Serving requests on: {args.serve}")
+            serve(args.serve, connection, args.group_commit_ms)
+
+    if args.timings:
+        print(metrics.format())
+    if args.cprofile:
+        print(f"Profile written to {args.cprofile}")
+
+    if need_to_close:
+        connection.close()
+
+
+def _uses_database(args) -> bool:
+    # A report on --ledgers opens each ledger itself, so when it is the only command
+    # the default database is neither opened nor upgraded
+    commands = [
+        args.add_budget,
+        args.add_budget_file,
+        args.add_transactions,
+        args.archive is not None,
+        args.rebuild_totals,
+        args.check_totals,
+        args.search,
+        args.snapshot,
+        args.serve,
+    ]
+    return any(commands) or not (args.report and args.ledgers)
+
+
+def _run_commands(args, connection) -> None:
     # Logic route based on arguments
     # Note that these routes are not exclusive, you can add budget categories, load transactions,
     # and generate a report in a single command.
@@ -50,24 +294,108 @@ def run(args=None, connection=None) -> None:
     elif args.add_budget_file:
         print(f"Importing budget categories from: {args.add_budget_file}")
         result = create_budget_categories_from_file(
-            args.add_budget_file, connection=connection
+            args.add_budget_file, connection=connection, file_format=args.input_format
         )
         print(result)
 
     if args.add_transactions:
-        print(f"Importing transactions from: {args.add_transactions}")
-        result = add_transactions_from_file(
-            args.add_transactions, connection=connection
+        file_paths = expand_file_patterns(args.add_transactions)
+        print(f"Importing transactions from: {', '.join(file_paths)}")
+        if len(file_paths) == 1:
+            result = add_transactions_from_file(
+                file_paths[0],
+                connection=connection,
+                batch_size=args.batch_size,
+                file_format=args.input_format,
+                skip_invalid=args.skip_invalid,
+                rejects_file=args.rejects,
+            )
+        else:
+            result = add_transactions_from_files(
+                file_paths,
+                connection=connection,
+                batch_size=args.batch_size,
+                workers=args.workers,
+                file_format=args.input_format,
+                skip_invalid=args.skip_invalid,
+                rejects_file=args.rejects,
+            )
+        print(result)
+
+    if args.archive is not None:
+        print(f"Archiving transactions from before {args.archive}")
+        result = archive_old_transactions(args.archive, connection=connection)
+        print(result)
+
+    if args.rebuild_totals:
+        print("Rebuilding budget totals")
+        result = rebuild_totals(connection=connection)
+        print(result)
+
+    if args.check_totals:
+        print("Checking budget totals")
+        result = check_totals(connection=connection)
+        print(result)
+
+    if args.search:
+        print(f"Searching transactions for: {args.search}")
+        result = search_transactions(
+            args.search,
+            connection=connection,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            budget_name=args.budget,
+            limit=args.search_limit,
+        )
+        print(result)
+
+    if args.snapshot:
+        print(f"Updating snapshot: {args.snapshot}")
+        result = create_snapshot(
+            args.snapshot,
+            connection=connection,
+            file_format=args.snapshot_format,
+            full=args.snapshot_full,
         )
         print(result)
 
-    if args.report:
+    if args.report and args.ledgers:
+        db_paths = find_ledgers(args.ledgers)
+        print(f"Generating reports for {len(db_paths)} ledgers to: {args.report}")
+        result = generate_ledger_reports(
+            db_paths,
+            args.report,
+            per_ledger=args.per_ledger,
+            workers=args.workers,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            budget_name=args.budget,
+            file_format=args.report_format,
+            period=args.period,
+            progress=_print_ledger_progress,
+        )
+        print(result)
+    elif args.report:
         print(f"Generating report to: {args.report}")
-        result = generate_report(args.report, connection=connection)
+        result = generate_report(
+            args.report,
+            connection=connection,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            budget_name=args.budget,
+            file_format=args.report_format,
+            period=args.period,
+            cache_dir=get_report_cache_dir(connection) if args.report_cache else None,
+            snapshot_dir=args.from_snapshot,
+        )
         print(result)
 
-    if need_to_close:
-        connection.close()
+
+def _print_ledger_progress(done: int, total: int, db_path: str, error: str | None):
+    if error:
+        print(f"[{done}/{total}] {db_path}: Error: {error}")
+    else:
+        print(f"[{done}/{total}] {db_path}")
 
 
 if __name__ == "__main__":
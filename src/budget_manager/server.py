@@ -0,0 +1,267 @@
+"""
+A long-running local server that keeps the database connection and budget ids warm.
+
+Clients connect to a Unix socket and send one JSON object per line; each request is
+answered with one JSON line, {"ok": bool, "result": message}. A client may send any
+number of requests over one connection. Requests are handled one at a time on the
+server's single connection, so writes never contend with each other.
+
+Operations and their fields:
+    ping
+    add_budget:        name, amount
+    add_budget_file:   file, [format]
+    add_transaction:   budget, amount, date, description
+    import:            files, [format, batch_size, workers, skip_invalid, rejects]
+    report:            output, [format, from, to, budget, period, snapshot]
+    snapshot:          dir, [format, full]
+    search:            query, [from, to, budget, limit]
+    shutdown
+
+Example: {"op": "add_transaction", "budget": "Groceries", "amount": 12.5,
+          "date": "2025-01-31", "description": "Milk"}
+
+With group commit enabled, add_transaction rows are committed together (see
+database.TransactionWriter) at most group_commit_ms after they are added, and before
+any other operation runs. A successful response then means the row is queued: it is
+lost if the server crashes before the commit.
+"""
+
+import asyncio
+import json
+import os
+import socket
+
+from budget_manager.database import (
+    DEFAULT_GROUP_ROWS,
+    TransactionWriter,
+    get_budget_ids,
+    get_shared_connection,
+)
+from budget_manager.io import DEFAULT_BATCH_SIZE, expand_file_patterns
+from budget_manager.logic import (
+    DEFAULT_SEARCH_LIMIT,
+    add_single_transaction,
+    add_transactions_from_file,
+    add_transactions_from_files,
+    create_budget_categories_from_file,
+    create_budget_category,
+    create_snapshot,
+    generate_report,
+    search_transactions,
+)
+
+
+class BudgetServer:
+    """
+    Dispatches requests to the logic functions using one connection and a budget id cache.
+
+    Args:
+        connection: An open SQLite connection, used only from the server's thread.
+            Defaults to this thread's shared connection.
+        group_commit_ms (float | None): If set, commit added transactions in groups,
+            at most this many milliseconds after they are added.
+    """
+
+    def __init__(self, connection=None, group_commit_ms: float | None = None):
+        # Reuse this thread's shared connection if none is provided
+        if connection is None:
+            connection = get_shared_connection()
+        self.connection = connection
+        self.budget_ids = get_budget_ids(connection)
+        self.stopped = asyncio.Event()
+        self.writer = None
+        self.group_commit_ms = group_commit_ms
+        if group_commit_ms is not None:
+            self.writer = TransactionWriter(
+                connection, DEFAULT_GROUP_ROWS, group_commit_ms
+            )
+        self._flush_timer = None
+
+    def flush(self):
+        """Commits any transactions queued by group commit."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self.writer is not None:
+            self.writer.flush()
+
+    def handle(self, request: dict) -> str:
+        """
+        Runs one request.
+
+        Args:
+            request (dict): The decoded request, with an "op" field naming the operation.
+        Returns:
+            str: The operation's result message, starting with "Error" on failure.
+        """
+        op = request.get("op")
+        if op == "ping":
+            return "pong"
+        if op == "add_transaction":
+            result = add_single_transaction(
+                request["budget"],
+                request["amount"],
+                request["date"],
+                request["description"],
+                connection=self.connection,
+                budget_ids=self.budget_ids,
+                writer=self.writer,
+            )
+            # The writer only checks the delay when a row is added, so a timer commits
+            # the last rows of a burst
+            if self.writer is not None and self.writer.pending:
+                if self._flush_timer is None:
+                    self._flush_timer = asyncio.get_running_loop().call_later(
+                        self.group_commit_ms / 1000, self.flush
+                    )
+            return result
+
+        # Other operations see, and are ordered after, every transaction added so far
+        self.flush()
+        if op == "shutdown":
+            # Stop once this response has been written
+            asyncio.get_running_loop().call_soon(self.stopped.set)
+            return "Server shutting down."
+        if op == "add_budget":
+            result = create_budget_category(
+                request["name"], request["amount"], connection=self.connection
+            )
+            self.budget_ids = get_budget_ids(self.connection)
+            return result
+        if op == "add_budget_file":
+            result = create_budget_categories_from_file(
+                request["file"],
+                connection=self.connection,
+                file_format=request.get("format"),
+            )
+            self.budget_ids = get_budget_ids(self.connection)
+            return result
+        if op == "import":
+            files = request["files"]
+            # A single string would otherwise be read as one path per character
+            if not isinstance(files, list) or not all(
+                isinstance(file, str) for file in files
+            ):
+                raise TypeError("files must be a list of file paths")
+            file_paths = expand_file_patterns(files)
+            options = {
+                "connection": self.connection,
+                "batch_size": request.get("batch_size", DEFAULT_BATCH_SIZE),
+                "file_format": request.get("format"),
+                "skip_invalid": request.get("skip_invalid", False),
+                "rejects_file": request.get("rejects"),
+            }
+            if len(file_paths) == 1:
+                return add_transactions_from_file(file_paths[0], **options)
+            return add_transactions_from_files(
+                file_paths, workers=request.get("workers"), **options
+            )
+        if op == "report":
+            return generate_report(
+                request["output"],
+                connection=self.connection,
+                start_date=request.get("from"),
+                end_date=request.get("to"),
+                budget_name=request.get("budget"),
+                file_format=request.get("format"),
+                period=request.get("period"),
+                snapshot_dir=request.get("snapshot"),
+            )
+        if op == "search":
+            return search_transactions(
+                request["query"],
+                connection=self.connection,
+                start_date=request.get("from"),
+                end_date=request.get("to"),
+                budget_name=request.get("budget"),
+                limit=request.get("limit", DEFAULT_SEARCH_LIMIT),
+            )
+        if op == "snapshot":
+            return create_snapshot(
+                request["dir"],
+                connection=self.connection,
+                file_format=request.get("format"),
+                full=request.get("full", False),
+            )
+        return f"Error: Unknown operation '{op}'."
+
+    def respond(self, line: bytes) -> dict:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("expected a JSON object")
+            result = self.handle(request)
+        except KeyError as e:
+            result = f"Error: Missing field {e}."
+        except (TypeError, ValueError) as e:
+            result = f"Error: Invalid request: {e}."
+        except Exception as e:
+            # A failing request, such as a file that cannot be read or written, must
+            # not close the connection or stop the server
+            result = f"Error: {type(e).__name__}: {e}"
+        return {"ok": not result.startswith("Error"), "result": result}
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while not self.stopped.is_set():
+                line = await reader.readline()
+                if not line:
+                    break
+                response = json.dumps(self.respond(line))
+                writer.write(response.encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: str):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(self._handle_client, socket_path)
+        # Only the user running the server may connect
+        os.chmod(socket_path, 0o600)
+        try:
+            async with server:
+                await self.stopped.wait()
+                server.close()
+                server.close_clients()
+        finally:
+            self.flush()
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+
+
+def serve(socket_path: str, connection=None, group_commit_ms: float | None = None):
+    """
+    Runs the server on a Unix socket until it receives a shutdown request or is interrupted.
+
+    Args:
+        socket_path (str): The path of the socket file, which is replaced if it exists.
+        connection: An open SQLite connection. Defaults to this thread's shared connection.
+        group_commit_ms (float | None): If set, commit added transactions in groups.
+    """
+    server = BudgetServer(connection, group_commit_ms)
+    try:
+        asyncio.run(server.serve(socket_path))
+    except KeyboardInterrupt:
+        pass
+
+
+def send_request(socket_path: str, request: dict) -> dict:
+    """
+    Sends one request to a running server and returns its response.
+
+    Opens a new socket connection per call; clients sending many requests can instead
+    keep a connection open and write one JSON line per request.
+
+    Args:
+        socket_path (str): The path of the server's socket file.
+        request (dict): The request, with an "op" field naming the operation.
+    Returns:
+        dict: The response, {"ok": bool, "result": message}.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        with client.makefile("rwb") as stream:
+            stream.write(json.dumps(request).encode() + b"\n")
+            stream.flush()
+            return json.loads(stream.readline())
@@ -0,0 +1,271 @@
+"""
+Columnar snapshots of the budgets and transactions tables, for analytics with Polars.
+
+A snapshot is a directory holding a budgets file, which is rewritten on every update,
+the transactions as a list of part files, and snapshot.json, which records the parts.
+Each update appends a part with only the transactions added since the previous update.
+Parts are uncompressed Arrow IPC files by default, which Polars memory-maps rather than
+reads, or Parquet files, which are smaller but must be decoded:
+
+    snapshot = Snapshot("snapshot")
+    snapshot.transactions.group_by("budget_id").agg(pl.col("amount").sum()).collect()
+
+Amounts are integer minor units (cents), as in the database.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from datetime import date as Date
+
+from budget_manager.database import (
+    DEFAULT_CHUNK_SIZE,
+    get_database_version,
+    get_transaction_counts,
+    iter_transaction_chunks,
+    select_budgets,
+)
+from budget_manager.io import write_dataframe
+from budget_manager.lazy import lazy_import
+from budget_manager.metrics import count, phase
+
+# Loaded on first use, see budget_manager.lazy
+pl = lazy_import("polars")
+
+# Snapshot file formats and their file extensions
+SNAPSHOT_FORMATS = {"ipc": ".arrow", "parquet": ".parquet"}
+STATE_FILE = "snapshot.json"
+# Report periods, as Polars truncation intervals. Weeks start on Monday.
+_PERIOD_INTERVALS = {"month": "1mo", "week": "1w"}
+
+
+def _read_state(snapshot_dir: str) -> dict | None:
+    state_file = os.path.join(snapshot_dir, STATE_FILE)
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file) as f:
+        return json.load(f)
+
+
+def update_snapshot(
+    connection,
+    snapshot_dir: str,
+    file_format: str = "ipc",
+    full: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> tuple[int, bool]:
+    """
+    Brings a snapshot up to date with the database, appending only the new transactions.
+
+    The snapshot is rewritten in full instead if full is set, if it was made from another
+    database or in another format, or if transactions it holds have since been removed
+    from the database; transactions moved to the archive still count as present.
+
+    Readers see either the previous or the updated snapshot: new part files are only
+    listed in snapshot.json, which is replaced last, once they have been written.
+
+    Args:
+        connection: An open SQLite connection.
+        snapshot_dir (str): The snapshot directory, created if it does not exist.
+        file_format (str): "ipc" or "parquet".
+        full (bool): Rewrite the snapshot even if it could be appended to.
+        chunk_size (int): The maximum number of transactions in each new part file.
+    Returns:
+        tuple[int, bool]: The number of transactions written, and whether the snapshot
+            was rewritten rather than appended to.
+    Raises:
+        sqlite3.Error: If the database could not be read.
+    """
+    extension = SNAPSHOT_FORMATS[file_format]
+    os.makedirs(snapshot_dir, exist_ok=True)
+    state = _read_state(snapshot_dir)
+    database_id, _ = get_database_version(connection)
+
+    # Every query below reads the same version of the database
+    own_transaction = not connection.in_transaction
+    if own_transaction:
+        connection.execute("BEGIN")
+    try:
+        last_id = state["last_id"] if state else 0
+        max_id, copied, archived = get_transaction_counts(connection, last_id)
+        rewrite = (
+            full
+            or state is None
+            or state["database_id"] != database_id
+            or state["format"] != file_format
+            or copied + archived != state["copied"] + state["archived"]
+        )
+        if rewrite:
+            last_id = 0
+            generation = state["generation"] + 1 if state else 0
+            parts = []
+        else:
+            generation = state["generation"]
+            parts = list(state["parts"])
+
+        written = 0
+        with phase("snapshot"):
+            for chunk in iter_transaction_chunks(
+                connection,
+                last_id,
+                max_id,
+                include_archived=rewrite,
+                chunk_size=chunk_size,
+            ):
+                df = pl.DataFrame(
+                    chunk,
+                    schema={
+                        "budget_id": pl.Int64,
+                        "amount": pl.Int64,
+                        "date": pl.Utf8,
+                        "description": pl.Utf8,
+                        "source_id": pl.Utf8,
+                    },
+                    orient="row",
+                ).with_columns(pl.col("date").str.to_date("%Y-%m-%d"))
+                part = f"transactions-{generation:04d}-{len(parts):06d}{extension}"
+                write_dataframe(df, os.path.join(snapshot_dir, part), file_format)
+                parts.append(part)
+                written += len(chunk)
+
+            budgets = pl.DataFrame(
+                select_budgets(connection),
+                schema={"id": pl.Int64, "name": pl.Utf8, "amount": pl.Int64},
+                orient="row",
+            )
+            budgets_file = os.path.join(snapshot_dir, f"budgets{extension}")
+            write_dataframe(budgets, f"{budgets_file}.tmp", file_format)
+            os.replace(f"{budgets_file}.tmp", budgets_file)
+        _, copied, archived = get_transaction_counts(connection, max_id)
+    finally:
+        if own_transaction:
+            connection.rollback()
+    count("rows_snapshotted", written)
+
+    state = {
+        "database_id": database_id,
+        "format": file_format,
+        "generation": generation,
+        "last_id": max_id,
+        "copied": copied,
+        "archived": archived,
+        "parts": parts,
+    }
+    state_file = os.path.join(snapshot_dir, STATE_FILE)
+    with open(f"{state_file}.tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(f"{state_file}.tmp", state_file)
+
+    # Remove the parts of a snapshot that was rewritten
+    for name in os.listdir(snapshot_dir):
+        if name.startswith("transactions-") and name not in parts:
+            os.remove(os.path.join(snapshot_dir, name))
+    return written, rewrite
+
+
+class Snapshot:
+    """
+    A snapshot opened for queries, with the budgets and transactions as Polars LazyFrames.
+
+    Args:
+        snapshot_dir (str): The snapshot directory, as written by update_snapshot.
+    Raises:
+        FileNotFoundError: If the directory does not hold a snapshot.
+    """
+
+    def __init__(self, snapshot_dir: str):
+        state = _read_state(snapshot_dir)
+        if state is None:
+            raise FileNotFoundError(f"No snapshot found in {snapshot_dir}.")
+        scan = pl.scan_ipc if state["format"] == "ipc" else pl.scan_parquet
+        extension = SNAPSHOT_FORMATS[state["format"]]
+        self.budgets = scan(os.path.join(snapshot_dir, f"budgets{extension}"))
+        if state["parts"]:
+            self.transactions = scan(
+                [os.path.join(snapshot_dir, part) for part in state["parts"]]
+            )
+        else:
+            self.transactions = pl.LazyFrame(
+                schema={
+                    "budget_id": pl.Int64,
+                    "amount": pl.Int64,
+                    "date": pl.Date,
+                    "description": pl.Utf8,
+                    "source_id": pl.Utf8,
+                }
+            )
+
+    def get_budget_names(self) -> list[str]:
+        return self.budgets.select("name").collect()["name"].to_list()
+
+    def _filtered(self, start_date: str | None, end_date: str | None) -> pl.LazyFrame:
+        transactions = self.transactions
+        if start_date is not None:
+            transactions = transactions.filter(
+                pl.col("date") >= Date.fromisoformat(start_date)
+            )
+        if end_date is not None:
+            transactions = transactions.filter(
+                pl.col("date") <= Date.fromisoformat(end_date)
+            )
+        return transactions
+
+    def select_budget_totals(
+        self,
+        start_date: str | None = None,
+        end_date: str | None = None,
+        budget_name: str | None = None,
+    ) -> list[tuple[str, int, int]]:
+        """The snapshot's equivalent of database.select_budget_totals."""
+        totals = (
+            self._filtered(start_date, end_date)
+            .group_by("budget_id")
+            .agg(total=pl.col("amount").sum())
+        )
+        budgets = self.budgets
+        if budget_name is not None:
+            budgets = budgets.filter(pl.col("name") == budget_name)
+        return (
+            budgets.join(totals, left_on="id", right_on="budget_id", how="left")
+            .sort("id")
+            .select("name", "amount", pl.col("total").fill_null(0))
+            .collect()
+            .rows()
+        )
+
+    def select_period_totals(
+        self,
+        period: str = "month",
+        start_date: str | None = None,
+        end_date: str | None = None,
+        budget_name: str | None = None,
+    ) -> list[tuple[str, int, str, int, int]]:
+        """The snapshot's equivalent of database.select_period_totals."""
+        if period not in _PERIOD_INTERVALS:
+            raise ValueError(
+                f"Unknown report period '{period}', expected one of: {', '.join(_PERIOD_INTERVALS)}."
+            )
+        totals = (
+            self._filtered(start_date, end_date)
+            .group_by(
+                "budget_id", start=pl.col("date").dt.truncate(_PERIOD_INTERVALS[period])
+            )
+            .agg(total=pl.col("amount").sum())
+        )
+        budgets = self.budgets
+        if budget_name is not None:
+            budgets = budgets.filter(pl.col("name") == budget_name)
+        return (
+            budgets.join(totals, left_on="id", right_on="budget_id", how="inner")
+            .sort("id", "start")
+            .select(
+                "name",
+                "amount",
+                pl.col("start").dt.to_string("%Y-%m-%d"),
+                "total",
+                cumulative=pl.col("total").cum_sum().over("id"),
+            )
+            .collect()
+            .rows()
+        )
@@ -1,5 +1,44 @@
 import sqlite3
-from budget_manager.database import create_tables, insert_budget, insert_transaction
+from collections import Counter
+
+import pytest
+from budget_manager.database import (
+    close_shared_connections,
+    get_shared_connection,
+    apply_profile,
+    archive_transactions,
+    check_budget_totals,
+    find_ledgers,
+    get_archived_years,
+    get_database_version,
+    initialise_database,
+    rebuild_budget_totals,
+    create_tables,
+    create_indexes,
+    get_budget_id_by_name,
+    insert_budget,
+    insert_transaction,
+    insert_transactions,
+    get_budget_ids,
+    select_budget_totals,
+    select_matching_transactions,
+    select_period_totals,
+    select_transactions_by_budget_id,
+    to_minor_units,
+    transaction_hash,
+    TransactionWriter,
+)
+
+
+def _numbered(rows):
+    # Adds the hash and occurrence number that file imports compute for each row
+    counts = Counter()
+    numbered = []
+    for row in rows:
+        content_hash = transaction_hash(*row)
+        numbered.append((*row, content_hash, counts[content_hash]))
+        counts[content_hash] += 1
+    return numbered
 
 
 def test_create_tables():
@@ -20,6 +59,162 @@ def test_create_tables():
     conn.close()
 
 
+def test_create_indexes_is_idempotent(db_conn):
+    # Running the upgrade again on an existing database should be a no-op
+    create_tables(db_conn)
+    create_indexes(db_conn)
+
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='index' ORDER BY name;")
+    indexes = [row[0] for row in cursor.fetchall()]
+    assert indexes == [
+        "idx_budgets_name",
+        "idx_transactions_budget_day",
+        "idx_transactions_hash",
+    ]
+
+
+def test_create_indexes_reports_duplicate_budget_names(capsys):
+    # An old database without the unique index may already contain duplicates
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE budgets (id INTEGER PRIMARY KEY, name TEXT, amount REAL)"
+    )
+    conn.execute(
+        "CREATE TABLE transactions (id INTEGER PRIMARY KEY, budget_id INTEGER, "
+        "amount REAL, date TEXT, description TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO budgets (name, amount) VALUES (?, ?)",
+        [("Rent", 1000.0), ("Rent", 1200.0)],
+    )
+    create_tables(conn)
+    assert "found duplicates 'Rent'" in capsys.readouterr().out
+    conn.close()
+
+
+def test_create_tables_adds_day_column_to_old_database():
+    # Databases created before the day column existed are backfilled on upgrade
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE transactions (id INTEGER PRIMARY KEY, budget_id INTEGER, "
+        "amount REAL NOT NULL, date TEXT NOT NULL, description TEXT)"
+    )
+    conn.execute(
+        "INSERT INTO transactions (budget_id, amount, date, description) "
+        "VALUES (1, 10.0, '1970-01-02', 'Old'), (1, 20.0, '2025-01-01', 'New')"
+    )
+    create_tables(conn)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT date, day FROM transactions ORDER BY id;")
+    assert cursor.fetchall() == [("1970-01-02", 1), ("2025-01-01", 20089)]
+    conn.close()
+
+
+def test_create_tables_converts_real_amounts_to_cents():
+    # Databases created before amounts were stored in cents are converted on upgrade
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE budgets (id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+        "amount REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE transactions (id INTEGER PRIMARY KEY, budget_id INTEGER, "
+        "amount REAL NOT NULL, date TEXT NOT NULL, description TEXT, day INTEGER)"
+    )
+    conn.execute(
+        "CREATE TABLE budget_totals (budget_id INTEGER, month INTEGER, total REAL, "
+        "compensation REAL, count INTEGER, PRIMARY KEY (budget_id, month))"
+    )
+    conn.execute("INSERT INTO budgets VALUES (1, 'Food', 300.0)")
+    conn.execute(
+        "INSERT INTO transactions (budget_id, amount, date, description) "
+        "VALUES (1, 12.99, '2025-01-01', 'Lunch'), (1, 1.005, '2025-01-02', 'Gum')"
+    )
+    create_tables(conn)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT amount, typeof(amount) FROM transactions ORDER BY id;")
+    assert cursor.fetchall() == [(1299, "integer"), (101, "integer")]
+    assert select_budget_totals(conn) == [("Food", 30000, 1400)]
+    assert check_budget_totals(conn) == []
+    conn.close()
+
+
+def test_create_tables_fills_in_missing_hashes(db_conn):
+    # Rows written without hashes are numbered on the next start-up
+    db_conn.executemany(
+        "INSERT INTO transactions (budget_id, amount, date, description) VALUES (?, ?, ?, ?)",
+        [(1, 300, "2025-01-01", "Coffee")] * 2,
+    )
+    db_conn.commit()
+    create_tables(db_conn)
+
+    rows = [(1, 300, "2025-01-01", "Coffee", None)] * 3
+    assert insert_transactions(db_conn, _numbered(rows)) == 2
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT occurrence FROM transactions ORDER BY id;")
+    assert cursor.fetchall() == [(0,), (1,), (2,)]
+
+
+def test_to_minor_units_rounds_half_away_from_zero():
+    assert to_minor_units(12.34) == 1234
+    assert to_minor_units(1.005) == 101
+    assert to_minor_units(-2.675) == -268
+    assert to_minor_units("0.285") == 29
+    assert to_minor_units(-9e16) == -9 * 10**18
+    with pytest.raises(ValueError):
+        to_minor_units(1e17)
+    with pytest.raises(ValueError):
+        to_minor_units(float("inf"))
+
+
+def test_inserts_reject_amounts_too_large_to_store(db_conn, capsys):
+    assert insert_budget(db_conn, "Rent", 1e17) is False
+    assert insert_budget(db_conn, "Rent", 1000.0) is True
+    rent = get_budget_id_by_name(db_conn, "Rent")
+    assert insert_transaction(db_conn, rent, 1e17, "2025-01-01", "Rent") is False
+    writer = TransactionWriter(db_conn)
+    assert writer.add(rent, -1e17, "2025-01-01", "Rent") is False
+    writer.flush()
+    assert "Amount is too large to store." in capsys.readouterr().out
+    assert select_transactions_by_budget_id(db_conn, rent) == []
+
+
+def test_insert_budget_rejects_duplicate_name(db_conn):
+    assert insert_budget(db_conn, "Rent", 1000.0) is True
+    assert insert_budget(db_conn, "Rent", 1200.0) is False
+
+
+def test_queries_use_indexes(db_conn):
+    insert_budget(db_conn, "Rent", 1000.0)
+
+    # Capture the SQL actually issued by the lookup and report functions
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+    get_budget_id_by_name(db_conn, "Rent")
+    select_budget_totals(db_conn)
+    select_budget_totals(db_conn, start_date="2025-01-01", end_date="2025-01-31")
+    db_conn.set_trace_callback(None)
+
+    plans = {}
+    cursor = db_conn.cursor()
+    for statement in statements:
+        # Leave out the checks for archived years
+        if statement.lstrip().startswith("SELECT") and "budgets" in statement:
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}")
+            plans[statement] = " | ".join(row[3] for row in cursor.fetchall())
+
+    lookup_plan, report_plan, date_range_plan = plans.values()
+    assert "USING COVERING INDEX idx_budgets_name (name=?)" in lookup_plan
+    assert "SEARCH bt USING PRIMARY KEY (budget_id=?)" in report_plan
+    assert (
+        "USING COVERING INDEX idx_transactions_budget_day (budget_id=? AND day>? AND day<?)"
+        in date_range_plan
+    )
+
+
 def test_insert_budget(db_conn):
     name = "Groceries"
     amount = 150.0
@@ -32,7 +227,7 @@ def test_insert_budget(db_conn):
     row = cursor.fetchone()
     assert row is not None, "Inserted budget should be found in the database"
     assert row[0] == name, "Budget name should match"
-    assert row[1] == amount, "Budget amount should match"
+    assert row[1] == 15000, "Budget amount should be stored in cents"
 
 
 def test_insert_transaction(db_conn):
@@ -56,6 +251,567 @@ def test_insert_transaction(db_conn):
     row = cursor.fetchone()
     assert row is not None, "Inserted transaction should be found in the database"
     assert row[0] == budget_id, "Transaction budget_id should match"
-    assert row[1] == 500.0, "Transaction amount should match"
+    assert row[1] == 50000, "Transaction amount should be stored in cents"
     assert row[2] == "2025-01-01", "Transaction date should match"
     assert row[3] == "Rent payment", "Transaction description should match"
+
+
+def test_insert_transactions(db_conn):
+    insert_budget(db_conn, "Rent", 1000.0)
+    insert_budget(db_conn, "Food", 300.0)
+    budget_ids = get_budget_ids(db_conn)
+    assert set(budget_ids) == {"Rent", "Food"}
+
+    rows = [(budget_ids["Food"], i, "2025-01-01", f"Item {i}", None) for i in range(10)]
+    result = insert_transactions(db_conn, _numbered(rows), chunk_size=3)
+    assert result == 0, "Bulk insert should not skip any rows"
+
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT COUNT(*), SUM(amount) FROM transactions;")
+    assert cursor.fetchone() == (10, 45)
+
+
+def test_insert_transactions_rolls_back_on_error(db_conn):
+    insert_budget(db_conn, "Rent", 1000.0)
+    budget_id = get_budget_ids(db_conn)["Rent"]
+
+    # The last row violates the NOT NULL constraint on amount
+    rows = [(budget_id, 50000, "2025-01-01", "Rent", None)] * 5
+    rows.append((budget_id, None, "2025-01-02", "Broken", None))
+    result = insert_transactions(db_conn, _numbered(rows), chunk_size=2)
+    assert result is None, "Bulk insert should fail"
+
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM transactions;")
+    assert cursor.fetchone()[0] == 0, "No rows should be committed after a failure"
+
+
+def test_insert_transactions_skips_duplicates(db_conn):
+    insert_budget(db_conn, "Food", 300.0)
+    budget_id = get_budget_ids(db_conn)["Food"]
+    coffee = (budget_id, 300, "2025-01-01", "Coffee", None)
+    lunch = (budget_id, 1200, "2025-01-01", "Lunch", None)
+
+    # Identical rows within one file are separate transactions
+    assert insert_transactions(db_conn, _numbered([coffee, coffee, lunch])) == 0
+
+    # Importing an overlapping file adds only the rows not already stored, and the
+    # same rows repeated in another file of the same import are duplicates too
+    dinner = (budget_id, 2500, "2025-01-02", "Dinner", None)
+    second_file = _numbered([coffee, coffee, lunch])
+    assert (
+        insert_transactions(
+            db_conn, _numbered([coffee, coffee, coffee, dinner]) + second_file
+        )
+        == 5
+    )
+
+    # A source id tells apart rows that are otherwise identical
+    assert insert_transactions(db_conn, _numbered([(*lunch[:4], "ref-1")])) == 0
+
+    cursor = db_conn.cursor()
+    cursor.execute(
+        "SELECT description, COUNT(*) FROM transactions GROUP BY 1 ORDER BY 1;"
+    )
+    assert cursor.fetchall() == [("Coffee", 3), ("Dinner", 1), ("Lunch", 2)]
+    assert check_budget_totals(db_conn) == []
+
+
+def test_insert_transactions_skips_duplicates_across_chunks(db_conn):
+    insert_budget(db_conn, "Food", 300.0)
+    budget_id = get_budget_ids(db_conn)["Food"]
+    coffee = (budget_id, 300, "2025-01-01", "Coffee", None)
+    lunch = (budget_id, 1200, "2025-01-01", "Lunch", None)
+    rows = _numbered([coffee, lunch, coffee, coffee, lunch, coffee])
+
+    # Duplicates are found whichever chunk they are staged in
+    assert insert_transactions(db_conn, rows[:3], chunk_size=2) == 0
+    assert insert_transactions(db_conn, rows, chunk_size=4) == 3
+
+    cursor = db_conn.cursor()
+    cursor.execute(
+        "SELECT description, group_concat(occurrence) FROM transactions GROUP BY 1 ORDER BY 1;"
+    )
+    assert cursor.fetchall() == [("Coffee", "0,1,2,3"), ("Lunch", "0,1")]
+
+
+def test_insert_transaction_repeats_are_kept(db_conn):
+    insert_budget(db_conn, "Food", 300.0)
+    budget_id = get_budget_ids(db_conn)["Food"]
+    for _ in range(2):
+        assert insert_transaction(db_conn, budget_id, 3.0, "2025-01-01", "Coffee")
+
+    # A bulk import of the same two rows recognises both as already stored
+    rows = [(budget_id, 300, "2025-01-01", "Coffee", None)] * 2
+    assert insert_transactions(db_conn, _numbered(rows)) == 2
+
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT occurrence FROM transactions ORDER BY id;")
+    assert cursor.fetchall() == [(0,), (1,)]
+
+
+def test_transaction_writer_commits_in_groups(tmp_path):
+    db_path = tmp_path / "ledger.db"
+    writer_conn = sqlite3.connect(db_path)
+    create_tables(writer_conn)
+    insert_budget(writer_conn, "Food", 300.0)
+    budget_id = get_budget_ids(writer_conn)["Food"]
+    reader_conn = sqlite3.connect(db_path)
+
+    def committed_rows():
+        return reader_conn.execute("SELECT COUNT(*) FROM transactions;").fetchone()[0]
+
+    with TransactionWriter(writer_conn, max_rows=3, max_delay_ms=60_000) as writer:
+        for i in range(4):
+            assert writer.add(budget_id, 1.0, "2025-01-01", f"Item {i}")
+        # The first three rows were committed together; the fourth is pending
+        assert committed_rows() == 3
+        assert writer.pending == 1
+
+        # A failed row is reported without losing the other pending rows
+        assert writer.add(budget_id, 1.0, None, "Broken") is False
+        assert writer.pending == 1
+    assert committed_rows() == 4
+
+    # With no delay allowed, every row is committed as it is added
+    writer = TransactionWriter(writer_conn, max_rows=100, max_delay_ms=0)
+    assert writer.add(budget_id, 1.0, "2025-01-03", "Item 4")
+    assert committed_rows() == 5
+    assert check_budget_totals(writer_conn) == []
+
+    writer_conn.close()
+    reader_conn.close()
+
+
+def test_select_budget_totals(db_conn):
+    insert_budget(db_conn, "Entertainment", 100.0)
+    insert_budget(db_conn, "Savings", 500.0)
+    budget_id = get_budget_ids(db_conn)["Entertainment"]
+    for amount in [12.99, 15.0, 40.0]:
+        insert_transaction(db_conn, budget_id, amount, "2025-01-01", "Fun")
+
+    totals = select_budget_totals(db_conn)
+
+    # Totals are summed exactly in cents and budgets without spending are included
+    assert totals == [("Entertainment", 10000, 6799), ("Savings", 50000, 0)]
+
+
+def test_select_budget_totals_with_filters(db_conn):
+    insert_budget(db_conn, "Rent", 1000.0)
+    insert_budget(db_conn, "Food", 300.0)
+    budget_ids = get_budget_ids(db_conn)
+    insert_transaction(db_conn, budget_ids["Rent"], 900.0, "2024-12-31", "December")
+    insert_transaction(db_conn, budget_ids["Rent"], 950.0, "2025-01-01", "January")
+    insert_transaction(db_conn, budget_ids["Food"], 20.0, "2025-01-31", "Lunch")
+    insert_transaction(db_conn, budget_ids["Food"], 30.0, "2025-02-01", "Dinner")
+
+    totals = select_budget_totals(
+        db_conn, start_date="2025-01-01", end_date="2025-01-31"
+    )
+    assert totals == [("Rent", 100000, 95000), ("Food", 30000, 2000)]
+
+    totals = select_budget_totals(db_conn, start_date="2025-01-15", budget_name="Rent")
+    assert totals == [("Rent", 100000, 0)]
+
+
+def test_select_period_totals(db_conn):
+    insert_budget(db_conn, "Rent", 1000.0)
+    insert_budget(db_conn, "Food", 300.0)
+    budget_ids = get_budget_ids(db_conn)
+    insert_transaction(db_conn, budget_ids["Food"], 10.0, "2025-01-05", "Sunday")
+    insert_transaction(db_conn, budget_ids["Food"], 5.0, "2025-01-06", "Monday")
+    insert_transaction(db_conn, budget_ids["Food"], 7.0, "2025-02-01", "Saturday")
+    insert_transaction(db_conn, budget_ids["Rent"], 900.0, "2025-01-01", "Rent")
+
+    # Monthly totals with a running total per budget, read from budget_totals
+    assert select_period_totals(db_conn, "month") == [
+        ("Rent", 100000, "2025-01-01", 90000, 90000),
+        ("Food", 30000, "2025-01-01", 1500, 1500),
+        ("Food", 30000, "2025-02-01", 700, 2200),
+    ]
+
+    # Weeks start on Monday
+    assert select_period_totals(db_conn, "week", budget_name="Food") == [
+        ("Food", 30000, "2024-12-30", 1000, 1000),
+        ("Food", 30000, "2025-01-06", 500, 1500),
+        ("Food", 30000, "2025-01-27", 700, 2200),
+    ]
+
+    # The running total starts at the beginning of the date range
+    assert select_period_totals(
+        db_conn, "month", start_date="2025-01-06", budget_name="Food"
+    ) == [
+        ("Food", 30000, "2025-01-01", 500, 500),
+        ("Food", 30000, "2025-02-01", 700, 1200),
+    ]
+
+    with pytest.raises(ValueError):
+        select_period_totals(db_conn, "year")
+
+
+def test_budget_totals_follow_transaction_changes(db_conn):
+    insert_budget(db_conn, "Rent", 1000.0)
+    insert_budget(db_conn, "Food", 300.0)
+    budget_ids = get_budget_ids(db_conn)
+    insert_transaction(db_conn, budget_ids["Food"], 0.1, "2025-01-01", "Gum")
+    insert_transaction(db_conn, budget_ids["Food"], 0.2, "2025-01-02", "Mints")
+    insert_transaction(db_conn, budget_ids["Rent"], 900.0, "2025-02-01", "Rent")
+
+    cursor = db_conn.cursor()
+    cursor.execute(
+        "SELECT budget_id, month, total, count FROM budget_totals "
+        "ORDER BY budget_id, month;"
+    )
+    assert cursor.fetchall() == [
+        (budget_ids["Rent"], 202502, 90000, 1),
+        (budget_ids["Food"], 202501, 30, 2),
+    ]
+
+    # Moving, changing and deleting transactions keeps the totals in step
+    cursor.execute("UPDATE transactions SET amount = 95000 WHERE description = 'Rent';")
+    cursor.execute(
+        "UPDATE transactions SET date = '2025-03-01' WHERE description = 'Mints';"
+    )
+    cursor.execute("DELETE FROM transactions WHERE description = 'Gum';")
+    db_conn.commit()
+    assert check_budget_totals(db_conn) == []
+    assert select_budget_totals(db_conn) == [
+        ("Rent", 100000, 95000),
+        ("Food", 30000, 20),
+    ]
+
+
+def test_check_and_rebuild_budget_totals(db_conn):
+    insert_budget(db_conn, "Rent", 1000.0)
+    budget_id = get_budget_ids(db_conn)["Rent"]
+    insert_transaction(db_conn, budget_id, 900.0, "2025-01-01", "Rent")
+
+    # Corrupt the stored totals behind the triggers' back
+    db_conn.execute("UPDATE budget_totals SET total = 1;")
+    db_conn.execute("INSERT INTO budget_totals VALUES (?, 202502, 5, 1);", (budget_id,))
+    db_conn.commit()
+    assert check_budget_totals(db_conn) == [
+        (budget_id, 202501, 1, 90000),
+        (budget_id, 202502, 5, 0),
+    ]
+
+    assert rebuild_budget_totals(db_conn) is True
+    assert check_budget_totals(db_conn) == []
+
+
+def test_apply_profile(tmp_path, monkeypatch):
+    conn = sqlite3.connect(tmp_path / "profile.db")
+    cursor = conn.cursor()
+
+    apply_profile(conn, "bulk-import")
+    assert cursor.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    assert cursor.execute("PRAGMA synchronous;").fetchone()[0] == 1  # NORMAL
+    assert cursor.execute("PRAGMA cache_size;").fetchone()[0] == -262_144
+    assert cursor.execute("PRAGMA temp_store;").fetchone()[0] == 2  # MEMORY
+    assert cursor.execute("PRAGMA busy_timeout;").fetchone()[0] == 30_000
+
+    # Without an explicit profile the environment variable is used
+    monkeypatch.setenv("BUDGET_MANAGER_PROFILE", "read-heavy")
+    apply_profile(conn)
+    assert cursor.execute("PRAGMA mmap_size;").fetchone()[0] == 1_073_741_824
+
+    with pytest.raises(ValueError, match="Unknown connection profile 'fast'"):
+        apply_profile(conn, "fast")
+    conn.close()
+
+
+def test_get_shared_connection(tmp_path, monkeypatch):
+    monkeypatch.setenv("BUDGET_MANAGER_DB", str(tmp_path / "shared.db"))
+
+    conn = get_shared_connection()
+    assert get_shared_connection() is conn, "The connection should be reused"
+    assert get_shared_connection(db_path=str(tmp_path / "shared.db")) is conn
+    other = get_shared_connection(db_path=str(tmp_path / "other.db"))
+    assert other is not conn, "Each database file gets its own connection"
+
+    # Shared connections are initialised with the schema
+    assert insert_budget(conn, "Rent", 1000.0) is True
+
+    close_shared_connections()
+    assert get_shared_connection() is not conn
+    close_shared_connections()
+
+
+def test_archive_transactions(tmp_path):
+    conn = initialise_database(db_path=str(tmp_path / "ledger.db"))
+    insert_budget(conn, "Rent", 1000.0)
+    rent = get_budget_id_by_name(conn, "Rent")
+    for date in ["2023-03-01", "2023-03-01", "2024-06-01", "2025-01-01"]:
+        insert_transaction(conn, rent, 900.0, date, "Rent")
+    before = select_budget_totals(conn)
+
+    assert archive_transactions(conn, 2025) == 3
+    assert get_archived_years(conn) == [2023, 2024]
+    assert (tmp_path / "ledger.archive.db").exists()
+    cursor = conn.cursor()
+    cursor.execute("SELECT date FROM main.transactions")
+    assert cursor.fetchall() == [("2025-01-01",)], "Only 2025 stays in the main file"
+
+    # Totals are unchanged, and reports on archived years read the archive
+    assert select_budget_totals(conn) == before
+    assert check_budget_totals(conn) == []
+    assert select_budget_totals(conn, start_date="2023-01-01") == before
+    assert select_budget_totals(conn, start_date="2024-01-01") == [
+        ("Rent", 100000, 180000)
+    ]
+    assert [row[2:] for row in select_period_totals(conn, "week")] == [
+        ("2023-02-27", 180000, 180000),
+        ("2024-05-27", 90000, 270000),
+        ("2024-12-30", 90000, 360000),
+    ]
+    assert len(select_transactions_by_budget_id(conn, rent)) == 4
+
+    # Reports on a date range read the main table and each archived year through
+    # their (budget_id, day) indexes
+    statements = []
+    conn.set_trace_callback(statements.append)
+    select_budget_totals(conn, start_date="2023-01-01")
+    select_period_totals(conn, "week", start_date="2023-01-01")
+    conn.set_trace_callback(None)
+    for statement in statements:
+        if statement.lstrip().startswith("SELECT") and "budgets" in statement:
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}")
+            plan = [row[3] for row in cursor.fetchall()]
+            assert not any("MATERIALIZE" in step for step in plan), plan
+            searches = [step for step in plan if "_budget_day (budget_id=? AND" in step]
+            assert len(searches) == 3, plan
+
+    assert rebuild_budget_totals(conn) is True
+    assert select_budget_totals(conn) == before
+
+    # Archived rows are duplicates on re-import, and a reopened connection sees them
+    conn.close()
+    conn = initialise_database(db_path=str(tmp_path / "ledger.db"))
+    rows = [
+        (rent, 90000, "2023-03-01", "Rent", None),
+        (rent, 90000, "2023-03-01", "Rent", None),
+        (rent, 90000, "2023-03-01", "Rent", None),
+    ]
+    assert insert_transactions(conn, _numbered(rows)) == 2
+    cursor = conn.cursor()
+    cursor.execute("SELECT occurrence FROM main.transactions WHERE date = '2023-03-01'")
+    assert cursor.fetchall() == [(2,)]
+    conn.close()
+
+
+def test_archive_is_seen_by_connections_opened_before_it(tmp_path):
+    db_path = str(tmp_path / "ledger.db")
+    conn = initialise_database(db_path=db_path)
+    warm = initialise_database(db_path=db_path)
+    insert_budget(conn, "Rent", 1000.0)
+    rows = [
+        (1, 90000, date, "Rent", None)
+        for date in ["2023-03-01", "2024-03-01", "2025-03-01"]
+    ]
+    assert insert_transactions(conn, _numbered(rows)) == 0
+
+    # Each archive is made by another connection, after the warm one was opened
+    for year in [2024, 2025]:
+        assert archive_transactions(conn, year) == 1
+        assert insert_transactions(warm, _numbered(rows)) == 3, (
+            "Archived rows are duplicates"
+        )
+        assert select_budget_totals(warm, start_date="2023-01-01") == [
+            ("Rent", 100000, 270000)
+        ]
+        assert len(select_period_totals(warm, "month", start_date="2023-01-01")) == 3
+        assert check_budget_totals(warm) == []
+    assert get_archived_years(warm) == [2023, 2024]
+    warm.close()
+    conn.close()
+
+
+def test_archive_transactions_renumbers_repeated_rows(tmp_path):
+    conn = initialise_database(db_path=str(tmp_path / "ledger.db"))
+    insert_budget(conn, "Rent", 1000.0)
+    rent = get_budget_id_by_name(conn, "Rent")
+    insert_transaction(conn, rent, 900.0, "2023-03-01", "Rent")
+    assert archive_transactions(conn, 2024) == 1
+
+    # The same transaction added again after its year was archived is kept as a
+    # second occurrence when the year is archived again
+    insert_transaction(conn, rent, 900.0, "2023-03-01", "Rent")
+    assert archive_transactions(conn, 2024) == 1
+    assert archive_transactions(conn, 2024) == 0
+    cursor = conn.cursor()
+    cursor.execute("SELECT occurrence FROM archive.transactions_2023 ORDER BY id")
+    assert cursor.fetchall() == [(0,), (1,)]
+    assert check_budget_totals(conn) == []
+    conn.close()
+
+
+def test_writes_bump_the_database_version(db_conn):
+    database_id, version = get_database_version(db_conn)
+    assert len(database_id) == 32
+
+    insert_budget(db_conn, "Rent", 1000.0)
+    insert_transaction(db_conn, 1, 900.0, "2025-01-01", "Rent")
+    assert (
+        insert_transactions(db_conn, _numbered([(1, 100, "2025-01-02", "Fee", None)]))
+        == 0
+    )
+    with TransactionWriter(db_conn) as writer:
+        writer.add(1, 900.0, "2025-02-01", "Rent")
+        writer.add(1, 900.0, "2025-03-01", "Rent")
+    assert get_database_version(db_conn) == (database_id, version + 4)
+
+    # Nothing is written when every row is a duplicate
+    assert (
+        insert_transactions(db_conn, _numbered([(1, 100, "2025-01-02", "Fee", None)]))
+        == 1
+    )
+    assert rebuild_budget_totals(db_conn) is True
+    assert get_database_version(db_conn) == (database_id, version + 5)
+
+
+def test_find_ledgers(tmp_path):
+    for name in ["b.db", "a.db", "a.archive.db", "notes.txt"]:
+        (tmp_path / name).touch()
+    missing = str(tmp_path / "missing.db")
+    assert find_ledgers([str(tmp_path), missing, str(tmp_path / "a.db")]) == [
+        str(tmp_path / "a.db"),
+        str(tmp_path / "b.db"),
+        missing,
+    ]
+
+
+def test_search_index_follows_inserts_archiving_and_upgrades(tmp_path):
+    conn = initialise_database(db_path=str(tmp_path / "ledger.db"))
+    insert_budget(conn, "Groceries", 300.0)
+    insert_budget(conn, "Dining", 100.0)
+    groceries = get_budget_id_by_name(conn, "Groceries")
+    dining = get_budget_id_by_name(conn, "Dining")
+    insert_transaction(conn, groceries, 40.0, "2023-05-02", "WHOLE FOODS MKT #10")
+    rows = [
+        (groceries, 2550, "2024-01-15", "Whole Foods Market", None),
+        (dining, 1200, "2024-01-20", "Wholesome Café", None),
+        (groceries, 800, "2024-02-01", "Corner shop", None),
+    ]
+    assert insert_transactions(conn, _numbered(rows)) == 0
+
+    def search(query, **filters):
+        rows, matched, total = select_matching_transactions(conn, query, **filters)
+        return [row[3] for row in rows], matched, total
+
+    everything = (
+        ["Whole Foods Market", "WHOLE FOODS MKT #10"],
+        2,
+        6550,
+    )
+    assert search('"whole foods"') == everything
+    assert search("whole*") == (
+        ["Wholesome Café", "Whole Foods Market", "WHOLE FOODS MKT #10"],
+        3,
+        7750,
+    )
+    assert search("cafe") == (["Wholesome Café"], 1, 1200)
+    assert search("whole*", budget_name="Dining") == (["Wholesome Café"], 1, 1200)
+    assert search("whole*", start_date="2024-01-16", end_date="2024-12-31") == (
+        ["Wholesome Café"],
+        1,
+        1200,
+    )
+    assert search('"whole foods"', limit=1) == (["Whole Foods Market"], 2, 6550)
+    with pytest.raises(sqlite3.OperationalError):
+        search('"whole')
+
+    # Archived years are searched in the archive
+    assert archive_transactions(conn, 2024) == 1
+    assert search('"whole foods"') == everything
+    assert search('"whole foods"', start_date="2024-01-01")[1] == 1
+
+    # Databases created before the index are indexed when opened
+    conn.execute("DROP TABLE transactions_fts")
+    conn.execute("DROP TABLE archive.transactions_2023_fts")
+    conn.commit()
+    conn.close()
+    conn = initialise_database(db_path=str(tmp_path / "ledger.db"))
+    assert search('"whole foods"') == everything
+    conn.execute("DELETE FROM transactions WHERE description = 'Whole Foods Market'")
+    assert search('"whole foods"') == (["WHOLE FOODS MKT #10"], 1, 4000)
+    conn.close()
+
+
+def test_create_tables_normalises_legacy_dates(capsys):
+    # Dates were not validated before the day column existed
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE budgets (id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+        "amount REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE transactions (id INTEGER PRIMARY KEY, budget_id INTEGER, "
+        "amount REAL NOT NULL, date TEXT NOT NULL, description TEXT)"
+    )
+    conn.execute("INSERT INTO budgets VALUES (1, 'Food', 300.0)")
+    conn.executemany(
+        "INSERT INTO transactions (budget_id, amount, date, description) "
+        "VALUES (1, ?, ?, 'Lunch')",
+        [
+            (10.0, "01/15/2025"),
+            (20.0, "15/01/2025"),
+            (30.0, "2025-01-16 12:30:00"),
+            (40.0, "31.01.2025"),
+            (50.0, "2025-02-01"),
+            (60.0, "next tuesday"),
+            (70.0, "2025-02-30"),
+        ],
+    )
+    conn.commit()
+    create_tables(conn)
+    assert capsys.readouterr().out == (
+        "Database error: moved 2 transactions with unreadable dates to the "
+        "quarantined_transactions table (ids 6, 7).\n"
+    )
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT date, day IS NOT NULL FROM transactions ORDER BY id;")
+    assert cursor.fetchall() == [
+        ("2025-01-15", 1),
+        ("2025-01-15", 1),
+        ("2025-01-16", 1),
+        ("2025-01-31", 1),
+        ("2025-02-01", 1),
+    ]
+    cursor.execute("SELECT id, amount, date FROM quarantined_transactions ORDER BY id;")
+    assert cursor.fetchall() == [(6, 60.0, "next tuesday"), (7, 70.0, "2025-02-30")]
+    assert select_budget_totals(conn) == [("Food", 30000, 15000)]
+    assert select_budget_totals(conn, start_date="2025-01-01") == [
+        ("Food", 30000, 15000)
+    ]
+    assert check_budget_totals(conn) == []
+    conn.close()
+
+
+def test_create_tables_fails_loudly_if_totals_cannot_be_built(capsys):
+    conn = sqlite3.connect(":memory:")
+    create_tables(conn)
+    insert_budget(conn, "Food", 300.0)
+    # As in a database created before the table existed
+    for trigger in ("insert", "delete", "update"):
+        conn.execute(f"DROP TRIGGER budget_totals_{trigger}")
+    conn.execute("DROP TABLE budget_totals")
+    conn.execute(
+        "INSERT INTO transactions (budget_id, amount, date, day) "
+        "VALUES (1, 2000, '01/15/2025', NULL)"
+    )
+    conn.commit()
+
+    with pytest.raises(sqlite3.DatabaseError, match="budget_totals"):
+        create_tables(conn)
+    assert "NOT NULL constraint failed" in capsys.readouterr().out
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'budget_totals'")
+    assert cursor.fetchone() is None, "No empty table is left behind"
+
+    # The next start-up builds the table once the date is fixed
+    conn.execute("UPDATE transactions SET date = '2025-01-15', day = 20103")
+    conn.commit()
+    create_tables(conn)
+    assert select_budget_totals(conn) == [("Food", 30000, 2000)]
+    conn.close()
@@ -1,5 +1,3 @@
-
-
 def test_read_csv_file_to_dataframe(tmp_path):
     from budget_manager.io import read_csv_to_dataframe
     import polars as pl
@@ -19,3 +17,64 @@ def test_read_csv_file_to_dataframe(tmp_path):
 
     # Assert that the DataFrame matches the expected DataFrame
     assert_frame_equal(df, expected_df)
+
+
+def test_read_csv_in_batches(tmp_path):
+    from budget_manager.io import read_csv_in_batches
+    import polars as pl
+    from polars.testing import assert_frame_equal
+
+    # Create a sample CSV file with more rows than a single batch
+    expected_df = pl.DataFrame(
+        {"name": [f"Person {i}" for i in range(10)], "age": list(range(10))}
+    )
+    csv_file = tmp_path / "test.csv"
+    expected_df.write_csv(csv_file)
+
+    batches = list(read_csv_in_batches(str(csv_file), batch_size=4))
+
+    assert [batch.height for batch in batches] == [4, 4, 2]
+    assert_frame_equal(pl.concat(batches), expected_df)
+
+
+def test_expand_file_patterns(tmp_path):
+    from budget_manager.io import expand_file_patterns
+
+    for name in ["b.csv", "a.csv", "notes.txt"]:
+        (tmp_path / name).write_text("")
+
+    file_paths = expand_file_patterns(
+        [str(tmp_path / "*.csv"), str(tmp_path / "a.csv"), "missing.csv"]
+    )
+
+    assert file_paths == [
+        str(tmp_path / "a.csv"),
+        str(tmp_path / "b.csv"),
+        "missing.csv",
+    ]
+
+
+def test_read_and_write_columnar_files(tmp_path):
+    from budget_manager.io import (
+        read_file_in_batches,
+        read_file_to_dataframe,
+        write_dataframe,
+    )
+    import polars as pl
+    from polars.testing import assert_frame_equal
+
+    expected_df = pl.DataFrame({"name": ["Alice", "Bob", "Carol"], "age": [30, 25, 41]})
+
+    for file_name in ["people.parquet", "people.arrow", "people.csv"]:
+        file_path = str(tmp_path / file_name)
+        write_dataframe(expected_df, file_path)
+
+        assert_frame_equal(read_file_to_dataframe(file_path), expected_df)
+        batches = list(read_file_in_batches(file_path, batch_size=2))
+        assert [batch.height for batch in batches] == [2, 1]
+        assert_frame_equal(pl.concat(batches), expected_df)
+
+    # The extension can be overridden
+    file_path = str(tmp_path / "people.dat")
+    write_dataframe(expected_df, file_path, file_format="parquet")
+    assert_frame_equal(read_file_to_dataframe(file_path, "parquet"), expected_df)
@@ -1,3 +1,5 @@
+from datetime import date
+
 import polars as pl
 from tempfile import NamedTemporaryFile
 from budget_manager.logic import (
@@ -5,7 +7,10 @@ from budget_manager.logic import (
     create_budget_categories_from_file,
     add_single_transaction,
     add_transactions_from_file,
+    add_transactions_from_files,
     generate_report,
+    generate_ledger_reports,
+    search_transactions,
 )
 
 
@@ -22,6 +27,10 @@ def test_create_budget_category(db_conn):
     result = create_budget_category("   ", 100.0, connection=db_conn)
     assert result == "Error: Budget name cannot be empty."
 
+    # Test with an amount too large to store in cents
+    result = create_budget_category("Savings", 1e17, connection=db_conn)
+    assert result == "Error: Amount must be a valid number."
+
     # Test with zero amount
     result = create_budget_category("Utilities", 0, connection=db_conn)
     assert result == "Error: Budget amount must be greater than zero."
@@ -30,6 +39,10 @@ def test_create_budget_category(db_conn):
     result = create_budget_category("Rent", -500.0, connection=db_conn)
     assert result == "Error: Budget amount must be greater than zero."
 
+    # Test with an amount that rounds to zero cents
+    result = create_budget_category("Stamps", 0.004, connection=db_conn)
+    assert result == "Error: Budget amount must be greater than zero."
+
 
 def test_create_budget_categories_from_file(db_conn):
     # Create a temporary CSV file with budget categories
@@ -53,9 +66,18 @@ def test_create_budget_categories_from_file(db_conn):
     rows = cursor.fetchall()
     budget_dict = {row[0]: row[1] for row in rows}
 
-    assert budget_dict["Groceries"] == 300.0
-    assert budget_dict["Transport"] == 100.0
-    assert budget_dict["Entertainment"] == 150.0
+    assert budget_dict["Groceries"] == 30000
+    assert budget_dict["Transport"] == 10000
+    assert budget_dict["Entertainment"] == 15000
+
+    # Amounts are checked after rounding to cents in files too
+    with NamedTemporaryFile(suffix=".csv", delete_on_close=False) as tmp:
+        pl.DataFrame({"name": ["Stamps"], "amount": [0.004]}).write_csv(tmp.name)
+        result = create_budget_categories_from_file(tmp.name, connection=db_conn)
+    assert result == (
+        "Error adding budget category from file: "
+        "Error: Budget amount must be greater than zero."
+    )
 
 
 def test_add_single_transaction(db_conn):
@@ -80,12 +102,28 @@ def test_add_single_transaction(db_conn):
     )
     assert result == "Error: Amount must be a valid number."
 
+    # Test with an amount that cannot be stored in cents
+    result = add_single_transaction(
+        "Groceries", "nan", "2024-01-15", "Weekly groceries", connection=db_conn
+    )
+    assert result == "Error: Amount must be a valid number."
+    result = add_single_transaction(
+        "Groceries", 1e17, "2024-01-15", "Weekly groceries", connection=db_conn
+    )
+    assert result == "Error: Amount must be a valid number."
+
     # Test with empty date
     result = add_single_transaction(
         "Groceries", 50.0, "", "Weekly groceries", connection=db_conn
     )
     assert result == "Error: Date cannot be empty."
 
+    # Test with a date that is not in YYYY-MM-DD format
+    result = add_single_transaction(
+        "Groceries", 50.0, "15/01/2024", "Weekly groceries", connection=db_conn
+    )
+    assert result == "Error: Date must be in YYYY-MM-DD format."
+
     # Test with empty description
     result = add_single_transaction(
         "Groceries", 50.0, "2024-01-15", "", connection=db_conn
@@ -129,14 +167,223 @@ def test_add_transactions_from_file(db_conn):
 
     cursor.execute("SELECT budget_id, amount, date, description FROM transactions;")
     rows = cursor.fetchall()
-    assert rows[0][1] == 75.0
+    assert rows[0][1] == 7500
     assert rows[0][2] == "2024-02-01"
     assert rows[0][3] == "Grocery shopping"
-    assert rows[1][1] == 120.0
+    assert rows[1][1] == 12000
     assert rows[1][2] == "2024-02-02"
     assert rows[1][3] == "Concert tickets"
 
 
+def test_add_transactions_from_file_is_atomic(db_conn):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+
+    # The second row references an unknown budget, so nothing should be imported
+    tmp = NamedTemporaryFile(delete=False, delete_on_close=False)
+    pl.DataFrame(
+        {
+            "budget_name": ["Groceries", "Unknown", "Groceries"],
+            "amount": [75.0, 10.0, 20.0],
+            "date": ["2024-02-01", "2024-02-02", "2024-02-03"],
+            "description": ["Grocery shopping", "Mystery", "Snacks"],
+        }
+    ).write_csv(tmp.name)
+
+    result = add_transactions_from_file(tmp.name, connection=db_conn, chunk_size=1)
+    tmp.close()
+
+    assert result == (
+        "Error adding transactions from file: "
+        "Error: Budget categories do not exist: 'Unknown' (rows 2)."
+    )
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM transactions;")
+    assert cursor.fetchone()[0] == 0, "No transactions should be added."
+
+
+def test_add_transactions_from_file_reports_all_unknown_budgets(db_conn):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+
+    tmp = NamedTemporaryFile(delete=False, delete_on_close=False)
+    pl.DataFrame(
+        {
+            "budget_name": ["Dining Out", "Groceries", "Travel", "Dining Out"],
+            "amount": [24.5, 75.0, 300.0, 12.0],
+            "date": ["2024-02-01", "2024-02-02", "2024-02-03", "2024-02-04"],
+            "description": ["Lunch", "Grocery shopping", "Flights", "Coffee"],
+        }
+    ).write_csv(tmp.name)
+
+    result = add_transactions_from_file(tmp.name, connection=db_conn)
+    tmp.close()
+
+    assert result == (
+        "Error adding transactions from file: "
+        "Error: Budget categories do not exist: "
+        "'Dining Out' (rows 1, 4); 'Travel' (rows 3)."
+    )
+
+
+def test_add_transactions_from_file_in_batches(db_conn):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+
+    # The unknown budget is in the last batch, after earlier batches were written
+    tmp = NamedTemporaryFile(delete=False, delete_on_close=False)
+    pl.DataFrame(
+        {
+            "budget_name": ["Groceries"] * 5 + ["Unknown"],
+            "amount": [10.0] * 6,
+            "date": ["2024-02-01"] * 6,
+            "description": ["Snacks"] * 6,
+        }
+    ).write_csv(tmp.name)
+
+    result = add_transactions_from_file(tmp.name, connection=db_conn, batch_size=2)
+    assert result == (
+        "Error adding transactions from file: "
+        "Error: Budget categories do not exist: 'Unknown' (rows 6)."
+    )
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM transactions;")
+    assert cursor.fetchone()[0] == 0, "Earlier batches should be rolled back."
+
+    # Once the budget exists, every batch is imported
+    create_budget_category("Unknown", 100.0, connection=db_conn)
+    result = add_transactions_from_file(tmp.name, connection=db_conn, batch_size=2)
+    tmp.close()
+    assert result == "All transactions from the file added successfully."
+    cursor.execute("SELECT COUNT(*) FROM transactions;")
+    assert cursor.fetchone()[0] == 6
+
+
+def test_reimporting_a_file_skips_duplicates(db_conn, tmp_path):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+    file_path = str(tmp_path / "export.csv")
+    pl.DataFrame(
+        {
+            "budget_name": ["Groceries"] * 3,
+            "amount": [4.5, 4.5, 20.0],
+            "date": ["2024-02-01", "2024-02-01", "2024-02-03"],
+            "description": ["Coffee", "Coffee", "Market"],
+            "source_id": ["a1", "a2", "a3"],
+        }
+    ).write_csv(file_path)
+
+    result = add_transactions_from_file(file_path, connection=db_conn)
+    assert result == "All transactions from the file added successfully."
+    result = add_transactions_from_file(file_path, connection=db_conn, batch_size=2)
+    assert result == (
+        "All new transactions from the file added successfully, 3 duplicates skipped."
+    )
+
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT source_id FROM transactions ORDER BY id;")
+    assert cursor.fetchall() == [("a1",), ("a2",), ("a3",)]
+
+
+def test_repeated_rows_are_numbered_across_batches(db_conn, tmp_path):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+    add_single_transaction("Groceries", 4.5, "2024-02-01", "Coffee", connection=db_conn)
+    file_path = str(tmp_path / "export.csv")
+    pl.DataFrame(
+        {
+            "budget_name": ["Groceries"] * 6,
+            "amount": [4.5, 20.0, 4.5, 4.5, 20.0, 4.5],
+            "date": ["2024-02-01"] * 6,
+            "description": ["Coffee", "Market", "Coffee"] * 2,
+        }
+    ).write_csv(file_path)
+
+    # The row added on its own counts as the file's first coffee, and repeats in
+    # later batches continue the numbering of earlier batches
+    result = add_transactions_from_file(file_path, connection=db_conn, batch_size=2)
+    assert result == (
+        "All new transactions from the file added successfully, 1 duplicates skipped."
+    )
+    result = add_transactions_from_files(
+        [file_path, file_path], connection=db_conn, batch_size=4
+    )
+    assert result == (
+        "All new transactions from 2 files added successfully, 12 duplicates skipped."
+    )
+
+    cursor = db_conn.cursor()
+    cursor.execute(
+        "SELECT description, group_concat(occurrence) FROM transactions GROUP BY 1 ORDER BY 1;"
+    )
+    assert cursor.fetchall() == [("Coffee", "0,1,2,3"), ("Market", "0,1")]
+
+
+def test_add_transactions_from_files(db_conn, tmp_path):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+    create_budget_category("Entertainment", 150.0, connection=db_conn)
+
+    file_paths = []
+    for i in range(3):
+        file_path = str(tmp_path / f"account_{i}.csv")
+        pl.DataFrame(
+            {
+                "budget_name": ["Groceries", "Entertainment"],
+                "amount": [10.0 * i, 5.0],
+                "date": ["2024-02-01", "2024-02-02"],
+                "description": [f"Shop {i}", f"Film {i}"],
+            }
+        ).write_csv(file_path)
+        file_paths.append(file_path)
+
+    result = add_transactions_from_files(file_paths, connection=db_conn, workers=2)
+    assert result == "All transactions from 3 files added successfully."
+
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT description, amount FROM transactions ORDER BY id;")
+    assert cursor.fetchall() == [
+        ("Shop 0", 0),
+        ("Film 0", 500),
+        ("Shop 1", 1000),
+        ("Film 1", 500),
+        ("Shop 2", 2000),
+        ("Film 2", 500),
+    ]
+
+
+def test_add_transactions_from_files_reports_every_bad_file(db_conn, tmp_path):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+
+    good_file = str(tmp_path / "good.csv")
+    bad_file = str(tmp_path / "bad.csv")
+    missing_file = str(tmp_path / "missing.csv")
+    pl.DataFrame(
+        {
+            "budget_name": ["Groceries"],
+            "amount": [10.0],
+            "date": ["2024-02-01"],
+            "description": ["Shop"],
+        }
+    ).write_csv(good_file)
+    pl.DataFrame(
+        {
+            "budget_name": ["Travel"],
+            "amount": [10.0],
+            "date": ["2024-02-01"],
+            "description": ["Train"],
+        }
+    ).write_csv(bad_file)
+
+    result = add_transactions_from_files(
+        [good_file, bad_file, missing_file], connection=db_conn, workers=2
+    )
+
+    assert result == (
+        "Error adding transactions from files: "
+        f"{bad_file}: Error adding transactions from file: "
+        "Error: Budget categories do not exist: 'Travel' (rows 1).; "
+        f"{missing_file}: The file {missing_file} does not exist."
+    )
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM transactions;")
+    assert cursor.fetchone()[0] == 0, "No transactions should be added."
+
+
 def test_generate_report(db_conn):
     # Insert budget categories and transactions
     create_budget_category("Groceries", 300.0, connection=db_conn)
@@ -164,8 +411,429 @@ def test_generate_report(db_conn):
 
     groceries_row = df.filter(pl.col("budget_name") == "Groceries")
     assert groceries_row["total_spent"][0] == 125.0
-    assert groceries_row["percent_spent"][0] == (125.0 / 300.0 * 100)
+    assert groceries_row["percent_spent"][0] == 41.67
 
     entertainment_row = df.filter(pl.col("budget_name") == "Entertainment")
     assert entertainment_row["total_spent"][0] == 120.0
-    assert entertainment_row["percent_spent"][0] == (120.0 / 150.0 * 100)
+    assert entertainment_row["percent_spent"][0] == 80.0
+
+
+def test_generate_report_with_large_amounts(db_conn, tmp_path):
+    # Percentages of totals this large overflow if computed in 64-bit integers
+    create_budget_category("Treasury", 1e14, connection=db_conn)
+    add_single_transaction(
+        "Treasury", 1e13, "2024-01-15", "Bond purchase", connection=db_conn
+    )
+    report_file = str(tmp_path / "report.csv")
+    generate_report(report_file, connection=db_conn)
+    assert pl.read_csv(report_file)["percent_spent"].to_list() == [10.0]
+    generate_report(report_file, connection=db_conn, period="month")
+    assert pl.read_csv(report_file)["percent_spent"].to_list() == [10.0]
+
+
+def test_generate_report_writes_exact_cents(db_conn, tmp_path):
+    # Polars divides columns of several rows by multiplying by 1 / 100, which gives
+    # 1776779.1600000001 for 177677916 cents unless the result is rounded
+    for name, amount in [("Payroll", 1776779.16), ("Bonus", 1136432.4)]:
+        create_budget_category(name, amount, connection=db_conn)
+        add_single_transaction(name, amount, "2024-01-15", "Paid", connection=db_conn)
+    report_file = tmp_path / "report.csv"
+    generate_report(str(report_file), connection=db_conn)
+    assert report_file.read_text().splitlines()[1:] == [
+        "Payroll,1776779.16,1776779.16,100.0",
+        "Bonus,1136432.4,1136432.4,100.0",
+    ]
+    generate_report(str(report_file), connection=db_conn, period="month")
+    assert report_file.read_text().splitlines()[1:] == [
+        "Payroll,2024-01-01,1776779.16,1776779.16,1776779.16,100.0",
+        "Bonus,2024-01-01,1136432.4,1136432.4,1136432.4,100.0",
+    ]
+
+
+def test_generate_report_with_filters(db_conn):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+    create_budget_category("Entertainment", 150.0, connection=db_conn)
+    add_single_transaction(
+        "Groceries", 50.0, "2024-01-15", "Weekly groceries", connection=db_conn
+    )
+    add_single_transaction(
+        "Groceries", 75.0, "2024-02-01", "Monthly bulk shopping", connection=db_conn
+    )
+    add_single_transaction(
+        "Entertainment", 120.0, "2024-02-20", "Concert tickets", connection=db_conn
+    )
+
+    tmp = NamedTemporaryFile(delete=False, delete_on_close=False)
+    result = generate_report(
+        tmp.name,
+        connection=db_conn,
+        start_date="2024-02-01",
+        end_date="2024-02-29",
+        budget_name="Groceries",
+    )
+    assert result == f"Report written to {tmp.name}."
+
+    df = pl.read_csv(tmp.name)
+    assert df["budget_name"].to_list() == ["Groceries"]
+    assert df["total_spent"][0] == 75.0
+
+    result = generate_report(tmp.name, connection=db_conn, start_date="2024-02")
+    assert result == "Error: Date must be in YYYY-MM-DD format."
+
+    result = generate_report(tmp.name, connection=db_conn, budget_name="Travel")
+    tmp.close()
+    assert result == "Error: Budget category 'Travel' does not exist."
+
+
+def test_generate_period_report(db_conn, tmp_path):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+    create_budget_category("Entertainment", 150.0, connection=db_conn)
+    for amount, day in [
+        (50.0, "2024-01-15"),
+        (75.0, "2024-01-22"),
+        (100.0, "2024-02-01"),
+    ]:
+        add_single_transaction(
+            "Groceries", amount, day, "Groceries", connection=db_conn
+        )
+
+    report_file = str(tmp_path / "report.csv")
+    result = generate_report(report_file, connection=db_conn, period="month")
+    assert result == f"Report written to {report_file}."
+
+    df = pl.read_csv(report_file, try_parse_dates=True)
+    assert df.columns == [
+        "budget_name",
+        "period",
+        "budget_amount",
+        "total_spent",
+        "cumulative_spent",
+        "percent_spent",
+    ]
+    assert df.rows() == [
+        ("Groceries", date(2024, 1, 1), 300.0, 125.0, 125.0, 41.67),
+        ("Groceries", date(2024, 2, 1), 300.0, 100.0, 225.0, 75.0),
+    ]
+
+    result = generate_report(report_file, connection=db_conn, period="year")
+    assert result == "Error: Period must be one of: month, week."
+
+    result = generate_report(
+        report_file, connection=db_conn, period="week", budget_name="Travel"
+    )
+    assert result == "Error: Budget category 'Travel' does not exist."
+
+
+def test_logic_functions_share_a_connection(tmp_path, monkeypatch):
+    from budget_manager.database import close_shared_connections
+
+    # Without an explicit connection every call reuses the same configured database
+    monkeypatch.setenv("BUDGET_MANAGER_DB", str(tmp_path / "budgets.db"))
+    try:
+        assert "added successfully" in create_budget_category("Groceries", 300.0)
+        assert "added successfully" in add_single_transaction(
+            "Groceries", 50.0, "2024-01-15", "Weekly groceries"
+        )
+        report_file = str(tmp_path / "report.csv")
+        assert generate_report(report_file) == f"Report written to {report_file}."
+    finally:
+        close_shared_connections()
+    df = pl.read_csv(report_file)
+    assert df["total_spent"].to_list() == [50.0]
+
+
+def test_parquet_import_and_report(db_conn, tmp_path):
+
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+
+    # Parquet keeps column types, so dates arrive as dates rather than text
+    transactions_file = str(tmp_path / "transactions.parquet")
+    pl.DataFrame(
+        {
+            "budget_name": ["Groceries", "Groceries"],
+            "amount": [50.0, 25.5],
+            "date": [date(2024, 1, 15), date(2024, 1, 22)],
+            "description": ["Weekly groceries", "Top-up shop"],
+        }
+    ).write_parquet(transactions_file)
+
+    result = add_transactions_from_file(transactions_file, connection=db_conn)
+    assert result == "All transactions from the file added successfully."
+
+    report_file = str(tmp_path / "report.arrow")
+    generate_report(report_file, connection=db_conn)
+
+    df = pl.read_ipc(report_file)
+    assert df.row(0) == ("Groceries", 300.0, 75.5, 25.17)
+
+
+def test_add_transactions_from_file_reports_every_invalid_row(db_conn, tmp_path):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+    file_path = tmp_path / "export.csv"
+    file_path.write_text(
+        "budget_name,amount,date,description\n"
+        "Groceries,10.0,2024-02-01,Milk\n"
+        " ,5.0,2024-02-01,No budget\n"
+        "Groceries,ten,2024-02-02,Bread\n"
+        "Travel,300.0,2024-02-03,Flights\n"
+        "Groceries,nan,2024-02-04,Eggs\n"
+        "Groceries,4.0,2024-02-30,Cheese\n"
+        "Groceries,4.0,,Butter\n"
+        "Groceries,4.0,2024-02-05,\n"
+    )
+    rejects_file = str(tmp_path / "rejects.csv")
+
+    result = add_transactions_from_file(
+        str(file_path), connection=db_conn, batch_size=3, rejects_file=rejects_file
+    )
+
+    assert result == (
+        "Error adding transactions from file: "
+        "Error: Budget categories do not exist: 'Travel' (rows 4). "
+        "Error: Invalid transactions: Budget name cannot be empty (rows 2); "
+        "Amount must be a valid number (rows 3, 5); "
+        "Date must be in YYYY-MM-DD format (rows 6); Date cannot be empty (rows 7); "
+        "Description cannot be empty (rows 8). "
+        f"Rejected rows written to {rejects_file}."
+    )
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM transactions;")
+    assert cursor.fetchone()[0] == 0, "No transactions should be added."
+
+    rejects = pl.read_csv(rejects_file, infer_schema=False)
+    assert rejects.columns == [
+        "row_number",
+        "reason",
+        "budget_name",
+        "amount",
+        "date",
+        "description",
+    ]
+    assert rejects["row_number"].to_list() == [str(n) for n in range(2, 9)]
+    assert rejects.row(1) == (
+        "3",
+        "Amount must be a valid number.",
+        "Groceries",
+        "ten",
+        "2024-02-02",
+        "Bread",
+    )
+
+
+def test_add_transactions_from_file_rejects_amounts_too_large_to_store(
+    db_conn, tmp_path
+):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+    file_path = tmp_path / "export.csv"
+    file_path.write_text(
+        "budget_name,amount,date,description\n"
+        "Groceries,10.0,2024-02-01,Milk\n"
+        "Groceries,1e20,2024-02-02,Bread\n"
+        "Groceries,-1e17,2024-02-03,Eggs\n"
+    )
+
+    result = add_transactions_from_file(
+        str(file_path), connection=db_conn, skip_invalid=True
+    )
+    assert result == (
+        "All valid transactions from the file added successfully, "
+        "2 invalid rows skipped."
+    )
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT description, amount FROM transactions;")
+    assert cursor.fetchall() == [("Milk", 1000)]
+
+    result = add_transactions_from_file(str(file_path), connection=db_conn)
+    assert "Amount must be a valid number (rows 2, 3)" in result
+
+
+def test_add_transactions_from_files_skipping_invalid_rows(db_conn, tmp_path):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+    file_paths = []
+    for i, bad_amount in enumerate(["x", '"12,50"']):
+        file_path = tmp_path / f"account_{i}.csv"
+        file_path.write_text(
+            "budget_name,amount,date,description\n"
+            f"Groceries,1{i}.5,2024-02-01,Shop {i}\n"
+            f"Groceries,{bad_amount},2024-02-02,Bad {i}\n"
+            f"Unknown,3.0,2024-02-03,Mystery {i}\n"
+        )
+        file_paths.append(str(file_path))
+    rejects_file = str(tmp_path / "rejects.parquet")
+
+    result = add_transactions_from_file(
+        file_paths[0], connection=db_conn, batch_size=1, skip_invalid=True
+    )
+    assert result == (
+        "All valid transactions from the file added successfully, "
+        "2 invalid rows skipped."
+    )
+
+    result = add_transactions_from_files(
+        file_paths,
+        connection=db_conn,
+        workers=2,
+        skip_invalid=True,
+        rejects_file=rejects_file,
+    )
+    assert result == (
+        "All valid transactions from 2 files added successfully, "
+        "4 invalid rows and 1 duplicates skipped. "
+        f"Rejected rows written to {rejects_file}."
+    )
+
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT description, amount FROM transactions ORDER BY id;")
+    assert cursor.fetchall() == [("Shop 0", 1050), ("Shop 1", 1150)]
+    rejects = pl.read_parquet(rejects_file)
+    assert rejects.select("file", "row_number", "amount").rows() == [
+        (file_paths[0], 2, "x"),
+        (file_paths[0], 3, "3.0"),
+        (file_paths[1], 2, "12,50"),
+        (file_paths[1], 3, "3.0"),
+    ]
+
+
+def test_generate_report_is_cached_until_the_data_changes(tmp_path):
+    from budget_manager.database import get_report_cache_dir, initialise_database
+    from budget_manager.logic import _report_cache
+    from budget_manager.metrics import collect_metrics
+
+    conn = initialise_database(db_path=str(tmp_path / "ledger.db"))
+    cache_dir = get_report_cache_dir(conn)
+    assert cache_dir == str(tmp_path / "ledger.report-cache")
+    create_budget_category("Groceries", 300.0, connection=conn)
+    add_single_transaction("Groceries", 50.0, "2024-01-15", "Shop", connection=conn)
+    output_file = str(tmp_path / "report.csv")
+
+    def report_hits(**options):
+        with collect_metrics() as metrics:
+            result = generate_report(
+                output_file, connection=conn, cache_dir=cache_dir, **options
+            )
+        assert result == f"Report written to {output_file}."
+        return metrics.counters["report_cache_hits"]
+
+    assert report_hits() == 0
+    assert report_hits() == 1
+    assert report_hits(period="month") == 0, "Each set of parameters is cached"
+
+    # Any write invalidates the cache
+    add_single_transaction("Groceries", 25.0, "2024-01-16", "Shop", connection=conn)
+    assert report_hits() == 0
+    assert pl.read_csv(output_file)["total_spent"].to_list() == [75.0]
+
+    # Other processes, with empty caches of their own, read the report from disk, where
+    # only the latest version of each report is kept
+    _report_cache.clear()
+    assert report_hits() == 1
+    assert pl.read_csv(output_file)["total_spent"].to_list() == [75.0]
+    assert len(list((tmp_path / "ledger.report-cache").iterdir())) == 2
+    conn.close()
+
+
+def test_generate_report_cache_tells_apart_copied_databases(tmp_path):
+    import shutil
+
+    from budget_manager.database import initialise_database
+
+    conn = initialise_database(db_path=str(tmp_path / "a.db"))
+    create_budget_category("Groceries", 300.0, connection=conn)
+    conn.close()
+    # The copy has the same database id and version as the original
+    shutil.copy(tmp_path / "a.db", tmp_path / "b.db")
+
+    output_file = str(tmp_path / "report.csv")
+    for name, amount in [("a", 50.0), ("b", 20.0)]:
+        conn = initialise_database(db_path=str(tmp_path / f"{name}.db"))
+        add_single_transaction(
+            "Groceries", amount, "2024-01-15", "Shop", connection=conn
+        )
+        generate_report(output_file, connection=conn)
+        assert pl.read_csv(output_file)["total_spent"].to_list() == [amount], name
+        conn.close()
+
+
+def test_generate_ledger_reports(tmp_path):
+    from budget_manager.database import find_ledgers, initialise_database
+
+    ledgers_dir = tmp_path / "ledgers"
+    ledgers_dir.mkdir()
+    for household, amount in [("alice", 50.0), ("bob", 20.0)]:
+        conn = initialise_database(db_path=str(ledgers_dir / f"{household}.db"))
+        create_budget_category("Groceries", 300.0, connection=conn)
+        add_single_transaction(
+            "Groceries", amount, "2024-01-15", "Shop", connection=conn
+        )
+        conn.close()
+    # A corrupt ledger does not stop the others from being reported
+    (ledgers_dir / "carol.db").write_text("not a database")
+    db_paths = find_ledgers([str(ledgers_dir)])
+
+    progress = []
+    output_file = str(tmp_path / "combined.csv")
+    result = generate_ledger_reports(
+        db_paths,
+        output_file,
+        workers=2,
+        progress=lambda done, total, db_path, error: progress.append((done, total)),
+    )
+    assert result.startswith(
+        f"Reports for 2 of 3 ledgers written to {output_file}. "
+        f"Failed ledgers: {ledgers_dir / 'carol.db'}: "
+    )
+    assert sorted(progress) == [(1, 3), (2, 3), (3, 3)]
+    assert pl.read_csv(output_file).rows() == [
+        ("alice", "Groceries", 300.0, 50.0, 16.67),
+        ("bob", "Groceries", 300.0, 20.0, 6.67),
+    ]
+
+    output_dir = tmp_path / "reports"
+    result = generate_ledger_reports(
+        db_paths[:2], str(output_dir), per_ledger=True, workers=2, period="month"
+    )
+    assert result == f"Reports for 2 of 2 ledgers written to {output_dir}."
+    assert sorted(p.name for p in output_dir.iterdir()) == ["alice.csv", "bob.csv"]
+    assert pl.read_csv(output_dir / "bob.csv")["total_spent"].to_list() == [20.0]
+
+    result = generate_ledger_reports(
+        [str(tmp_path / "missing.db")], output_file, budget_name="Travel"
+    )
+    assert result == (
+        f"Error: No ledgers could be reported on: {tmp_path / 'missing.db'}: "
+        "Database file not found."
+    )
+    result = generate_ledger_reports(db_paths, output_file, period="year")
+    assert result == "Error: Period must be one of: month, week."
+
+
+def test_search_transactions(db_conn):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+    for amount, day, description in [
+        (50.0, "2024-01-15", "Whole Foods Market"),
+        (12.5, "2024-01-22", "WHOLE FOODS #1234"),
+        (7.0, "2024-02-01", "Bakery"),
+    ]:
+        add_single_transaction(
+            "Groceries", amount, day, description, connection=db_conn
+        )
+
+    result = search_transactions('"whole foods"', connection=db_conn, limit=1)
+    assert result == (
+        "Found 2 transactions totalling 62.50, the 1 most recent are:\n"
+        "2024-01-22  Groceries  12.50  WHOLE FOODS #1234"
+    )
+    result = search_transactions("bak*", connection=db_conn)
+    assert result == (
+        "Found 1 transactions totalling 7.00:\n2024-02-01  Groceries  7.00  Bakery"
+    )
+    result = search_transactions("whole", connection=db_conn, end_date="2024-01-01")
+    assert result == "No transactions match 'whole'."
+
+    assert search_transactions(" ", connection=db_conn) == (
+        "Error: Search query cannot be empty."
+    )
+    result = search_transactions('"whole', connection=db_conn)
+    assert result == "Error: Invalid search query: unterminated string."
+    result = search_transactions("whole", connection=db_conn, budget_name="Travel")
+    assert result == "Error: Budget category 'Travel' does not exist."
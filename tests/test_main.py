@@ -1,4 +1,5 @@
 from budget_manager.main import run
+from budget_manager.logic import add_single_transaction
 import polars as pl
 from tempfile import NamedTemporaryFile
 
@@ -8,6 +9,8 @@ def test_cli_add_budget_category(db_conn):
         "--add-budget",
         "Health",
         "250.0",
+        "--profile",
+        "bulk-import",
     ]
     run(args=args, connection=db_conn)
 
@@ -17,7 +20,7 @@ def test_cli_add_budget_category(db_conn):
     row = cursor.fetchone()
     assert row is not None, "Budget category 'Health' should be found in the database"
     assert row[0] == "Health", "Budget name should match"
-    assert row[1] == 250.0, "Budget amount should match"
+    assert row[1] == 25000, "Budget amount should be stored in cents"
 
 
 def test_cli_add_budget_categories_from_file(db_conn):
@@ -43,19 +46,19 @@ def test_cli_add_budget_categories_from_file(db_conn):
     rows = cursor.fetchall()
     budget_dict = {row[0]: row[1] for row in rows}
 
-    assert budget_dict["Fitness"] == 400.0
-    assert budget_dict["Travel"] == 800.0
-    assert budget_dict["Education"] == 600.0
+    assert budget_dict["Fitness"] == 40000
+    assert budget_dict["Travel"] == 80000
+    assert budget_dict["Education"] == 60000
 
 
 def test_cli_add_transactions_from_file(db_conn):
     # First, create a budget category to associate transactions with
     cursor = db_conn.cursor()
     cursor.execute(
-        "INSERT INTO budgets (name, amount) VALUES (?, ?);", ("Misc", 1000.0)
+        "INSERT INTO budgets (name, amount) VALUES (?, ?);", ("Misc", 100000)
     )
     cursor.execute(
-        "INSERT INTO budgets (name, amount) VALUES (?, ?);", ("Rent", 3000.0)
+        "INSERT INTO budgets (name, amount) VALUES (?, ?);", ("Rent", 300000)
     )
     db_conn.commit()
 
@@ -73,6 +76,8 @@ def test_cli_add_transactions_from_file(db_conn):
     args = [
         "--add-transactions",
         tmp.name,
+        "--batch-size",
+        "2",
     ]
     run(args=args, connection=db_conn)
     tmp.close()
@@ -86,9 +91,9 @@ def test_cli_add_transactions_from_file(db_conn):
     rows = cursor.fetchall()
     transactions = [(row[0], row[1], row[2], row[3]) for row in rows]
     expected_transactions = [
-        ("Misc", 50.0, "2025-02-01", "Gadget purchase"),
-        ("Misc", 75.0, "2025-02-02", "Gift"),
-        ("Rent", 1200.0, "2025-02-03", "February rent"),
+        ("Misc", 5000, "2025-02-01", "Gadget purchase"),
+        ("Misc", 7500, "2025-02-02", "Gift"),
+        ("Rent", 120000, "2025-02-03", "February rent"),
     ]
     assert len(transactions) == len(expected_transactions), (
         "Number of transactions should match"
@@ -163,8 +168,243 @@ def test_cli_generate_report(db_conn):
     travel_row = df.filter(pl.col("budget_name") == "Travel")
     assert travel_row["budget_amount"][0] == 800.0
     assert travel_row["total_spent"][0] == 225.0
-    assert travel_row["percent_spent"][0] == 28.125
+    # Percentages are rounded half up to two decimal places
+    assert travel_row["percent_spent"][0] == 28.13
     education_row = df.filter(pl.col("budget_name") == "Education")
     assert education_row["budget_amount"][0] == 600.0
     assert education_row["total_spent"][0] == 1200.0
     assert education_row["percent_spent"][0] == 200.0
+
+
+def test_cli_generate_filtered_report(db_conn):
+    cursor = db_conn.cursor()
+    cursor.executemany(
+        "INSERT INTO budgets (name, amount) VALUES (?, ?);",
+        [("Fitness", 40000), ("Travel", 80000)],
+    )
+    db_conn.commit()
+
+    tmp_transactions = NamedTemporaryFile(delete=False, delete_on_close=False)
+    pl.DataFrame(
+        {
+            "budget_name": ["Fitness", "Travel", "Fitness", "Travel"],
+            "amount": [50.0, 75.0, 200.0, 150.0],
+            "date": ["2025-01-31", "2025-02-02", "2025-02-10", "2025-03-01"],
+            "description": ["Gym", "Train", "Personal training", "Flights"],
+        }
+    ).write_csv(tmp_transactions.name)
+    tmp_report = NamedTemporaryFile(delete=False, delete_on_close=False)
+
+    args = [
+        "--add-transactions",
+        tmp_transactions.name,
+        "--report",
+        tmp_report.name,
+        "--from",
+        "2025-02-01",
+        "--to",
+        "2025-02-28",
+        "--budget",
+        "Fitness",
+    ]
+    run(args=args, connection=db_conn)
+    tmp_transactions.close()
+
+    df = pl.read_csv(tmp_report.name)
+    tmp_report.close()
+
+    assert df["budget_name"].to_list() == ["Fitness"]
+    assert df["total_spent"][0] == 200.0
+    assert df["percent_spent"][0] == 50.0
+
+
+def test_cli_generate_period_report(db_conn, tmp_path):
+    cursor = db_conn.cursor()
+    cursor.execute(
+        "INSERT INTO budgets (name, amount) VALUES (?, ?);", ("Fitness", 40000)
+    )
+    db_conn.commit()
+
+    transactions_file = str(tmp_path / "transactions.csv")
+    pl.DataFrame(
+        {
+            "budget_name": ["Fitness", "Fitness", "Fitness"],
+            "amount": [50.0, 200.0, 100.0],
+            "date": ["2025-02-03", "2025-02-09", "2025-02-10"],
+            "description": ["Gym", "Personal training", "Shoes"],
+        }
+    ).write_csv(transactions_file)
+    report_file = str(tmp_path / "report.csv")
+
+    args = ["--add-transactions", transactions_file, "--report", report_file]
+    run(args=args + ["--period", "week"], connection=db_conn)
+
+    df = pl.read_csv(report_file)
+    assert df["period"].to_list() == ["2025-02-03", "2025-02-10"]
+    assert df["cumulative_spent"].to_list() == [250.0, 350.0]
+    assert df["percent_spent"].to_list() == [62.5, 87.5]
+
+
+def test_cli_check_and_rebuild_totals(db_conn, capsys):
+    cursor = db_conn.cursor()
+    cursor.execute("INSERT INTO budgets (name, amount) VALUES (?, ?);", ("Rent", 100))
+    cursor.execute(
+        "INSERT INTO transactions (budget_id, amount, date) VALUES (1, 500, '2025-01-01');"
+    )
+    cursor.execute("DELETE FROM budget_totals;")
+    db_conn.commit()
+
+    run(args=["--check-totals"], connection=db_conn)
+    assert "Error: Budget totals are inconsistent" in capsys.readouterr().out
+
+    run(args=["--rebuild-totals", "--check-totals"], connection=db_conn)
+    output = capsys.readouterr().out
+    assert "Budget totals rebuilt successfully." in output
+    assert "Budget totals are consistent with the transactions." in output
+
+
+def test_cli_archive(tmp_path, db_conn, capsys):
+    db_path = str(tmp_path / "ledger.db")
+    run(args=["--db", db_path, "--add-budget", "Rent", "1000"])
+    pl.DataFrame(
+        {
+            "budget_name": ["Rent", "Rent"],
+            "amount": [900.0, 950.0],
+            "date": ["2019-05-01", "2020-05-01"],
+            "description": ["May", "May"],
+        }
+    ).write_csv(tmp_path / "rent.csv")
+    run(args=["--db", db_path, "--add-transactions", str(tmp_path / "rent.csv")])
+
+    run(args=["--db", db_path, "--archive", "--report", str(tmp_path / "report.csv")])
+    output = capsys.readouterr().out
+    assert "Archived 2 transactions from before " in output
+    assert pl.read_csv(tmp_path / "report.csv")["total_spent"].to_list() == [1850.0]
+
+    # Archiving needs a database file
+    run(args=["--archive", "2020"], connection=db_conn)
+    assert "Error: Archiving requires a database file." in capsys.readouterr().out
+
+
+def test_cli_add_transactions_from_glob(db_conn, tmp_path):
+    cursor = db_conn.cursor()
+    cursor.execute("INSERT INTO budgets (name, amount) VALUES (?, ?);", ("Misc", 100))
+    db_conn.commit()
+
+    for i in range(3):
+        pl.DataFrame(
+            {
+                "budget_name": ["Misc"],
+                "amount": [float(i)],
+                "date": ["2025-02-01"],
+                "description": [f"Item {i}"],
+            }
+        ).write_csv(tmp_path / f"account_{i}.csv")
+
+    args = ["--add-transactions", str(tmp_path / "account_*.csv"), "--workers", "2"]
+    run(args=args, connection=db_conn)
+
+    cursor.execute("SELECT description FROM transactions ORDER BY id;")
+    assert [row[0] for row in cursor.fetchall()] == ["Item 0", "Item 1", "Item 2"]
+
+
+def test_cli_uses_db_path(tmp_path):
+    import sqlite3
+
+    db_path = tmp_path / "ledger.db"
+    run(args=["--db", str(db_path), "--add-budget", "Health", "250.0"])
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT name, amount FROM budgets;").fetchall() == [
+        ("Health", 25000)
+    ]
+    conn.close()
+
+
+def test_cli_timings_and_cprofile(db_conn, tmp_path, capsys):
+    import pstats
+
+    profile_file = str(tmp_path / "run.prof")
+    args = [
+        "--add-budget",
+        "Health",
+        "250.0",
+        "--timings",
+        "--count-statements",
+        "--cprofile",
+        profile_file,
+    ]
+    run(args=args, connection=db_conn)
+
+    output = capsys.readouterr().out
+    assert "Phase timings:" in output
+    assert "budgets_inserted" in output
+    assert "commits" in output
+    assert f"Profile written to {profile_file}" in output
+    assert pstats.Stats(profile_file).total_calls > 0
+
+
+def test_cli_add_budget_does_not_load_polars(tmp_path):
+    import subprocess
+    import sys
+
+    # Single-row commands must not pay for importing polars
+    code = (
+        "import sys; from budget_manager.main import run; "
+        f"run(['--db', {str(tmp_path / 'ledger.db')!r}, '--add-budget', 'Health', '250']); "
+        "assert 'polars.dataframe' not in sys.modules, 'polars was loaded'"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+
+
+def test_cli_snapshot(db_conn, tmp_path, capsys):
+    run(args=["--add-budget", "Rent", "1000"], connection=db_conn)
+    run(
+        args=["--add-budget", "Food", "200", "--snapshot", str(tmp_path / "snapshot")],
+        connection=db_conn,
+    )
+    assert "Snapshot written to" in capsys.readouterr().out
+
+    run(
+        args=[
+            "--report",
+            str(tmp_path / "report.csv"),
+            "--from-snapshot",
+            str(tmp_path / "snapshot"),
+        ],
+        connection=db_conn,
+    )
+    assert "Report written to" in capsys.readouterr().out
+    assert pl.read_csv(tmp_path / "report.csv")["budget_name"].to_list() == [
+        "Rent",
+        "Food",
+    ]
+
+
+def test_cli_ledger_reports(tmp_path, capsys, monkeypatch):
+    for household in ["alice", "bob"]:
+        db_path = str(tmp_path / f"{household}.db")
+        run(args=["--db", db_path, "--add-budget", "Rent", "1000"])
+    capsys.readouterr()
+
+    # The default database is not opened, or created, for a report on other ledgers
+    default_db = tmp_path / "default.sqlite"
+    monkeypatch.setenv("BUDGET_MANAGER_DB", str(default_db))
+    report_file = str(tmp_path / "report.csv")
+    run(args=["--ledgers", str(tmp_path), "--report", report_file, "--workers", "1"])
+    assert not default_db.exists()
+    output = capsys.readouterr().out
+    assert "Generating reports for 2 ledgers to:" in output
+    assert "[2/2] " in output
+    assert pl.read_csv(report_file)["ledger"].to_list() == ["alice", "bob"]
+
+
+def test_cli_search(db_conn, capsys):
+    run(args=["--add-budget", "Food", "200"], connection=db_conn)
+    add_single_transaction("Food", 9.5, "2024-03-01", "Coffee shop", connection=db_conn)
+    capsys.readouterr()
+
+    run(args=["--search", "coffee", "--budget", "Food"], connection=db_conn)
+    output = capsys.readouterr().out
+    assert "Found 1 transactions totalling 9.50:" in output
+    assert "2024-03-01  Food  9.50  Coffee shop" in output
@@ -0,0 +1,54 @@
+from tempfile import NamedTemporaryFile
+
+import polars as pl
+
+from budget_manager.logic import add_transactions_from_file, create_budget_category
+from budget_manager.metrics import collect_metrics, count, phase
+
+
+def test_metrics_are_only_collected_inside_collect_metrics():
+    # Outside collect_metrics the hooks do nothing
+    with phase("parse"):
+        count("rows_parsed", 10)
+
+    with collect_metrics() as metrics:
+        with phase("parse"):
+            count("rows_parsed", 2)
+        count("rows_parsed", 3)
+
+    assert metrics.counters == {"rows_parsed": 5}
+    assert metrics.timings["parse"] > 0
+    assert "rows_parsed" in metrics.format()
+
+
+def test_collect_metrics_from_import(db_conn):
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+
+    tmp = NamedTemporaryFile(delete=False, delete_on_close=False)
+    pl.DataFrame(
+        {
+            "budget_name": ["Groceries"] * 5,
+            "amount": [10.0] * 5,
+            "date": ["2024-02-01"] * 5,
+            "description": ["Snacks"] * 5,
+        }
+    ).write_csv(tmp.name)
+
+    with collect_metrics(db_conn) as metrics:
+        add_transactions_from_file(
+            tmp.name, connection=db_conn, batch_size=2, chunk_size=3
+        )
+    tmp.close()
+
+    assert metrics.counters["rows_parsed"] == 5
+    assert metrics.counters["rows_inserted"] == 5
+    assert metrics.counters["commits"] == 1
+    assert metrics.counters["statement_executions"] >= 6
+    assert set(metrics.timings) >= {
+        "read",
+        "resolve_budgets",
+        "validate",
+        "hash",
+        "insert",
+        "commit",
+    }
@@ -0,0 +1,157 @@
+import sqlite3
+import threading
+import time
+from contextlib import suppress
+
+import polars as pl
+import pytest
+from budget_manager.database import close_shared_connections
+from budget_manager.server import BudgetServer, send_request, serve
+
+
+@pytest.fixture(params=[None, 20.0], ids=["commit-each", "group-commit"])
+def socket_path(request, tmp_path, monkeypatch):
+    # Run the server in a thread with its own shared connection to a temporary database
+    monkeypatch.setenv("BUDGET_MANAGER_DB", str(tmp_path / "server.db"))
+    path = str(tmp_path / "server.sock")
+
+    def run():
+        try:
+            serve(path, group_commit_ms=request.param)
+        finally:
+            close_shared_connections()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    # The socket file appears when it is bound, just before the server listens on it
+    deadline = time.monotonic() + 10
+    while True:
+        with suppress(ConnectionRefusedError, FileNotFoundError):
+            if send_request(path, {"op": "ping"})["ok"]:
+                break
+        assert time.monotonic() < deadline, "Server did not start"
+        time.sleep(0.01)
+    yield path
+    # A test may already have shut the server down, and its socket file is only
+    # removed once it has stopped
+    with suppress(ConnectionRefusedError, FileNotFoundError):
+        send_request(path, {"op": "shutdown"})
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+
+
+def test_server_operations(socket_path, tmp_path):
+    assert send_request(socket_path, {"op": "ping"}) == {"ok": True, "result": "pong"}
+
+    response = send_request(
+        socket_path, {"op": "add_budget", "name": "Groceries", "amount": 300}
+    )
+    assert response["ok"], response
+
+    # The budget added above is found in the server's cache
+    response = send_request(
+        socket_path,
+        {
+            "op": "add_transaction",
+            "budget": "Groceries",
+            "amount": 12.5,
+            "date": "2025-01-31",
+            "description": "Milk",
+        },
+    )
+    assert response["ok"], response
+
+    transactions_file = str(tmp_path / "transactions.csv")
+    pl.DataFrame(
+        {
+            "budget_name": ["Groceries"],
+            "amount": [37.5],
+            "date": ["2025-02-01"],
+            "description": ["Market"],
+        }
+    ).write_csv(transactions_file)
+    response = send_request(socket_path, {"op": "import", "files": [transactions_file]})
+    assert response == {
+        "ok": True,
+        "result": "All transactions from the file added successfully.",
+    }
+
+    report_file = str(tmp_path / "report.csv")
+    response = send_request(socket_path, {"op": "report", "output": report_file})
+    assert response["ok"], response
+    assert pl.read_csv(report_file).row(0) == ("Groceries", 300.0, 50.0, 16.67)
+
+    response = send_request(socket_path, {"op": "shutdown"})
+    assert response == {"ok": True, "result": "Server shutting down."}
+
+
+def test_server_group_commit(socket_path, tmp_path):
+    send_request(socket_path, {"op": "add_budget", "name": "Groceries", "amount": 300})
+    for i in range(5):
+        request = {
+            "op": "add_transaction",
+            "budget": "Groceries",
+            "amount": 1,
+            "date": "2025-01-31",
+            "description": f"Item {i}",
+        }
+        assert send_request(socket_path, request)["ok"]
+
+    # Queued rows are committed by the timer even when no more requests arrive
+    connection = sqlite3.connect(tmp_path / "server.db")
+    deadline = time.monotonic() + 10
+    while connection.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] < 5:
+        assert time.monotonic() < deadline, "Transactions were not committed"
+        time.sleep(0.01)
+    connection.close()
+
+
+def test_server_rejects_bad_requests(db_conn):
+    server = BudgetServer(db_conn)
+    assert server.respond(b"not json")["ok"] is False
+    assert server.respond(b'{"op": "add_budget", "name": "Rent"}') == {
+        "ok": False,
+        "result": "Error: Missing field 'amount'.",
+    }
+    assert server.respond(b'{"op": "import", "files": "export.csv"}') == {
+        "ok": False,
+        "result": "Error: Invalid request: files must be a list of file paths.",
+    }
+    assert server.respond(b'{"op": "import", "files": ["a.csv", 1]}')["ok"] is False
+    assert server.respond(b'{"op": "delete"}') == {
+        "ok": False,
+        "result": "Error: Unknown operation 'delete'.",
+    }
+    response = server.respond(
+        b'{"op": "add_transaction", "budget": "Rent", "amount": 1, '
+        b'"date": "2025-01-01", "description": "x"}'
+    )
+    assert response == {
+        "ok": False,
+        "result": "Error: Budget category 'Rent' does not exist.",
+    }
+
+
+def test_server_reports_failed_requests(db_conn, tmp_path):
+    server = BudgetServer(db_conn)
+    server.respond(b'{"op": "add_budget", "name": "Rent", "amount": 1000}')
+
+    # Errors raised while handling a request are returned instead of closing the
+    # connection
+    missing_file = str(tmp_path / "missing.csv")
+    response = server.respond(
+        f'{{"op": "import", "files": ["{missing_file}"]}}'.encode()
+    )
+    assert response["ok"] is False
+    assert response["result"].startswith("Error: FileNotFoundError:")
+    report_file = str(tmp_path / "missing" / "report.csv")
+    response = server.respond(f'{{"op": "report", "output": "{report_file}"}}'.encode())
+    assert response["ok"] is False
+    assert response["result"].startswith("Error: ")
+    response = server.respond(
+        b'{"op": "add_transaction", "budget": "Rent", "amount": 1, '
+        b'"date": null, "description": "x"}'
+    )
+    assert response["ok"] is False
+    assert response["result"].startswith("Error: ")
+    assert server.respond(b'{"op": "ping"}') == {"ok": True, "result": "pong"}
@@ -0,0 +1,95 @@
+import polars as pl
+import pytest
+
+from budget_manager.database import archive_transactions, initialise_database
+from budget_manager.logic import (
+    add_single_transaction,
+    create_budget_category,
+    create_snapshot,
+    generate_report,
+)
+from budget_manager.snapshot import Snapshot
+
+
+def _parts(snapshot_dir):
+    return sorted(p.name for p in snapshot_dir.iterdir() if p.name.startswith("trans"))
+
+
+def test_snapshot_appends_new_transactions(tmp_path):
+    conn = initialise_database(db_path=str(tmp_path / "ledger.db"))
+    snapshot_dir = tmp_path / "snapshot"
+    create_budget_category("Groceries", 300.0, connection=conn)
+    add_single_transaction("Groceries", 50.0, "2023-01-15", "Shop", connection=conn)
+    add_single_transaction("Groceries", 25.0, "2024-01-15", "Shop", connection=conn)
+
+    result = create_snapshot(str(snapshot_dir), connection=conn)
+    assert result == f"Snapshot written to {snapshot_dir} with 2 transactions."
+    result = create_snapshot(str(snapshot_dir), connection=conn)
+    assert result == f"Snapshot in {snapshot_dir} updated with 0 new transactions."
+
+    # Only the new transaction is written, to a new part file
+    add_single_transaction("Groceries", 10.0, "2024-02-01", "Shop", connection=conn)
+    result = create_snapshot(str(snapshot_dir), connection=conn)
+    assert result == f"Snapshot in {snapshot_dir} updated with 1 new transactions."
+    assert len(_parts(snapshot_dir)) == 2
+    transactions = Snapshot(str(snapshot_dir)).transactions.collect()
+    assert transactions["amount"].to_list() == [5000, 2500, 1000]
+    assert transactions.schema["date"] == pl.Date
+
+    # Archived transactions stay in the snapshot
+    assert archive_transactions(conn, 2024) == 1
+    result = create_snapshot(str(snapshot_dir), connection=conn)
+    assert result == f"Snapshot in {snapshot_dir} updated with 0 new transactions."
+
+    # A new format, or a full update, rewrites the snapshot and removes the old parts
+    result = create_snapshot(str(snapshot_dir), connection=conn, file_format="parquet")
+    assert result == f"Snapshot written to {snapshot_dir} with 3 transactions."
+    assert all(part.endswith(".parquet") for part in _parts(snapshot_dir))
+    assert Snapshot(str(snapshot_dir)).transactions.collect().height == 3
+
+    result = create_snapshot(str(snapshot_dir), connection=conn, file_format="csv")
+    assert result == "Error: Snapshot format must be one of: ipc, parquet."
+    with pytest.raises(FileNotFoundError):
+        Snapshot(str(tmp_path / "missing"))
+    conn.close()
+
+
+def test_reports_from_a_snapshot_match_the_database(db_conn, tmp_path):
+    snapshot_dir = str(tmp_path / "snapshot")
+    create_budget_category("Groceries", 300.0, connection=db_conn)
+    create_budget_category("Entertainment", 150.0, connection=db_conn)
+    create_budget_category("Travel", 500.0, connection=db_conn)
+    for budget, amount, day in [
+        ("Groceries", 50.0, "2024-01-15"),
+        ("Groceries", 75.0, "2024-01-22"),
+        ("Groceries", 100.0, "2024-02-01"),
+        ("Entertainment", 20.5, "2024-01-07"),
+        ("Entertainment", 30.0, "2024-03-31"),
+    ]:
+        add_single_transaction(budget, amount, day, "Shop", connection=db_conn)
+    create_snapshot(snapshot_dir, connection=db_conn)
+
+    for options in [
+        {},
+        {"period": "month"},
+        {"period": "week"},
+        {"start_date": "2024-01-20", "end_date": "2024-03-01"},
+        {"period": "week", "budget_name": "Groceries", "start_date": "2024-01-16"},
+    ]:
+        database_report = str(tmp_path / "database.csv")
+        snapshot_report = str(tmp_path / "snapshot.csv")
+        generate_report(database_report, connection=db_conn, **options)
+        result = generate_report(snapshot_report, snapshot_dir=snapshot_dir, **options)
+        assert result == f"Report written to {snapshot_report}."
+        assert pl.read_csv(snapshot_report).equals(pl.read_csv(database_report)), (
+            options
+        )
+
+    result = generate_report(
+        str(tmp_path / "report.csv"), snapshot_dir=snapshot_dir, budget_name="Rent"
+    )
+    assert result == "Error: Budget category 'Rent' does not exist."
+    result = generate_report(
+        str(tmp_path / "report.csv"), snapshot_dir=str(tmp_path / "missing")
+    )
+    assert result == f"Error: No snapshot found in {tmp_path / 'missing'}."